@@ -1,33 +1,50 @@
 import os
 import jwt
 import datetime
-import bcrypt
+import inspect
 from functools import wraps
-from flask import request, jsonify
-from backend.db.mysql import execute_query, fetch_results
+from flask import request, jsonify, g
+from mysql.connector import IntegrityError, errorcode
+from backend.db.mysql import query_one, execute
+from backend.auth.principals import principal_cache
+from backend.auth import passwords
+from backend.auth.passwords import PasswordPoolBusy
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Mock Firebase authentication functions
 
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "hdims_secret_key")
 
 def hash_password(password):
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash a password using bcrypt at BCRYPT_ROUNDS, on the password pool"""
+    return passwords.hash_password(password)
 
 def check_password(password, hashed_password):
-    """Check if password matches the hashed password"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    """Check if password matches the hashed password, on the password pool"""
+    return passwords.check_password(password, hashed_password)
 
-def generate_token(user_id, role):
-    """Generate a JWT token (similar to Firebase)"""
-    payload = {
+def generate_token(user_id, role, profile=None):
+    """
+    Generate a JWT token (similar to Firebase).
+    
+    Args:
+        user_id (int): User id
+        role (str): User role
+        profile (dict, optional): Profile claims from ``get_profile_claims``
+            (patient_id, or doctor_id and specialization, plus name)
+    
+    Returns:
+        str: Signed token
+    """
+    payload = dict(profile or {})
+    payload.update({
         'uid': user_id,
         'role': role,
         'iat': datetime.datetime.utcnow(),
         'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=60)
-    }
+    })
     token = jwt.encode(payload, SECRET_KEY, algorithm='HS256')
     return token
 
@@ -41,92 +58,263 @@ def decode_token(token):
     except jwt.InvalidTokenError:
         return None
 
-def signup(email, password, role):
-    """Sign up a new user"""
-    # Check if user already exists
-    query = "SELECT * FROM users WHERE email = %s"
-    params = (email,)
-    execute_query(query, params)
-    existing_user = fetch_results()
+def get_profile_claims(uid, role):
+    """
+    Look up the profile fields that are embedded in a user's token.
     
-    if existing_user:
-        return None, "User with this email already exists"
+    Profile ids never change, so routes can trust them for ownership
+    checks. Name and specialization are as of when the token was issued.
     
-    # Create new user
-    hashed_password = hash_password(password)
+    Args:
+        uid (int): User id
+        role (str): User role
+    
+    Returns:
+        dict: Claims, empty for admins or users without a profile yet
+    """
+    if role == 'patient':
+        query = "SELECT patient_id, name FROM patients WHERE uid = %s"
+    elif role == 'doctor':
+        query = "SELECT doctor_id, name, specialization FROM doctors WHERE uid = %s"
+    else:
+        return {}
+    
+    profile = query_one(query, (uid,))
+    return dict(profile) if profile else {}
+
+def _profile_id(current_user, role, claim):
+    """Return a profile id claim, looking it up for tokens issued without one"""
+    if current_user is None:
+        current_user = current_principal()
+        if current_user is None:
+            return None
+    if current_user['role'] != role:
+        return None
+    if claim not in current_user:
+        # Tokens issued before profile claims existed, or before the profile was created
+        current_user.update(get_profile_claims(current_user['uid'], role))
+    return current_user.get(claim)
+
+def current_patient_id(current_user=None):
+    """
+    Get the patient_id of the token's user.
+    
+    The id is looked up at most once per request: a lookup for a token
+    without the claim is stored in the payload.
+    
+    Args:
+        current_user (dict, optional): Token payload (default: the current
+            request's principal)
+    
+    Returns:
+        int: patient_id, or None if the user is not a patient or has no profile
+    """
+    return _profile_id(current_user, 'patient', 'patient_id')
+
+def current_doctor_id(current_user=None):
+    """
+    Get the doctor_id of the token's user.
+    
+    The id is looked up at most once per request: a lookup for a token
+    without the claim is stored in the payload.
+    
+    Args:
+        current_user (dict, optional): Token payload (default: the current
+            request's principal)
+    
+    Returns:
+        int: doctor_id, or None if the user is not a doctor or has no profile
+    """
+    return _profile_id(current_user, 'doctor', 'doctor_id')
+
+class DuplicateEmailError(Exception):
+    """Raised when a user with the same email already exists"""
+
+def create_user(email, hashed_password, role):
+    """
+    Insert a user row.
+    
+    Duplicates are caught by the unique email constraint rather than a
+    separate lookup, so call this inside ``transaction()`` together with the
+    profile insert to create both in one commit.
+    
+    Args:
+        email (str): Email address
+        hashed_password (str): Hash from ``hash_password``
+        role (str): User role
+    
+    Returns:
+        int: New uid (the insert's lastrowid)
+    
+    Raises:
+        DuplicateEmailError: If the email is already registered
+    """
     query = "INSERT INTO users (email, password_hash, role) VALUES (%s, %s, %s)"
     params = (email, hashed_password, role)
     
     try:
-        user_id = execute_query(query, params)
-        
-        # Get the newly created user
-        query = "SELECT * FROM users WHERE uid = %s"
-        params = (user_id,)
-        execute_query(query, params)
-        user = fetch_results()[0]
-        
-        # Generate token
-        token = generate_token(user['uid'], user['role'])
-        
-        return token, None
+        return execute(query, params)
+    except IntegrityError as e:
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            raise DuplicateEmailError("User with this email already exists") from e
+        raise
+
+def signup(email, password, role):
+    """Sign up a new user"""
+    # Hash before touching the database so no transaction waits on bcrypt
+    hashed_password = hash_password(password)
+    
+    try:
+        user_id = create_user(email, hashed_password, role)
     except Exception as e:
+        # Includes DuplicateEmailError for an email that is already registered
         return None, str(e)
+    
+    # A new user has no profile yet, so the token carries no profile claims;
+    # current_patient_id/current_doctor_id look them up once the profile exists
+    token = generate_token(user_id, role)
+    
+    return token, None
 
 def login(email, password):
     """Login a user"""
-    query = "SELECT * FROM users WHERE email = %s"
+    query = "SELECT uid, role, password_hash FROM users WHERE email = %s"
     params = (email,)
-    execute_query(query, params)
-    results = fetch_results()
+    user = query_one(query, params)
     
-    if not results:
+    if not user:
         return None, "User not found"
     
-    user = results[0]
-    
     if not check_password(password, user['password_hash']):
         return None, "Invalid password"
     
-    # Generate token
-    token = generate_token(user['uid'], user['role'])
+    # Move the stored hash to the configured cost while the password is at hand
+    if passwords.needs_rehash(user['password_hash']):
+        try:
+            query = "UPDATE users SET password_hash = %s WHERE uid = %s"
+            params = (hash_password(password), user['uid'])
+            execute(query, params)
+            logger.info(f"Rehashed password for user {user['uid']} at cost {passwords.BCRYPT_ROUNDS}")
+        except PasswordPoolBusy:
+            # Not worth failing a login over; it will be retried next time
+            pass
+    
+    # Generate token carrying the profile ids so routes need not look them up
+    token = generate_token(user['uid'], user['role'], get_profile_claims(user['uid'], user['role']))
     
     return token, None
 
 def verify_token(token):
-    """Verify a JWT token"""
+    """
+    Verify a JWT token.
+    
+    Tokens that passed a full check recently are served from the principal
+    cache without touching the database.
+    """
+    payload = principal_cache.get(token)
+    if payload:
+        return payload
+    
     payload = decode_token(token)
-    if not payload:
+    if not payload or principal_cache.is_revoked(payload):
         return None
     
-    # Check if user exists
-    query = "SELECT * FROM users WHERE uid = %s"
+    # Check the user still exists with the role the token claims. Read the
+    # primary so a user created moments ago is not missed on a lagging replica.
+    query = "SELECT uid, role FROM users WHERE uid = %s"
     params = (payload['uid'],)
-    execute_query(query, params)
-    results = fetch_results()
+    user = query_one(query, params, primary=True)
     
-    if not results:
+    if not user or user['role'] != payload['role']:
         return None
     
+    principal_cache.put(token, payload)
     return payload
 
+def revoke_user_tokens(uid, deleted=False):
+    """
+    Stop accepting a user's existing tokens in this process.
+    
+    Call after deleting a user or changing their role.
+    
+    Args:
+        uid (int): User id
+        deleted (bool): The user was deleted, so reject all of their tokens
+    """
+    principal_cache.revoke(uid, deleted)
+
+def bearer_token():
+    """Get the bearer token from the current request's Authorization header, if any"""
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ')[1] or None
+
+def resolve_principal():
+    """
+    Verify the current request's bearer token once and keep the result on ``g``.
+    
+    Registered as a ``before_request`` hook by ``init_auth``. ``g.auth_token``
+    holds the raw token (None if there was none) and ``g.principal`` the
+    verified payload (None if the token is missing or invalid). Every auth
+    decorator and optional-auth route reads these instead of verifying again.
+    """
+    g.auth_token = bearer_token()
+    g.principal = verify_token(g.auth_token) if g.auth_token else None
+
+def init_auth(app):
+    """Register the per-request auth resolver with a Flask app"""
+    app.before_request(resolve_principal)
+
+def current_principal():
+    """
+    Get the verified token payload of the current request.
+    
+    Resolves it on first use if the before_request hook did not run (e.g. a
+    blueprint mounted on another app).
+    
+    Returns:
+        dict: Payload, or None if the request is not authenticated
+    """
+    if 'principal' not in g:
+        resolve_principal()
+    return g.principal
+
+def authenticate_request():
+    """
+    Get the current request's principal for a protected route.
+    
+    Returns:
+        tuple: (payload, None) on success, or (None, error response)
+    """
+    payload = current_principal()
+    
+    if g.auth_token is None:
+        return None, (jsonify({'message': 'Token is missing!'}), 401)
+    
+    if not payload:
+        return None, (jsonify({'message': 'Token is invalid!'}), 401)
+    
+    return payload, None
+
 def token_required(f):
-    """Decorator to protect routes"""
+    """Decorator to protect routes (sync or async views)"""
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_async(*args, **kwargs):
+            payload, error = authenticate_request()
+            if error:
+                return error
+            
+            return await f(payload, *args, **kwargs)
+        
+        return decorated_async
+    
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-        
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
-        
-        payload = verify_token(token)
-        if not payload:
-            return jsonify({'message': 'Token is invalid!'}), 401
+        payload, error = authenticate_request()
+        if error:
+            return error
         
         return f(payload, *args, **kwargs)
     
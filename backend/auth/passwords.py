@@ -0,0 +1,158 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+import logging
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor for new hashes; each step doubles the work
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# Threads doing password work. bcrypt releases the GIL, so threads use
+# separate cores, and capping them leaves CPU for the rest of the app.
+PASSWORD_WORKERS = int(os.environ.get("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Most password operations running or queued before new ones are refused
+PASSWORD_QUEUE_LIMIT = int(os.environ.get("PASSWORD_QUEUE_LIMIT", str(PASSWORD_WORKERS * 8)))
+
+# Seconds to suggest in Retry-After when the pool is saturated
+PASSWORD_RETRY_AFTER = 1
+
+class PasswordPoolBusy(Exception):
+    """Raised when the password pool's queue is full"""
+
+class PasswordPool:
+    """
+    Bounded thread pool for bcrypt work.
+    
+    At most ``queue_limit`` operations may be running or waiting. Beyond that,
+    new work is rejected at once with ``PasswordPoolBusy`` rather than
+    queueing, so a login storm cannot tie up every request thread.
+    """
+    
+    def __init__(self, workers=PASSWORD_WORKERS, queue_limit=PASSWORD_QUEUE_LIMIT):
+        """
+        Create the pool.
+        
+        Args:
+            workers (int): Threads hashing concurrently
+            queue_limit (int): Most operations admitted (running plus waiting)
+        """
+        self.workers = workers
+        self.queue_limit = max(queue_limit, workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hdims-bcrypt')
+        self.slots = threading.BoundedSemaphore(self.queue_limit)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+    
+    def run(self, function, *args):
+        """
+        Run password work on the pool and wait for the result.
+        
+        Args:
+            function (callable): bcrypt operation
+            *args: Arguments for the operation
+        
+        Returns:
+            The operation's result
+        
+        Raises:
+            PasswordPoolBusy: If the queue is full
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise PasswordPoolBusy("Too many password operations in progress, try again shortly")
+        
+        with self.lock:
+            self.pending += 1
+        
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            with self.lock:
+                self.pending -= 1
+                self.completed += 1
+            self.slots.release()
+    
+    def stats(self):
+        """
+        Get the pool's counters.
+        
+        Returns:
+            dict: Sizes, in-flight operations and rejections
+        """
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'queue_limit': self.queue_limit,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'rounds': BCRYPT_ROUNDS
+            }
+
+# Password pool shared by this process
+password_pool = PasswordPool()
+
+def _hash(password, rounds):
+    """Hash a password (runs on a pool thread)"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _check(password, hashed_password):
+    """Compare a password with a hash (runs on a pool thread)"""
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def hash_password(password, rounds=None):
+    """
+    Hash a password on the password pool.
+    
+    Args:
+        password (str): Plain-text password
+        rounds (int, optional): Cost factor (default: BCRYPT_ROUNDS)
+    
+    Returns:
+        str: bcrypt hash
+    
+    Raises:
+        PasswordPoolBusy: If the pool is saturated
+    """
+    return password_pool.run(_hash, password, rounds or BCRYPT_ROUNDS)
+
+def check_password(password, hashed_password):
+    """
+    Check a password against a bcrypt hash on the password pool.
+    
+    Args:
+        password (str): Plain-text password
+        hashed_password (str): Stored bcrypt hash
+    
+    Returns:
+        bool: True if the password matches
+    
+    Raises:
+        PasswordPoolBusy: If the pool is saturated
+    """
+    return password_pool.run(_check, password, hashed_password)
+
+def hash_rounds(hashed_password):
+    """
+    Read the cost factor from a bcrypt hash ("$2b$12$...").
+    
+    Args:
+        hashed_password (str): bcrypt hash
+    
+    Returns:
+        int: Cost factor, or None if the hash is not in bcrypt format
+    """
+    parts = hashed_password.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+def needs_rehash(hashed_password):
+    """Check whether a stored hash was made with a different cost than BCRYPT_ROUNDS"""
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
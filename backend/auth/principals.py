@@ -0,0 +1,156 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Most verified tokens remembered per process
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+
+# Longest a verified token is trusted without rechecking the users table.
+# Revocations only reach this process, so this also bounds how long another
+# worker may keep accepting a revoked token.
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "60"))
+
+# Revocations are dropped once every token they could affect has expired
+TOKEN_LIFETIME = 60 * 60
+
+# Revocation time recorded for deleted users: every token is rejected
+DELETED = float('inf')
+
+def token_hash(token):
+    """Key a token by its SHA-256 digest so raw tokens are never held in memory"""
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+class PrincipalCache:
+    """
+    Cache of verified token payloads with per-user revocation.
+    
+    Entries expire at the token's own ``exp`` or after ``ttl`` seconds,
+    whichever comes first. Revoking a user drops their cached tokens and
+    records the time. After that, any token for the user issued before the
+    revocation is rejected (or any token at all if the user was deleted),
+    using one dictionary lookup.
+    """
+    
+    def __init__(self, max_entries=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL):
+        """
+        Create an empty cache.
+        
+        Args:
+            max_entries (int): Most tokens kept; 0 disables caching
+            ttl (float): Seconds a verification is trusted
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # token hash -> (expires_at, payload)
+        self.user_tokens = {}  # uid -> set of token hashes
+        self.revoked = {}  # uid -> revoked at (inf once the user is deleted)
+    
+    def is_revoked(self, payload):
+        """
+        Check whether a token was issued before its user was revoked.
+        
+        Args:
+            payload (dict): Decoded token payload
+        
+        Returns:
+            bool: True if the token must be rejected
+        """
+        revoked_at = self.revoked.get(payload['uid'])
+        if revoked_at is None:
+            return False
+        if revoked_at == DELETED:
+            return True
+        
+        # iat has one-second resolution, so only tokens from earlier seconds are
+        # rejected here; same-second tokens are left to the database check
+        return payload.get('iat', 0) < int(revoked_at)
+    
+    def get(self, token):
+        """
+        Look up a previously verified token.
+        
+        Args:
+            token (str): Raw JWT
+        
+        Returns:
+            dict: Payload, or None if the token is not cached, expired or revoked
+        """
+        key = token_hash(token)
+        
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            
+            expires_at, payload = entry
+            if expires_at <= time.time() or self.is_revoked(payload):
+                self._drop(key)
+                return None
+            
+            self.entries.move_to_end(key)
+            return dict(payload)
+    
+    def put(self, token, payload):
+        """
+        Remember a token that passed full verification.
+        
+        Args:
+            token (str): Raw JWT
+            payload (dict): Decoded payload
+        """
+        if self.max_entries <= 0:
+            return
+        
+        key = token_hash(token)
+        expires_at = min(payload.get('exp', 0), time.time() + self.ttl)
+        
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            
+            self.entries[key] = (expires_at, payload)
+            self.user_tokens.setdefault(payload['uid'], set()).add(key)
+            
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+    
+    def revoke(self, uid, deleted=False):
+        """
+        Reject a user's existing tokens, e.g. after a role change or deletion.
+        
+        Args:
+            uid (int): User id
+            deleted (bool): Reject every token for the user, not just older ones
+        """
+        now = time.time()
+        
+        with self.lock:
+            for key in list(self.user_tokens.get(uid, ())):
+                self._drop(key)
+            
+            self.revoked[uid] = DELETED if deleted else now
+            
+            # Forget role-change revocations that no live token can predate
+            for revoked_uid, revoked_at in list(self.revoked.items()):
+                if revoked_at != DELETED and revoked_at < now - TOKEN_LIFETIME:
+                    del self.revoked[revoked_uid]
+        
+        logger.info(f"Revoked tokens for user {uid}{' (deleted)' if deleted else ''}")
+    
+    def _drop(self, key):
+        """Remove a cached token (lock held)"""
+        _, payload = self.entries.pop(key)
+        keys = self.user_tokens.get(payload['uid'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.user_tokens[payload['uid']]
+
+# Verified tokens for this process
+principal_cache = PrincipalCache()
@@ -0,0 +1,118 @@
+"""
+Cost of ranking doctors by availability for /api/doctors/available.
+
+Times the availability ranking kept by DoctorAvailability: building it for
+every doctor, applying one booking or cancellation, and reading the top
+doctors overall and of one specialization. With --compare it also times the heap work the old per-request
+rebuild did (drain the heap, insert every doctor, copy it for the top N).
+No database is needed, so the figures leave out the queries; the old
+rebuild also ran one COUNT query per doctor on every request.
+
+    python -m backend.benchmarks.bench_doctor_availability [--doctors 10000] [--compare]
+"""
+import sys
+import time
+import random
+import argparse
+from backend.db.cache import query_cache
+from backend.dsa.maxheap import MaxHeap
+from backend.utils.availability import DoctorAvailability, availability_score, parse_availability
+
+SPECIALIZATIONS = ['Cardiology', 'Neurology', 'Pediatrics', 'Orthopedics', 'Dermatology', 'General']
+
+def make_index(doctors, rng):
+    """
+    Build a directory of synthetic doctors, as if loaded from the doctors table.
+    
+    Args:
+        doctors (int): Doctors to generate
+        rng (Random): Random source
+    
+    Returns:
+        tuple: (DoctorAvailability, dict of doctor_id -> scheduled appointments)
+    """
+    index = DoctorAvailability(ttl=float('inf'))
+    week = parse_availability('Monday-Friday: 9AM-5PM')
+    index.doctors = {
+        doctor_id: {
+            'name': f'Doctor {doctor_id}',
+            'specialization': rng.choice(SPECIALIZATIONS),
+            'availability': 'Monday-Friday: 9AM-5PM',
+            'week': week
+        } for doctor_id in range(1, doctors + 1)
+    }
+    index.loaded_at = time.monotonic()
+    index.generation = query_cache.generation(('doctors',))
+    
+    counts = {doctor_id: rng.randint(0, 25) for doctor_id in index.doctors}
+    return index, counts
+
+def check_order(ranking):
+    """Confirm the ranking comes out in descending score order"""
+    scores = [score for score, _, _ in ranking]
+    if scores != sorted(scores, reverse=True):
+        raise AssertionError("Doctors returned out of availability order")
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark the doctor availability ranking")
+    parser.add_argument('--doctors', type=int, default=10000, help="doctors to rank (default: 10000)")
+    parser.add_argument('--changes', type=int, default=100000, help="bookings/cancellations to apply (default: 100000)")
+    parser.add_argument('--reads', type=int, default=1000, help="/available reads to time (default: 1000)")
+    parser.add_argument('--limit', type=int, default=10, help="doctors per read (default: 10)")
+    parser.add_argument('--compare', action='store_true', help="also time the old per-request rebuild")
+    parser.add_argument('--seed', type=int, default=42, help="random seed (default: 42)")
+    args = parser.parse_args(argv)
+    
+    rng = random.Random(args.seed)
+    index, counts = make_index(args.doctors, rng)
+    
+    started = time.perf_counter()
+    index.set_scheduled(counts)
+    print(f"build ranking for {args.doctors} doctors: {time.perf_counter() - started:.3f}s")
+    
+    changes = [rng.randint(1, args.doctors) for _ in range(args.changes)]
+    started = time.perf_counter()
+    for doctor_id in changes:
+        counts[doctor_id] = max(0, counts[doctor_id] + rng.choice((-1, 1)))
+        index.scheduled_changed(doctor_id, counts[doctor_id])
+    elapsed = time.perf_counter() - started
+    print(f"booking/cancellation update: {elapsed / args.changes * 1e6:.1f} us each")
+    
+    started = time.perf_counter()
+    for _ in range(args.reads):
+        ranking = index.most_available(args.limit)
+    elapsed = time.perf_counter() - started
+    print(f"top {args.limit} read: {elapsed / args.reads * 1000:.3f} ms each")
+    check_order(ranking)
+    
+    started = time.perf_counter()
+    for _ in range(args.reads):
+        filtered = index.most_available(args.limit, SPECIALIZATIONS[0].upper())
+    elapsed = time.perf_counter() - started
+    print(f"top {args.limit} {SPECIALIZATIONS[0]} read: {elapsed / args.reads * 1000:.3f} ms each")
+    check_order(filtered)
+    if len(filtered) != args.limit or any(doctor['specialization'] != SPECIALIZATIONS[0] for _, _, doctor in filtered):
+        raise AssertionError("Filtered ranking returned the wrong doctors")
+    
+    expected = sorted((availability_score(counts[doctor_id]) for doctor_id in index.doctors), reverse=True)
+    if [score for score, _, _ in ranking] != expected[:args.limit]:
+        raise AssertionError("Ranking does not match the scheduled counts")
+    
+    if args.compare:
+        heap = MaxHeap()
+        reads = max(1, args.reads // 100)
+        started = time.perf_counter()
+        for _ in range(reads):
+            while not heap.is_empty():
+                heap.extract_max()
+            for doctor_id, doctor in index.doctors.items():
+                heap.insert(availability_score(counts[doctor_id]), doctor_id, doctor)
+            heap.get_top_n(args.limit)
+        elapsed = time.perf_counter() - started
+        print(f"old rebuild per read (heap work only): {elapsed / reads * 1000:.3f} ms each")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Login throughput against the bcrypt cost factor.
+
+Runs password checks through a PasswordPool from many client threads for a
+fixed time at each cost, and reports completed logins per second, latency
+and how many attempts were turned away because the pool was saturated. No
+database is needed.
+
+    python -m backend.benchmarks.bench_login [--rounds 8,10,12] [--clients 32]
+"""
+import sys
+import time
+import argparse
+import threading
+from backend.auth.passwords import PasswordPool, PasswordPoolBusy, PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT, _hash, _check
+
+PASSWORD = 'correct horse battery staple'
+
+# Pause before a rejected client tries again, like a client honouring Retry-After
+REJECT_BACKOFF = 0.01
+
+def run_cost(rounds, clients, duration, workers, queue_limit):
+    """
+    Hammer a fresh pool with logins at one cost factor.
+    
+    Args:
+        rounds (int): bcrypt cost factor
+        clients (int): Concurrent client threads
+        duration (float): Seconds to run
+        workers (int): Pool threads
+        queue_limit (int): Pool admission limit
+    
+    Returns:
+        dict: Throughput, latency percentiles (ms) and rejections
+    """
+    hashed = _hash(PASSWORD, rounds)
+    pool = PasswordPool(workers, queue_limit)
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    
+    def client():
+        local = []
+        local_rejected = 0
+        
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                pool.run(_check, PASSWORD, hashed)
+                local.append(time.perf_counter() - started)
+            except PasswordPoolBusy:
+                local_rejected += 1
+                time.sleep(REJECT_BACKOFF)
+        
+        with lock:
+            latencies.extend(local)
+            rejected[0] += local_rejected
+    
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.executor.shutdown()
+    
+    latencies.sort()
+    count = len(latencies)
+    
+    return {
+        'rounds': rounds,
+        'logins_per_sec': count / elapsed,
+        'p50_ms': latencies[count // 2] * 1000 if count else 0,
+        'p99_ms': latencies[min(count - 1, int(count * 0.99))] * 1000 if count else 0,
+        'rejected_per_sec': rejected[0] / elapsed
+    }
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark login throughput against bcrypt cost")
+    parser.add_argument('--rounds', default='4,6,8,10,12',
+                        help="comma-separated cost factors (default: 4,6,8,10,12)")
+    parser.add_argument('--clients', type=int, default=32, help="concurrent clients (default: 32)")
+    parser.add_argument('--duration', type=float, default=3.0, help="seconds per cost factor (default: 3)")
+    parser.add_argument('--workers', type=int, default=PASSWORD_WORKERS,
+                        help=f"password pool threads (default: {PASSWORD_WORKERS})")
+    parser.add_argument('--queue-limit', type=int, default=PASSWORD_QUEUE_LIMIT,
+                        help=f"password pool admission limit (default: {PASSWORD_QUEUE_LIMIT})")
+    args = parser.parse_args(argv)
+    
+    print(f"clients={args.clients} workers={args.workers} queue_limit={args.queue_limit} duration={args.duration}s")
+    print(f"{'cost':>4} {'logins/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'rejected/s':>11}")
+    
+    for rounds in [int(value) for value in args.rounds.split(',')]:
+        result = run_cost(rounds, args.clients, args.duration, args.workers, args.queue_limit)
+        print(f"{result['rounds']:>4} {result['logins_per_sec']:>10.1f} {result['p50_ms']:>9.1f} "
+              f"{result['p99_ms']:>9.1f} {result['rejected_per_sec']:>11.1f}")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Warm-start time of the appointment urgency queue.
+
+Builds the queue from synthetic scheduled-appointment rows, shaped like the
+rows the warm-start scan returns, using MinHeap.heapify. With --compare it
+also times the old approach of inserting the rows one by one. No database is
+needed, so the figures leave out the scan itself.
+
+    python -m backend.benchmarks.bench_queue_warm_start [--appointments 1000000] [--compare]
+"""
+import sys
+import time
+import random
+import argparse
+import datetime
+from backend.dsa.minheap import MinHeap
+from backend.utils.appointment_queue import _entry
+
+def make_rows(count, seed):
+    """
+    Generate scheduled appointment rows.
+    
+    Args:
+        count (int): Rows to generate
+        seed (int): Random seed
+    
+    Returns:
+        list: Rows as dictionaries
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2030, 1, 1, 9)
+    
+    return [{
+        'id': i + 1,
+        'urgency': rng.randint(0, 10),
+        'patient_id': rng.randint(1, 100000),
+        'doctor_id': rng.randint(1, 10000),
+        'appointment_time': start + datetime.timedelta(minutes=15 * rng.randint(0, 100000)),
+        'reason': 'Checkup'
+    } for i in range(count)]
+
+def check_order(heap, samples):
+    """Pop a few entries and confirm they come out in urgency order"""
+    previous = None
+    for _ in range(min(samples, heap.size())):
+        urgency = heap.extract_min()[0]
+        if previous is not None and urgency < previous:
+            raise AssertionError("Heap returned appointments out of urgency order")
+        previous = urgency
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark urgency queue warm start")
+    parser.add_argument('--appointments', type=int, default=1000000,
+                        help="scheduled appointments to load (default: 1000000)")
+    parser.add_argument('--compare', action='store_true', help="also time one-by-one inserts")
+    parser.add_argument('--seed', type=int, default=42, help="random seed (default: 42)")
+    args = parser.parse_args(argv)
+    
+    started = time.perf_counter()
+    rows = make_rows(args.appointments, args.seed)
+    print(f"generated {len(rows)} rows in {time.perf_counter() - started:.2f}s")
+    
+    started = time.perf_counter()
+    entries = [_entry(row) for row in rows]
+    print(f"convert rows: {time.perf_counter() - started:.2f}s")
+    
+    heap = MinHeap()
+    started = time.perf_counter()
+    heap.heapify(entries)
+    print(f"heapify:      {time.perf_counter() - started:.2f}s")
+    check_order(heap, 1000)
+    
+    if args.compare:
+        heap = MinHeap()
+        started = time.perf_counter()
+        for entry in entries:
+            heap.insert(*entry)
+        print(f"insert:       {time.perf_counter() - started:.2f}s")
+        check_order(heap, 1000)
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
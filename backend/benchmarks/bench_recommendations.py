@@ -0,0 +1,129 @@
+"""
+Cost of scoring doctors for /api/doctors/recommend.
+
+Fills DoctorRecommender with synthetic doctors and performance averages,
+then times: computing every doctor's next free slot once, applying
+bookings, and scoring every doctor per request. With --compare it also
+times the plain-Python scoring used when NumPy is not installed. No
+database is needed, so the per-request past-visits query is left out.
+
+    python -m backend.benchmarks.bench_recommendations [--doctors 10000] [--compare]
+"""
+import sys
+import time
+import random
+import argparse
+from backend.db.cache import query_cache
+from backend.utils import recommendations
+from backend.utils.availability import doctor_availability, parse_availability
+
+SPECIALIZATIONS = ['Cardiology', 'Neurology', 'Pediatrics', 'Orthopedics', 'Dermatology', 'General']
+
+HOURS = ['Monday-Friday: 9AM-5PM', 'Monday, Wednesday, Friday: 8AM-2PM', 'Daily: 10AM-6PM', 'Weekends: 9AM-1PM']
+
+def make_recommender(doctors, performance, counts):
+    """
+    Build a recommender over the given doctors, as if loaded from the database.
+    
+    The process-wide doctor directory is filled with the same doctors, as
+    the recommender checks it for changes on every request.
+    
+    Args:
+        doctors (dict): doctor_id -> doctor info
+        performance (dict): doctor_id -> performance averages
+        counts (dict): doctor_id -> scheduled appointments
+    
+    Returns:
+        DoctorRecommender: Loaded recommender
+    """
+    doctor_availability.ttl = float('inf')
+    doctor_availability.doctors = doctors
+    doctor_availability.loaded_at = time.monotonic()
+    doctor_availability.generation = query_cache.generation(('doctors',))
+    
+    recommender = recommendations.DoctorRecommender(ttl=float('inf'))
+    recommender.scheduled = dict(counts)
+    recommender._build(doctors, performance)
+    recommender.loaded_at = time.monotonic()
+    recommender.version = doctor_availability.version
+    recommender.generation = query_cache.generation(('performance_metrics',))
+    return recommender
+
+def time_requests(recommender, requests, limit, rng):
+    """
+    Time recommend() calls.
+    
+    Returns:
+        tuple: (seconds per request, last result)
+    """
+    started = time.perf_counter()
+    for _ in range(requests):
+        visits = {rng.randint(1, len(recommender.rows)): rng.randint(1, 5) for _ in range(3)}
+        result = recommender.recommend(limit, rng.choice(SPECIALIZATIONS), visits)
+    return (time.perf_counter() - started) / requests, result
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark doctor recommendation scoring")
+    parser.add_argument('--doctors', type=int, default=10000, help="doctors to score (default: 10000)")
+    parser.add_argument('--requests', type=int, default=200, help="recommendations to time (default: 200)")
+    parser.add_argument('--limit', type=int, default=5, help="doctors per recommendation (default: 5)")
+    parser.add_argument('--compare', action='store_true', help="also time scoring without NumPy")
+    parser.add_argument('--seed', type=int, default=42, help="random seed (default: 42)")
+    args = parser.parse_args(argv)
+    
+    if recommendations.np is None:
+        print("NumPy is not installed; timing the plain-Python scoring")
+    
+    rng = random.Random(args.seed)
+    weeks = {text: parse_availability(text) for text in HOURS}
+    doctors = {}
+    for doctor_id in range(1, args.doctors + 1):
+        hours = rng.choice(HOURS)
+        doctors[doctor_id] = {
+            'name': f'Doctor {doctor_id}',
+            'specialization': rng.choice(SPECIALIZATIONS),
+            'availability': hours,
+            'week': weeks[hours]
+        }
+    performance = {
+        doctor_id: {'satisfaction': rng.uniform(1, 5), 'response_time': rng.uniform(5, 60)}
+        for doctor_id in doctors if rng.random() < 0.8
+    }
+    counts = {doctor_id: rng.randint(0, 25) for doctor_id in doctors}
+    
+    recommender = make_recommender(doctors, performance, counts)
+    
+    # The first request computes every doctor's next free slot
+    started = time.perf_counter()
+    recommender.recommend(args.limit, SPECIALIZATIONS[0])
+    print(f"first request, next free slot of {args.doctors} doctors: {time.perf_counter() - started:.3f}s")
+    
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        recommender.scheduled_changed(rng.randint(1, args.doctors), rng.randint(0, 25))
+    elapsed = time.perf_counter() - started
+    print(f"booking update: {elapsed / args.requests * 1e6:.1f} us each")
+    
+    elapsed, result = time_requests(recommender, args.requests, args.limit, rng)
+    print(f"recommend {args.limit} of {args.doctors}: {elapsed * 1000:.3f} ms each")
+    
+    scores = [doctor['score'] for doctor in result]
+    if scores != sorted(scores, reverse=True) or len(result) != args.limit:
+        raise AssertionError("Recommendations returned out of score order")
+    
+    if args.compare and recommendations.np is not None:
+        numpy = recommendations.np
+        recommendations.np = None
+        try:
+            plain = make_recommender(doctors, performance, recommender.scheduled)
+            plain.recommend(args.limit, SPECIALIZATIONS[0])
+            elapsed, plain_result = time_requests(plain, args.requests, args.limit, random.Random(args.seed))
+        finally:
+            recommendations.np = numpy
+        print(f"plain Python: {elapsed * 1000:.3f} ms each")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Concurrency stress test for appointment booking.
+
+Many client threads book overlapping 30-minute appointments with one doctor
+inside a short window, all at once, against a running server. The script
+then reads the patient's appointments back and checks that no two scheduled
+appointments with that doctor overlap. The exit status is 1 if any do, or
+if a request failed with anything other than 201 or 409.
+
+    python -m backend.benchmarks.stress_booking --email p@example.com --password secret --doctor-id 1
+
+``tests/test_stress_booking.py`` runs the same check against an in-process
+server when MySQL is available.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import threading
+import urllib.error
+import urllib.request
+from email.utils import parsedate_to_datetime
+
+def call(base_url, method, path, body=None, token=None):
+    """
+    Send one API request.
+    
+    Returns:
+        tuple: (status code, decoded JSON body)
+    """
+    request = urllib.request.Request(base_url + path, method=method)
+    request.add_header('Content-Type', 'application/json')
+    if token:
+        request.add_header('Authorization', f'Bearer {token}')
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    
+    try:
+        with urllib.request.urlopen(request, data) as response:
+            return response.status, json.loads(response.read() or b'{}')
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+def parse_time(value):
+    """Parse a datetime as serialized by the API (HTTP date or ISO format), or read from the database"""
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return parsedate_to_datetime(value).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return datetime.datetime.fromisoformat(value)
+
+def scheduled_with(base_url, token, doctor_id):
+    """Read back the patient's scheduled appointments with one doctor, following every page"""
+    appointments = []
+    cursor = None
+    
+    while True:
+        path = '/api/appointments/list?limit=200' + (f'&cursor={cursor}' if cursor else '')
+        status, body = call(base_url, 'GET', path, token=token)
+        if status != 200:
+            raise RuntimeError(f"Listing appointments failed: {status} {body}")
+        
+        appointments.extend(
+            a for a in body['appointments']
+            if a['doctor_id'] == doctor_id and a['status'] == 'scheduled'
+        )
+        cursor = body.get('next_cursor')
+        if not cursor:
+            return appointments
+
+def find_overlaps(appointments):
+    """Return pairs of appointment ids whose [start, end) spans overlap"""
+    spans = sorted(
+        (parse_time(a['appointment_time']), parse_time(a['end_time']), a['id'])
+        for a in appointments if a.get('end_time')
+    )
+    overlaps = []
+    latest_end, latest_id = None, None
+    
+    for start, end, appointment_id in spans:
+        if latest_end is not None and start < latest_end:
+            overlaps.append((latest_id, appointment_id))
+        if latest_end is None or end > latest_end:
+            latest_end, latest_id = end, appointment_id
+    
+    return overlaps
+
+def booking_starts(rng, requests, window):
+    """
+    Pick the start times to book: a far-future day of its own, so repeated
+    runs do not collide, with starts on 5-minute marks over ``window`` hours.
+    
+    Returns:
+        tuple: (day, list of start datetimes)
+    """
+    day = datetime.datetime(2090, 1, 1, 8) + datetime.timedelta(days=rng.randint(0, 3000))
+    starts = [day + datetime.timedelta(minutes=5 * rng.randint(0, window * 12 - 1)) for _ in range(requests)]
+    return day, starts
+
+def book_concurrently(base_url, token, doctor_id, starts, clients, rng):
+    """
+    Book 30-minute appointments at every start, spread over client threads
+    that all begin at once.
+    
+    Returns:
+        tuple: (status code -> responses, per-request latencies, elapsed seconds)
+    """
+    results = {}
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+    
+    def client(index):
+        barrier.wait()
+        for start in starts[index::clients]:
+            began = time.perf_counter()
+            status, _ = call(base_url, 'POST', '/api/appointments/book', {
+                'doctor_id': doctor_id,
+                'appointment_time': start.isoformat(sep=' '),
+                'duration': 30,
+                'reason': 'Booking stress test',
+                'urgency': rng.randint(0, 3)
+            }, token)
+            with lock:
+                results[status] = results.get(status, 0) + 1
+                latencies.append(time.perf_counter() - began)
+    
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    return results, latencies, time.perf_counter() - started
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Stress concurrent appointment booking")
+    parser.add_argument('--base-url', default='http://localhost:8000', help="server URL (default: http://localhost:8000)")
+    parser.add_argument('--email', required=True, help="patient account email")
+    parser.add_argument('--password', required=True, help="patient account password")
+    parser.add_argument('--doctor-id', type=int, required=True, help="doctor to book with")
+    parser.add_argument('--clients', type=int, default=32, help="concurrent clients (default: 32)")
+    parser.add_argument('--requests', type=int, default=500, help="booking attempts in total (default: 500)")
+    parser.add_argument('--window', type=int, default=8, help="hours the attempts are spread over (default: 8)")
+    parser.add_argument('--seed', type=int, default=None, help="random seed")
+    args = parser.parse_args(argv)
+    
+    status, body = call(args.base_url, 'POST', '/api/login', {'email': args.email, 'password': args.password})
+    if status != 200:
+        print(f"login failed: {status} {body}")
+        return 1
+    token = body['token']
+    
+    rng = random.Random(args.seed)
+    day, starts = booking_starts(rng, args.requests, args.window)
+    results, latencies, elapsed = book_concurrently(args.base_url, token, args.doctor_id, starts, args.clients, rng)
+    
+    latencies.sort()
+    print(f"{args.requests} attempts by {args.clients} clients on {day.date()} in {elapsed:.2f}s "
+          f"({args.requests / elapsed:.1f}/s, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms)")
+    print("responses: " + ", ".join(f"{code}={count}" for code, count in sorted(results.items())))
+    
+    overlaps = find_overlaps(scheduled_with(args.base_url, token, args.doctor_id))
+    print(f"overlapping scheduled appointments: {len(overlaps)}")
+    for pair in overlaps[:10]:
+        print(f"  {pair[0]} overlaps {pair[1]}")
+    
+    unexpected = set(results) - {201, 409}
+    return 1 if overlaps or unexpected else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Asyncio access to the database for I/O-bound route handlers.
+
+Async views can ``await`` these helpers and ``asyncio.gather`` independent
+queries so their database waits overlap:
+
+    patient, history = await asyncio.gather(
+        query_one_async("SELECT ...", (patient_id,)),
+        query_all_async("SELECT ...", (patient_id,))
+    )
+
+With aiomysql installed, queries run on a single background event loop that
+owns the aiomysql pools. Flask runs each async view on its own short-lived
+loop, so a pool bound to that loop could not be reused by the next request.
+Without aiomysql, each query runs on the synchronous pool in a thread
+executor, which gives the same concurrency within a request.
+
+Every gathered query uses its own connection, so this module is for reads.
+Writes and transactions stay on ``backend.db.mysql``.
+
+Async views need Flask's async extra: ``pip install "flask[async]"``.
+"""
+import os
+import time
+import atexit
+import asyncio
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.db.mysql import (
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME, DB_POOL_SIZE,
+    DB_REPLICA_HOSTS, DB_REPLICA_USER, DB_REPLICA_PASSWORD, DB_REPLICA_POOL_SIZE,
+    get_connection, replica_reads_allowed, cache_reads_allowed, cacheable_read_on_replica
+)
+from backend.db.stats import statement_stats, redact_params
+from backend.db.cache import query_cache
+import logging
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+logger = logging.getLogger(__name__)
+
+# Connections per async pool (aiomysql), or threads for the executor fallback
+DB_ASYNC_POOL_SIZE = int(os.environ.get("DB_ASYNC_POOL_SIZE", str(DB_POOL_SIZE)))
+
+# Driver in use: 'aiomysql', or 'thread' when falling back to the sync pool
+ASYNC_DRIVER = 'aiomysql' if aiomysql is not None else 'thread'
+
+# Background event loop that owns the aiomysql pools
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+_pools = {}
+_pools_lock = asyncio.Lock()  # only awaited on the background loop
+_replica_counter = itertools.count()
+
+# Threads used to run blocking queries when aiomysql is not installed
+_executor = None
+
+def _get_loop():
+    """Start the background event loop on first use and return it"""
+    global _loop, _loop_thread
+    
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name='hdims-async-db', daemon=True)
+            _loop_thread.start()
+            logger.info("Async database event loop started")
+    
+    return _loop
+
+def _get_executor():
+    """Create the fallback thread executor on first use and return it"""
+    global _executor
+    
+    with _loop_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_ASYNC_POOL_SIZE, thread_name_prefix='hdims-db')
+    
+    return _executor
+
+async def _get_pool(readonly):
+    """
+    Get an aiomysql pool, creating it on first use. Runs on the background loop.
+    
+    Args:
+        readonly (bool): Use the next read replica in round-robin order
+    
+    Returns:
+        aiomysql.Pool: Pool for the primary or a replica
+    """
+    if readonly and DB_REPLICA_HOSTS:
+        index = next(_replica_counter) % len(DB_REPLICA_HOSTS)
+        key = f"replica_{index}"
+        host, _, port = DB_REPLICA_HOSTS[index].partition(':')
+        settings = dict(host=host, port=int(port or 3306), user=DB_REPLICA_USER,
+                        password=DB_REPLICA_PASSWORD, maxsize=DB_REPLICA_POOL_SIZE)
+    else:
+        key = 'primary'
+        settings = dict(host=DB_HOST, port=DB_PORT, user=DB_USER,
+                        password=DB_PASSWORD, maxsize=DB_ASYNC_POOL_SIZE)
+    
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    
+    # create_pool yields to the loop while connecting, so queries gathered
+    # before the pool exists would each create one without the lock
+    async with _pools_lock:
+        if key not in _pools:
+            _pools[key] = await aiomysql.create_pool(
+                minsize=1,
+                db=DB_NAME,
+                autocommit=True,
+                **settings
+            )
+            logger.info(f"Async connection pool created for {key} ({settings['host']}:{settings['port']})")
+        
+        return _pools[key]
+
+async def _aiomysql_query_all(query, params, readonly):
+    """Run a SELECT on an aiomysql pool. Runs on the background loop."""
+    pool = await _get_pool(readonly)
+    
+    async with pool.acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(query, params)
+            return list(await cursor.fetchall())
+
+def _thread_query_all(query, params, readonly):
+    """Run a SELECT on its own connection from the synchronous pool. Runs in the executor."""
+    connection = get_connection(readonly=readonly)
+    if connection is None:
+        raise Exception("Database connection error")
+    
+    cursor = None
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+async def query_all_async(query, params=None, primary=False, cache_tables=None, ttl=None):
+    """
+    Run a SELECT without blocking the event loop and return all rows.
+    
+    Args:
+        query (str): SQL query
+        params (tuple|list, optional): Query parameters
+        primary (bool): Read from the primary even if replicas are configured
+        cache_tables (tuple, optional): Tables the result depends on; cache
+            it as ``backend.db.mysql.query_all`` does
+        ttl (float, optional): Cache lifetime in seconds
+    
+    Returns:
+        list: Rows as dictionaries
+    """
+    use_cache = bool(cache_tables) and query_cache.enabled and cache_reads_allowed()
+    if use_cache:
+        rows = query_cache.get(query, params)
+        if rows is not None:
+            return rows
+        generation = query_cache.generation(cache_tables)
+        primary = not cacheable_read_on_replica(cache_tables, primary)
+    
+    # Decide routing here, where the request context is visible
+    readonly = not primary and replica_reads_allowed()
+    started = time.perf_counter()
+    
+    try:
+        if aiomysql is not None:
+            future = asyncio.run_coroutine_threadsafe(_aiomysql_query_all(query, params, readonly), _get_loop())
+            rows = await asyncio.wrap_future(future)
+        else:
+            rows = await asyncio.get_running_loop().run_in_executor(
+                _get_executor(), _thread_query_all, query, params, readonly
+            )
+        
+        statement_stats.record(query, time.perf_counter() - started, len(rows), params)
+        
+        if use_cache:
+            query_cache.put(query, params, rows, cache_tables, generation, ttl)
+        return rows
+    
+    except Exception as e:
+        logger.error(f"Error executing query: {e}")
+        logger.error(f"Query: {query}")
+        logger.error(f"Params: {redact_params(params)}")
+        statement_stats.record(query, time.perf_counter() - started, 0, params, error=True)
+        raise e
+
+async def query_one_async(query, params=None, primary=False, cache_tables=None, ttl=None):
+    """
+    Run a SELECT without blocking the event loop and return the first row.
+    
+    Args:
+        query (str): SQL query
+        params (tuple|list, optional): Query parameters
+        primary (bool): Read from the primary even if replicas are configured
+        cache_tables (tuple, optional): Tables the result depends on
+        ttl (float, optional): Cache lifetime in seconds
+    
+    Returns:
+        dict: First row, or None if the query returned nothing
+    """
+    rows = await query_all_async(query, params, primary, cache_tables, ttl)
+    return rows[0] if rows else None
+
+async def _close_pools():
+    """Close every aiomysql pool. Runs on the background loop."""
+    for pool in _pools.values():
+        pool.close()
+        await pool.wait_closed()
+    _pools.clear()
+
+def close_async_db():
+    """Close the async pools and stop the background loop and executor"""
+    global _loop, _loop_thread, _executor
+    
+    with _loop_lock:
+        if _loop is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(_close_pools(), _loop).result(timeout=5)
+            except Exception as e:
+                logger.error(f"Error closing async connection pools: {e}")
+            _loop.call_soon_threadsafe(_loop.stop)
+            _loop_thread.join(timeout=5)
+            _loop = None
+            _loop_thread = None
+        
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+atexit.register(close_async_db)
@@ -0,0 +1,289 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Most cached results kept per process; 0 disables the cache
+DB_QUERY_CACHE_SIZE = int(os.environ.get("DB_QUERY_CACHE_SIZE", "1000"))
+
+# Default lifetime of a cached result in seconds. Invalidation only reaches
+# this process, so the TTL also bounds how stale other workers can be.
+DB_QUERY_CACHE_TTL = float(os.environ.get("DB_QUERY_CACHE_TTL", "30"))
+
+# Tables written by a statement, for the common single-table forms
+_WRITE_TARGET = re.compile(
+    r"^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE(?:\s+IGNORE)?|DELETE\s+FROM"
+    r"|TRUNCATE(?:\s+TABLE)?|ALTER\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?)\s+`?(\w+)`?",
+    re.I
+)
+
+# Sentinel meaning "could not tell which tables a statement writes"
+ALL_TABLES = '*'
+
+# Tables whose rows are removed by ON DELETE CASCADE when a parent row is deleted
+CASCADES = {
+    'users': ('patients', 'doctors'),
+    'patients': ('appointments',),
+    'doctors': ('appointments', 'performance_metrics')
+}
+
+# Tables whose writes also bump their row in ``table_versions``, in the same
+# transaction, so every worker can tell which version of the data it has
+VERSIONED_TABLES = set()
+
+_DELETE = re.compile(r"^\s*DELETE\b", re.I)
+
+def written_tables(query):
+    """
+    Work out which tables a write statement modifies.
+    
+    Args:
+        query (str): SQL statement
+    
+    Returns:
+        set: Table names in lower case (including tables reached through
+        ON DELETE CASCADE for deletes), or {ALL_TABLES} if the statement
+        could not be parsed and every cached result must be dropped
+    """
+    match = _WRITE_TARGET.match(query)
+    if not match:
+        return {ALL_TABLES}
+    
+    tables = {match.group(1).lower()}
+    if _DELETE.match(query):
+        pending = list(tables)
+        while pending:
+            for child in CASCADES.get(pending.pop(), ()):
+                if child not in tables:
+                    tables.add(child)
+                    pending.append(child)
+    return tables
+
+def track_versions(tables):
+    """
+    Keep a shared data version for some tables from now on.
+    
+    Args:
+        tables (iterable): Table names
+    """
+    VERSIONED_TABLES.update(table.lower() for table in tables)
+
+def _cache_key(query, params):
+    """Build a hashable key from a statement and its parameters"""
+    if params is None:
+        return query, None
+    if isinstance(params, dict):
+        return query, tuple(sorted(params.items()))
+    return query, tuple(params)
+
+class QueryCache:
+    """
+    LRU cache of SELECT results with a TTL and table-level invalidation.
+    
+    Each entry records the tables it was read from. A write to any of those
+    tables drops the entry. Every table also has a generation counter that
+    invalidation bumps. A result is only stored if the generations of its
+    tables are unchanged since its query started. This stops a read that
+    raced a write from caching the old rows.
+    """
+    
+    def __init__(self, max_entries=DB_QUERY_CACHE_SIZE, default_ttl=DB_QUERY_CACHE_TTL):
+        """
+        Create an empty cache.
+        
+        Args:
+            max_entries (int): Most results kept; 0 disables caching
+            default_ttl (float): Lifetime of an entry in seconds
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, tables, rows)
+        self.table_keys = {}  # table -> set of keys that depend on it
+        self.generations = {}
+        self.written_at = {}  # table -> monotonic time this process last wrote it
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.stale_skips = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    @property
+    def enabled(self):
+        """Whether results are cached at all"""
+        return self.max_entries > 0
+    
+    def generation(self, tables):
+        """
+        Snapshot the generation counters of some tables before running a query.
+        
+        Args:
+            tables (iterable): Table names
+        
+        Returns:
+            tuple: Counters to pass back to ``put``
+        """
+        with self.lock:
+            return tuple(self.generations.get(table, 0) for table in tables) + (self.generations.get(ALL_TABLES, 0),)
+    
+    def written_within(self, tables, seconds):
+        """
+        Check whether this process wrote any of some tables recently.
+        
+        Args:
+            tables (iterable): Table names
+            seconds (float): How far back to look
+        
+        Returns:
+            bool: True if one of them was invalidated in the last ``seconds``
+        """
+        cutoff = time.monotonic() - seconds
+        
+        with self.lock:
+            return any(self.written_at.get(table, float('-inf')) > cutoff for table in (*tables, ALL_TABLES))
+    
+    def get(self, query, params):
+        """
+        Look up a cached result.
+        
+        Args:
+            query (str): SQL query
+            params (tuple|list|dict): Query parameters
+        
+        Returns:
+            list: Copies of the cached rows, or None on a miss
+        """
+        key = _cache_key(query, params)
+        
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, tables, rows = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+        
+        # Callers may modify the rows they get back, so hand out copies
+        return [dict(row) for row in rows]
+    
+    def put(self, query, params, rows, tables, generation, ttl=None):
+        """
+        Store a result unless one of its tables was written while it was read.
+        
+        Args:
+            query (str): SQL query
+            params (tuple|list|dict): Query parameters
+            rows (list): Result rows
+            tables (iterable): Tables the result depends on
+            generation (tuple): Value of ``generation(tables)`` taken before the query ran
+            ttl (float, optional): Lifetime in seconds (default: the cache's TTL)
+        """
+        key = _cache_key(query, params)
+        tables = tuple(tables)
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        
+        with self.lock:
+            current = tuple(self.generations.get(table, 0) for table in tables) + (self.generations.get(ALL_TABLES, 0),)
+            if current != generation:
+                self.stale_skips += 1
+                return
+            
+            if key in self.entries:
+                self._drop(key)
+            
+            self.entries[key] = (expires_at, tables, [dict(row) for row in rows])
+            for table in tables:
+                self.table_keys.setdefault(table, set()).add(key)
+            self.stores += 1
+            
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+    
+    def invalidate(self, tables):
+        """
+        Drop every entry that depends on any of the given tables.
+        
+        Args:
+            tables (iterable): Table names, or a set containing ALL_TABLES
+        """
+        now = time.monotonic()
+        
+        with self.lock:
+            for table in tables:
+                self.generations[table] = self.generations.get(table, 0) + 1
+                self.written_at[table] = now
+                
+                if table == ALL_TABLES:
+                    self.invalidations += len(self.entries)
+                    self.entries.clear()
+                    self.table_keys.clear()
+                    continue
+                
+                for key in list(self.table_keys.pop(table, ())):
+                    if key in self.entries:
+                        self._drop(key)
+                        self.invalidations += 1
+    
+    def _drop(self, key):
+        """Remove an entry and its table index references (lock held)"""
+        _, tables, _ = self.entries.pop(key)
+        for table in tables:
+            keys = self.table_keys.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.table_keys[table]
+    
+    def clear(self):
+        """Drop every entry and reset the statistics"""
+        with self.lock:
+            self.entries.clear()
+            self.table_keys.clear()
+            self.generations[ALL_TABLES] = self.generations.get(ALL_TABLES, 0) + 1
+            self.hits = self.misses = self.stores = self.stale_skips = 0
+            self.evictions = self.expirations = self.invalidations = 0
+    
+    def stats(self):
+        """
+        Get hit/miss counters and the current size.
+        
+        Returns:
+            dict: Cache statistics
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            tables = {table: len(keys) for table, keys in self.table_keys.items()}
+            
+            return {
+                'enabled': self.enabled,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'default_ttl': self.default_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0,
+                'stores': self.stores,
+                'stale_skips': self.stale_skips,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'entries_by_table': tables
+            }
+
+# Result cache shared by the database helpers in this process
+query_cache = QueryCache()
@@ -0,0 +1,171 @@
+"""
+Check that the hot queries are served by indexes.
+
+Runs EXPLAIN on each statement in HOT_QUERIES and fails when a table is
+read with a full scan. Run it against a migrated database before deploying:
+
+    python -m backend.db.explain [--max-scan-rows N]
+"""
+import sys
+import argparse
+from datetime import datetime, timedelta
+from backend.db.mysql import get_connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _report_range():
+    """Sample half-open range matching the admin report predicates"""
+    end = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    return end - timedelta(days=31), end
+
+def _booking_window():
+    """Sample params of the overlap predicate in ``find_conflict`` for a 30 minute booking"""
+    start = datetime.now()
+    # Appointments start at most MAX_APPOINTMENT_MINUTES (240) before an overlapping one
+    return 1, start - timedelta(minutes=240), start + timedelta(minutes=30), start, 0
+
+# (name, statement, sample params) for the statements on the request path.
+# Keep in sync with the routes when a hot query changes shape.
+HOT_QUERIES = [
+    ('login by email',
+     "SELECT uid, role, password_hash FROM users WHERE email = %s",
+     ('someone@example.com',)),
+    ('patient profile by uid',
+     "SELECT patient_id, name FROM patients WHERE uid = %s",
+     (1,)),
+    ('doctor profile by uid',
+     "SELECT doctor_id, name, specialization FROM doctors WHERE uid = %s",
+     (1,)),
+    ('patient appointment list',
+     """
+     SELECT a.*, d.name as doctor_name, d.specialization
+     FROM appointments a JOIN doctors d ON a.doctor_id = d.doctor_id
+     WHERE a.patient_id = %s ORDER BY a.appointment_time, a.id LIMIT 51
+     """,
+     (1,)),
+    ('doctor appointment list',
+     """
+     SELECT a.*, p.name as patient_name
+     FROM appointments a JOIN patients p ON a.patient_id = p.patient_id
+     WHERE a.doctor_id = %s ORDER BY a.appointment_time, a.id LIMIT 51
+     """,
+     (1,)),
+    ('doctor scheduled appointments',
+     "SELECT COUNT(*) FROM appointments WHERE doctor_id = %s AND status = 'scheduled'",
+     (1,)),
+    ('booking conflict check',
+     """
+     SELECT id FROM appointments
+     WHERE doctor_id = %s AND status != 'cancelled'
+       AND appointment_time > %s AND appointment_time < %s AND end_time > %s
+       AND id != %s
+     LIMIT 1
+     FOR UPDATE
+     """,
+     _booking_window()),
+    ('report appointments by status',
+     "SELECT COUNT(*) as count, status FROM appointments WHERE appointment_time >= %s AND appointment_time < %s GROUP BY status",
+     _report_range()),
+    ('report urgency distribution',
+     "SELECT urgency, COUNT(*) FROM appointments WHERE appointment_time >= %s AND appointment_time < %s GROUP BY urgency",
+     _report_range()),
+    ('doctor metrics by date',
+     "SELECT id FROM performance_metrics WHERE doctor_id = %s AND date = %s",
+     (1, datetime.now().date())),
+    ('metrics summary by date range',
+     "SELECT AVG(avg_response_time), AVG(satisfaction_score) FROM performance_metrics WHERE date BETWEEN %s AND %s",
+     tuple(value.date() for value in _report_range())),
+]
+
+def explain_query(cursor, query, params):
+    """
+    Run EXPLAIN for a statement.
+    
+    Args:
+        cursor: Dictionary cursor
+        query (str): SQL statement
+        params (tuple): Sample parameters
+    
+    Returns:
+        list: EXPLAIN rows as dictionaries
+    """
+    cursor.execute("EXPLAIN " + query, params)
+    return cursor.fetchall()
+
+def find_full_scans(plan, max_scan_rows):
+    """
+    Pick out the plan rows that read a whole table.
+    
+    A row fails if it is a full scan (type ALL) with no usable index at all,
+    which means the predicate cannot use one, or if the optimizer chose a
+    full scan over an estimated ``max_scan_rows`` rows or more.
+    
+    Args:
+        plan (list): EXPLAIN rows
+        max_scan_rows (int): Largest full scan tolerated when an index exists
+    
+    Returns:
+        list: Failing plan rows
+    """
+    failures = []
+    
+    for row in plan:
+        if row.get('type') != 'ALL':
+            continue
+        if not row.get('possible_keys') or (row.get('rows') or 0) >= max_scan_rows:
+            failures.append(row)
+    
+    return failures
+
+def check_query_plans(max_scan_rows=1000):
+    """
+    EXPLAIN every hot query.
+    
+    Args:
+        max_scan_rows (int): Largest full scan tolerated when an index exists
+    
+    Returns:
+        list: (name, failing plan rows) for each query that falls back to a full scan
+    """
+    connection = get_connection()
+    if connection is None:
+        raise Exception("Database connection error")
+    
+    problems = []
+    cursor = connection.cursor(dictionary=True)
+    
+    try:
+        for name, query, params in HOT_QUERIES:
+            failures = find_full_scans(explain_query(cursor, query, params), max_scan_rows)
+            
+            if failures:
+                problems.append((name, failures))
+                for row in failures:
+                    logger.error(f"{name}: full scan of {row.get('table')} (~{row.get('rows')} rows, possible keys: {row.get('possible_keys')})")
+            else:
+                logger.info(f"{name}: ok")
+    finally:
+        cursor.close()
+        connection.close()
+    
+    return problems
+
+def main(argv=None):
+    """Command-line entry point; exits non-zero when any hot query scans a table"""
+    parser = argparse.ArgumentParser(description="Fail if hot queries fall back to full table scans")
+    parser.add_argument('--max-scan-rows', type=int, default=1000,
+                        help="largest full scan tolerated when an index exists (default: 1000)")
+    args = parser.parse_args(argv)
+    
+    problems = check_query_plans(args.max_scan_rows)
+    if problems:
+        logger.error(f"{len(problems)} hot queries fall back to full table scans")
+        return 1
+    
+    logger.info("All hot queries use indexes")
+    return 0
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,221 @@
+from mysql.connector import Error
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Name of the advisory lock that stops two workers migrating at once
+MIGRATION_LOCK = 'hdims_schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 60
+
+def index_exists(cursor, table, index_name):
+    """
+    Check whether a table already has an index.
+    
+    Args:
+        cursor: Database cursor
+        table (str): Table name
+        index_name (str): Index name
+    
+    Returns:
+        bool: True if the index exists
+    """
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """,
+        (table, index_name)
+    )
+    return cursor.fetchone() is not None
+
+def column_exists(cursor, table, column):
+    """
+    Check whether a table already has a column.
+    
+    Args:
+        cursor: Database cursor
+        table (str): Table name
+        column (str): Column name
+    
+    Returns:
+        bool: True if the column exists
+    """
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+        """,
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+def add_index(cursor, table, index_name, definition):
+    """
+    Add an index unless one with the same name exists.
+    
+    Args:
+        cursor: Database cursor
+        table (str): Table name
+        index_name (str): Index name
+        definition (str): Index definition, e.g. "INDEX idx (a, b)"
+    """
+    if index_exists(cursor, table, index_name):
+        logger.debug(f"Index {index_name} on {table} already exists")
+        return
+    
+    cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+    logger.info(f"Created index {index_name} on {table}")
+
+def migration_001_secondary_indexes(cursor):
+    """Composite and covering indexes for the hot appointment, profile and metrics queries"""
+    # Doctor schedules and availability counts filter on (doctor_id, status)
+    # and order by time
+    add_index(cursor, 'appointments', 'idx_appointments_doctor_status_time',
+              "INDEX idx_appointments_doctor_status_time (doctor_id, status, appointment_time)")
+    add_index(cursor, 'appointments', 'idx_appointments_doctor_time',
+              "INDEX idx_appointments_doctor_time (doctor_id, appointment_time)")
+    
+    # Patient lists and history order by time within a patient
+    add_index(cursor, 'appointments', 'idx_appointments_patient_time',
+              "INDEX idx_appointments_patient_time (patient_id, appointment_time)")
+    
+    # Date-range reports group by status and urgency, so cover both
+    add_index(cursor, 'appointments', 'idx_appointments_time_status_urgency',
+              "INDEX idx_appointments_time_status_urgency (appointment_time, status, urgency)")
+    
+    # Token -> profile lookups read these columns by uid
+    add_index(cursor, 'patients', 'idx_patients_uid_name',
+              "INDEX idx_patients_uid_name (uid, name)")
+    add_index(cursor, 'doctors', 'idx_doctors_uid_name_specialization',
+              "INDEX idx_doctors_uid_name_specialization (uid, name, specialization)")
+    add_index(cursor, 'doctors', 'idx_doctors_specialization',
+              "INDEX idx_doctors_specialization (specialization)")
+    
+    # Hospital-wide metric summaries filter on date only
+    add_index(cursor, 'performance_metrics', 'idx_metrics_date',
+              "INDEX idx_metrics_date (date, avg_response_time, satisfaction_score)")
+
+def migration_002_unique_doctor_date_metrics(cursor):
+    """One metrics row per doctor and day, required by the metrics upserts"""
+    if index_exists(cursor, 'performance_metrics', 'uq_metrics_doctor_date'):
+        return
+    
+    # Keep the most recently inserted row for any duplicated doctor/day
+    cursor.execute(
+        """
+        DELETE older FROM performance_metrics older
+        JOIN performance_metrics newer
+          ON newer.doctor_id = older.doctor_id AND newer.date = older.date AND newer.id > older.id
+        """
+    )
+    if cursor.rowcount:
+        logger.info(f"Removed {cursor.rowcount} duplicate performance metrics rows")
+    
+    add_index(cursor, 'performance_metrics', 'uq_metrics_doctor_date',
+              "UNIQUE KEY uq_metrics_doctor_date (doctor_id, date)")
+
+def migration_003_appointment_queue_events(cursor):
+    """Change log that keeps every worker's urgency queue in step"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS appointment_queue_events (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            appointment_id INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_queue_events_created (created_at)
+        )
+        """
+    )
+
+def migration_004_appointment_end_time(cursor):
+    """End time on appointments, so bookings can be checked for overlaps"""
+    if not column_exists(cursor, 'appointments', 'end_time'):
+        cursor.execute("ALTER TABLE appointments ADD COLUMN end_time DATETIME NULL AFTER appointment_time")
+        logger.info("Added end_time to appointments")
+    
+    # Existing appointments get the default 30-minute length
+    cursor.execute(
+        "UPDATE appointments SET end_time = appointment_time + INTERVAL 30 MINUTE WHERE end_time IS NULL"
+    )
+
+def migration_005_table_versions(cursor):
+    """Shared per-table data versions, bumped with every write to a tracked table"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+# Ordered list of (version, description, function). Append new migrations
+# at the end; never renumber or edit one that has shipped.
+MIGRATIONS = [
+    (1, 'Secondary indexes for hot queries', migration_001_secondary_indexes),
+    (2, 'Unique (doctor_id, date) on performance_metrics', migration_002_unique_doctor_date_metrics),
+    (3, 'Appointment urgency queue change log', migration_003_appointment_queue_events),
+    (4, 'Appointment end times', migration_004_appointment_end_time),
+    (5, 'Shared table data versions', migration_005_table_versions),
+]
+
+def run_migrations(connection):
+    """
+    Apply every migration newer than the recorded schema version.
+    
+    Args:
+        connection: Database connection (not returned to the pool here)
+    
+    Returns:
+        list: Versions applied by this call
+    """
+    applied = []
+    cursor = connection.cursor(buffered=True)
+    
+    try:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            logger.error("Could not acquire the schema migration lock")
+            return applied
+        
+        try:
+            cursor.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
+            
+            for version, description, migrate in MIGRATIONS:
+                if version in done:
+                    continue
+                
+                # MySQL commits DDL implicitly, so each step is written to be
+                # safe to re-run if a migration fails part way through
+                migrate(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                connection.commit()
+                applied.append(version)
+                logger.info(f"Applied migration {version}: {description}")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+    
+    except Error as e:
+        logger.error(f"Error running migrations: {e}")
+        connection.rollback()
+    finally:
+        cursor.close()
+    
+    return applied
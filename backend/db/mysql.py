@@ -1,30 +1,68 @@
 import os
+import time
+import itertools
+import threading
+from contextlib import contextmanager
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error
+from backend.db.pool import InstrumentedPool, default_pool_size
+from backend.db.migrations import run_migrations
+from backend.db.stats import statement_stats, redact_params
+from backend.db.cache import query_cache, written_tables, VERSIONED_TABLES, ALL_TABLES
+from flask import g, has_app_context, has_request_context, request
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Database configuration from environment variables
 DB_HOST = os.environ.get("DB_HOST", "localhost")
+DB_PORT = int(os.environ.get("DB_PORT", "3306"))
 DB_USER = os.environ.get("DB_USER", "root")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "")
 DB_NAME = os.environ.get("DB_NAME", "hdims")
 
+# Pool sizing: DB_POOL_SIZE, or derived from the worker's thread count
+DB_POOL_SIZE = default_pool_size()
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+DB_POOL_MAX_WAITERS = int(os.environ["DB_POOL_MAX_WAITERS"]) if os.environ.get("DB_POOL_MAX_WAITERS") else None
+
+# Read replicas as a comma-separated list of host[:port]; empty disables splitting
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+DB_REPLICA_USER = os.environ.get("DB_REPLICA_USER", DB_USER)
+DB_REPLICA_PASSWORD = os.environ.get("DB_REPLICA_PASSWORD", DB_PASSWORD)
+DB_REPLICA_POOL_SIZE = int(os.environ.get("DB_REPLICA_POOL_SIZE", "5"))
+
+# Seconds a replica may trail the primary. Cacheable reads of a table this
+# process wrote more recently go to the primary, so the cache is not filled
+# with rows from before the write under the write's generation.
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", "2"))
+
+# HTTP methods whose requests may read from replicas
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
 # Create a database connection pool
 connection_pool = None
 
+# Read replica pools, tried round-robin for SELECTs
+replica_pools = []
+_replica_counter = itertools.count()
+
+# Connection state for work done outside a Flask request (scripts, startup)
+_local = threading.local()
+
 def initialize_db():
     """Initialize the database connection pool and create tables if they don't exist"""
     global connection_pool
     
     try:
-        connection_pool = mysql.connector.pooling.MySQLConnectionPool(
+        connection_pool = InstrumentedPool(
             pool_name="hdims_pool",
-            pool_size=5,
+            pool_size=DB_POOL_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            max_waiters=DB_POOL_MAX_WAITERS,
             host=DB_HOST,
+            port=DB_PORT,
             user=DB_USER,
             password=DB_PASSWORD,
             database=DB_NAME
@@ -32,25 +70,96 @@ def initialize_db():
         
         logger.info("Connection pool created successfully")
         
+        initialize_replicas()
+        
         # Create database tables if they don't exist
         create_tables()
         
     except Error as e:
         logger.error(f"Error while connecting to MySQL: {e}")
 
-def get_connection():
-    """Get a connection from the pool"""
+def initialize_replicas():
+    """Create one connection pool per configured read replica"""
+    global replica_pools
+    
+    pools = []
+    for index, replica in enumerate(DB_REPLICA_HOSTS):
+        host, _, port = replica.partition(':')
+        
+        try:
+            pools.append(InstrumentedPool(
+                pool_name=f"hdims_replica_{index}",
+                pool_size=DB_REPLICA_POOL_SIZE,
+                host=host,
+                port=int(port or 3306),
+                user=DB_REPLICA_USER,
+                password=DB_REPLICA_PASSWORD,
+                database=DB_NAME
+            ))
+            logger.info(f"Replica connection pool created for {replica}")
+        except Error as e:
+            # A missing replica only costs read capacity; reads fall back to the primary
+            logger.error(f"Error while connecting to replica {replica}: {e}")
+    
+    replica_pools = pools
+
+def _get_replica_connection():
+    """
+    Get a connection from the next replica pool in round-robin order.
+    
+    Replicas are not waited on: if every replica pool is busy the read
+    overflows to the primary instead.
+    
+    Returns:
+        connection: Replica connection, or None if every replica is unavailable
+    """
+    start = next(_replica_counter)
+    
+    for offset in range(len(replica_pools)):
+        pool = replica_pools[(start + offset) % len(replica_pools)]
+        try:
+            return pool.get_connection(timeout=0)
+        except Error as e:
+            logger.error(f"Error while getting connection from replica pool {pool.pool_name}: {e}")
+    
+    return None
+
+def get_connection(readonly=False):
+    """
+    Get a connection from the pool.
+    
+    Args:
+        readonly (bool): Prefer a read replica; falls back to the primary
+            when no replica is configured or reachable
+    """
     global connection_pool
     
     if connection_pool is None:
         initialize_db()
     
+    if readonly and replica_pools:
+        connection = _get_replica_connection()
+        if connection is not None:
+            return connection
+    
     try:
         return connection_pool.get_connection()
     except Error as e:
         logger.error(f"Error while getting connection from pool: {e}")
         return None
 
+def pool_stats():
+    """
+    Get checkout metrics for the primary and replica pools.
+    
+    Returns:
+        dict: Stats from ``InstrumentedPool.stats`` keyed by role
+    """
+    return {
+        'primary': connection_pool.stats() if connection_pool else None,
+        'replicas': [pool.stats() for pool in replica_pools]
+    }
+
 def create_tables():
     """Create necessary tables if they don't exist"""
     tables = [
@@ -110,6 +219,7 @@ def create_tables():
             avg_response_time FLOAT,
             patients_seen INT DEFAULT 0,
             satisfaction_score FLOAT DEFAULT 0,
+            UNIQUE KEY uq_metrics_doctor_date (doctor_id, date),
             FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE CASCADE
         )
         """
@@ -126,67 +236,549 @@ def create_tables():
             connection.commit()
             logger.info("Tables created successfully")
             
+            # Bring indexes and later schema changes up to date
+            run_migrations(connection)
+            
         except Error as e:
             logger.error(f"Error creating tables: {e}")
         finally:
             cursor.close()
             connection.close()
 
-def execute_query(query, params=None):
-    """Execute a query with parameters and return the last row id if applicable"""
-    connection = get_connection()
-    cursor = None
-    last_row_id = None
+def _context():
+    """Return the object holding connection state for the current unit of work"""
+    return g if has_app_context() else _local
+
+def _in_transaction():
+    """Check whether the current unit of work is inside ``transaction()``"""
+    return getattr(_context(), 'db_transaction_depth', 0) > 0
+
+def _replica_reads_allowed(state):
+    """
+    Decide whether a read in the current unit of work may go to a replica.
     
-    if connection:
+    Reads stay on the primary inside transactions, inside ``use_primary()``,
+    after the request has written (read-your-writes) and for the whole of
+    any request that is not a GET/HEAD/OPTIONS, since those check-then-write.
+    """
+    if not replica_pools:
+        return False
+    if getattr(state, 'db_transaction_depth', 0) or getattr(state, 'db_primary_depth', 0):
+        return False
+    if getattr(state, 'db_wrote', False):
+        return False
+    if has_request_context() and request.method not in READ_ONLY_METHODS:
+        return False
+    return True
+
+def replica_reads_allowed():
+    """Check whether a read issued now may go to a read replica"""
+    return _replica_reads_allowed(_context())
+
+def _borrow_connection(readonly=False):
+    """
+    Get the connection for the current unit of work.
+    
+    Inside a Flask application context the connection is borrowed once and
+    stored on ``flask.g`` so every statement in the request reuses it; it is
+    returned to the pool by ``close_db`` at teardown. Outside a request the
+    caller owns the connection and must close it, unless a ``transaction()``
+    is holding one open.
+    
+    Args:
+        readonly (bool): The statement is a read that may use a replica
+    
+    Returns:
+        tuple: (connection, owned) where owned is True if the caller must close it
+    """
+    state = _context()
+    use_replica = readonly and _replica_reads_allowed(state)
+    attribute = 'db_replica_connection' if use_replica else 'db_connection'
+    connection = getattr(state, attribute, None)
+    
+    if connection is not None:
+        return connection, False
+    
+    connection = get_connection(readonly=use_replica)
+    if connection is None:
+        logger.error("Could not get database connection")
+        raise Exception("Database connection error")
+    
+    if has_app_context():
+        setattr(g, attribute, connection)
+        return connection, False
+    return connection, True
+
+def _mark_written():
+    """Keep the rest of the request's reads on the primary after a write"""
+    if has_app_context():
+        g.db_wrote = True
+
+def cacheable_read_on_replica(cache_tables, primary=False):
+    """
+    Decide whether a read whose result will be cached may go to a replica.
+    
+    Args:
+        cache_tables (tuple): Tables the result depends on
+        primary (bool): The caller asked for the primary
+    
+    Returns:
+        bool: False if this process wrote one of the tables within DB_REPLICA_MAX_LAG
+    """
+    return not primary and not query_cache.written_within(cache_tables, DB_REPLICA_MAX_LAG)
+
+def cache_reads_allowed():
+    """Check whether a read issued now may be answered from the query cache"""
+    state = _context()
+    return not getattr(state, 'db_transaction_depth', 0) and not getattr(state, 'db_primary_depth', 0)
+
+@contextmanager
+def use_primary():
+    """
+    Route every read inside the block to the primary, past the query cache.
+    
+    Use for reads that must observe the latest committed writes, such as a
+    check that guards a subsequent write.
+    """
+    state = _context()
+    state.db_primary_depth = getattr(state, 'db_primary_depth', 0) + 1
+    
+    try:
+        yield
+    finally:
+        state.db_primary_depth -= 1
+
+@contextmanager
+def transaction():
+    """
+    Group several writes into a single commit.
+    
+    Statements run through ``execute``/``execute_many``/``upsert_many`` inside
+    the block are committed together on exit and rolled back if the block
+    raises. Nested blocks join the outermost transaction. The outermost block
+    starts a fresh read snapshot, even if the request already read on the
+    same connection.
+    
+    Yields:
+        connection: The connection the transaction runs on
+    """
+    state = _context()
+    depth = getattr(state, 'db_transaction_depth', 0)
+    
+    if depth:
+        state.db_transaction_depth = depth + 1
         try:
-            cursor = connection.cursor()
-            cursor.execute(query, params)
-            connection.commit()
-            
-            # Check if this is an INSERT query that would have an auto-increment ID
-            if query.strip().upper().startswith("INSERT"):
-                last_row_id = cursor.lastrowid
-                
-            logger.debug(f"Query executed successfully: {query}")
-            return last_row_id
-            
-        except Error as e:
-            logger.error(f"Error executing query: {e}")
-            logger.error(f"Query: {query}")
-            logger.error(f"Params: {params}")
-            connection.rollback()
-            raise e
+            yield state.db_connection
         finally:
-            if cursor:
-                cursor.close()
+            state.db_transaction_depth = depth
+        return
+    
+    connection, owned = _borrow_connection()
+    if owned:
+        state.db_connection = connection
+    else:
+        # Reads earlier in the request may have opened a REPEATABLE READ
+        # snapshot on this connection; writes outside a transaction are
+        # already committed, so end it and let the transaction take a
+        # fresh one
+        connection.rollback()
+    state.db_transaction_depth = 1
+    state.db_transaction_tables = set()
+    state.db_transaction_versions = set()
+    
+    try:
+        yield connection
+        _write_versions(connection, state.db_transaction_versions)
+        connection.commit()
+        # Results cached while the transaction was open saw the old rows
+        query_cache.invalidate(state.db_transaction_tables)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        state.db_transaction_depth = 0
+        state.db_transaction_tables = set()
+        state.db_transaction_versions = set()
+        if owned:
+            state.db_connection = None
             connection.close()
+
+def close_db(exception=None):
+    """Return the request's connections to their pools (registered as a teardown handler)"""
+    for attribute in ('db_connection', 'db_replica_connection'):
+        connection = g.pop(attribute, None)
+        
+        if connection is not None:
+            try:
+                # End the read snapshot (or abandon a failed write) before the
+                # connection goes back to the pool
+                connection.rollback()
+            except Error as e:
+                logger.error(f"Error rolling back connection on teardown: {e}")
+            finally:
+                connection.close()
+
+def init_app(app):
+    """Register the per-request connection teardown with a Flask app"""
+    app.teardown_appcontext(close_db)
+
+def _record_failure(query, params, started, error):
+    """Log a failed statement (parameters redacted) and count it in the statement stats"""
+    logger.error(f"Error executing query: {error}")
+    logger.error(f"Query: {query}")
+    logger.error(f"Params: {redact_params(params)}")
+    if started is not None:
+        statement_stats.record(query, time.perf_counter() - started, 0, params, error=True)
+
+def _bump_versions(connection, query):
+    """
+    Bump the shared version of each versioned table a write statement touched.
+    
+    Inside ``transaction()`` the tables are only collected, and bumped once
+    just before the commit, so a transaction writes ``table_versions`` once
+    however many statements it runs and holds those row locks only while it
+    commits.
+    """
+    tables = written_tables(query)
+    tables = set(VERSIONED_TABLES) if ALL_TABLES in tables else tables & VERSIONED_TABLES
+    
+    if _in_transaction():
+        _context().db_transaction_versions.update(tables)
     else:
-        logger.error("Could not get database connection")
-        raise Exception("Database connection error")
+        _write_versions(connection, tables)
 
-def fetch_results(query, params=None):
-    """Execute a SELECT query and return results as a list of dictionaries"""
-    connection = get_connection()
-    cursor = None
+def _write_versions(connection, tables):
+    """Increment the ``table_versions`` rows of some tables on a connection"""
+    if not tables:
+        return
     
-    if connection:
-        try:
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            logger.debug(f"Query executed successfully: {query}")
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO table_versions (table_name, version) VALUES "
+            + ', '.join(['(%s, 1)'] * len(tables))
+            + " ON DUPLICATE KEY UPDATE version = version + 1",
+            sorted(tables)
+        )
+    finally:
+        cursor.close()
+
+def _invalidate_cache(query):
+    """Drop cached results that depend on the tables a write statement touched"""
+    tables = written_tables(query)
+    query_cache.invalidate(tables)
+    
+    if _in_transaction():
+        # Invalidate again on commit, in case a result was cached in between
+        _context().db_transaction_tables.update(tables)
+
+def query_all(query, params=None, primary=False, cache_tables=None, ttl=None):
+    """
+    Run a SELECT and return all rows in a single round trip.
+    
+    Args:
+        query (str): SQL query
+        params (tuple|list, optional): Query parameters
+        primary (bool): Read from the primary even if replicas are configured
+        cache_tables (tuple, optional): Tables the result depends on. When
+            given, the result is cached until one of them is written or the
+            TTL passes. Leave unset for results that must be current.
+        ttl (float, optional): Cache lifetime in seconds (default: DB_QUERY_CACHE_TTL)
+        
+    Returns:
+        list: Rows as dictionaries
+    """
+    use_cache = bool(cache_tables) and query_cache.enabled and cache_reads_allowed()
+    if use_cache:
+        results = query_cache.get(query, params)
+        if results is not None:
             return results
+        generation = query_cache.generation(cache_tables)
+        primary = not cacheable_read_on_replica(cache_tables, primary)
+    
+    connection, owned = _borrow_connection(readonly=not primary)
+    cursor = None
+    started = None
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        results = cursor.fetchall()
+        statement_stats.record(query, time.perf_counter() - started, len(results), params)
+        
+        if use_cache:
+            query_cache.put(query, params, results, cache_tables, generation, ttl)
+        return results
+        
+    except Error as e:
+        _record_failure(query, params, started, e)
+        raise e
+    finally:
+        if cursor:
+            cursor.close()
+        if owned:
+            connection.close()
+
+def query_one(query, params=None, primary=False, cache_tables=None, ttl=None):
+    """
+    Run a SELECT and return the first row.
+    
+    Args:
+        query (str): SQL query
+        params (tuple|list, optional): Query parameters
+        primary (bool): Read from the primary even if replicas are configured
+        cache_tables (tuple, optional): Tables the result depends on (see ``query_all``)
+        ttl (float, optional): Cache lifetime in seconds
+        
+    Returns:
+        dict: First row, or None if the query returned nothing
+    """
+    rows = query_all(query, params, primary, cache_tables, ttl)
+    return rows[0] if rows else None
+
+class RowStream:
+    """
+    Iterator over an unbuffered cursor that fetches rows in batches.
+    
+    Holds its own pooled connection until exhausted or closed. The statement
+    is recorded in the statement stats on close, timed from execution until
+    the last row was read.
+    """
+    
+    def __init__(self, connection, cursor, batch_size, query=None, params=None, started=None):
+        self.connection = connection
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.query = query
+        self.params = params
+        self.started = started if started is not None else time.perf_counter()
+        self.rows = 0
+        self.buffer = []
+        self.closed = False
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        if not self.buffer:
+            if self.closed:
+                raise StopIteration
             
+            self.buffer = self.cursor.fetchmany(self.batch_size)
+            if not self.buffer:
+                self.close()
+                raise StopIteration
+            self.rows += len(self.buffer)
+            self.buffer.reverse()
+        
+        return self.buffer.pop()
+    
+    def close(self):
+        """Release the cursor and return the connection to the pool"""
+        if self.closed:
+            return
+        
+        self.closed = True
+        self.buffer = []
+        
+        if self.query:
+            statement_stats.record(self.query, time.perf_counter() - self.started, self.rows, self.params)
+        
+        try:
+            # Closing an unbuffered cursor drains any unread rows
+            self.cursor.close()
         except Error as e:
-            logger.error(f"Error executing query: {e}")
-            logger.error(f"Query: {query}")
-            logger.error(f"Params: {params}")
-            raise e
+            logger.error(f"Error closing streaming cursor: {e}")
         finally:
-            if cursor:
-                cursor.close()
-            connection.close()
-    else:
+            try:
+                self.connection.rollback()
+            finally:
+                self.connection.close()
+
+def stream_query(query, params=None, batch_size=500, primary=False):
+    """
+    Run a SELECT and iterate its rows without buffering the full result.
+    
+    The statement runs immediately (so errors surface before a response is
+    started); rows are then read from an unbuffered cursor ``batch_size`` at
+    a time, keeping memory flat however large the result is. The stream uses
+    its own pooled connection so the request connection stays free.
+    
+    Args:
+        query (str): SQL query
+        params (tuple|list, optional): Query parameters
+        batch_size (int): Rows fetched per round trip
+        primary (bool): Read from the primary even if replicas are configured
+        
+    Returns:
+        RowStream: Iterator of rows as dictionaries; call ``close()`` if it
+        is abandoned before being exhausted
+    """
+    connection = get_connection(readonly=not primary and replica_reads_allowed())
+    if connection is None:
         logger.error("Could not get database connection")
         raise Exception("Database connection error")
+    
+    cursor = None
+    started = None
+    
+    try:
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        return RowStream(connection, cursor, batch_size, query, params, started)
+        
+    except Error as e:
+        _record_failure(query, params, started, e)
+        if cursor:
+            cursor.close()
+        connection.close()
+        raise e
+
+def _execute(query, params=None):
+    """
+    Run a write statement, committing unless inside ``transaction()``.
+    
+    Returns:
+        tuple: (lastrowid, rowcount)
+    """
+    connection, owned = _borrow_connection()
+    cursor = None
+    started = None
+    
+    try:
+        cursor = connection.cursor()
+        _mark_written()
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        _bump_versions(connection, query)
+        if not _in_transaction():
+            connection.commit()
+        _invalidate_cache(query)
+        statement_stats.record(query, time.perf_counter() - started, cursor.rowcount, params)
+        return cursor.lastrowid, cursor.rowcount
+        
+    except Error as e:
+        _record_failure(query, params, started, e)
+        if not _in_transaction():
+            connection.rollback()
+        raise e
+    finally:
+        if cursor:
+            cursor.close()
+        if owned:
+            connection.close()
+
+def execute(query, params=None):
+    """
+    Run a write statement and commit it.
+    
+    Args:
+        query (str): SQL statement
+        params (tuple|list, optional): Statement parameters
+        
+    Returns:
+        int: Auto-increment id for INSERTs, otherwise the affected row count
+    """
+    last_row_id, row_count = _execute(query, params)
+    
+    # Check if this is an INSERT query that would have an auto-increment ID
+    if query.strip().upper().startswith("INSERT"):
+        return last_row_id
+    return row_count
+
+def execute_many(query, seq_params):
+    """
+    Run one write statement for many parameter sets.
+    
+    mysql.connector rewrites ``INSERT ... VALUES`` statements into a single
+    multi-row INSERT, so this costs one round trip rather than one per row.
+    
+    Args:
+        query (str): SQL statement
+        seq_params (list): Sequence of parameter tuples
+        
+    Returns:
+        int: Affected row count
+    """
+    if not seq_params:
+        return 0
+    
+    connection, owned = _borrow_connection()
+    cursor = None
+    started = None
+    
+    try:
+        cursor = connection.cursor()
+        _mark_written()
+        started = time.perf_counter()
+        cursor.executemany(query, seq_params)
+        _bump_versions(connection, query)
+        if not _in_transaction():
+            connection.commit()
+        _invalidate_cache(query)
+        statement_stats.record(query, time.perf_counter() - started, cursor.rowcount, seq_params)
+        return cursor.rowcount
+        
+    except Error as e:
+        _record_failure(query, seq_params, started, e)
+        if not _in_transaction():
+            connection.rollback()
+        raise e
+    finally:
+        if cursor:
+            cursor.close()
+        if owned:
+            connection.close()
+
+def upsert_many(table, columns, rows, update_columns=None, chunk_size=500):
+    """
+    Insert rows, updating those that collide with a unique key.
+    
+    Each chunk is sent as a single multi-row
+    ``INSERT ... ON DUPLICATE KEY UPDATE`` statement.
+    
+    Args:
+        table (str): Target table (trusted identifier, never user input)
+        columns (list): Column names matching the order of values in each row
+        rows (list): Sequence of value tuples
+        update_columns (list, optional): Columns to overwrite on conflict
+            (default: every column in ``columns``)
+        chunk_size (int): Maximum rows per statement
+        
+    Returns:
+        int: Affected row count as reported by MySQL (1 per insert, 2 per update)
+    """
+    if not rows:
+        return 0
+    
+    update_columns = update_columns or columns
+    column_list = ', '.join(columns)
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    assignments = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+    
+    affected = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        query = (
+            f"INSERT INTO {table} ({column_list}) VALUES "
+            + ', '.join([row_placeholder] * len(chunk))
+            + f" ON DUPLICATE KEY UPDATE {assignments}"
+        )
+        params = [value for row in chunk for value in row]
+        affected += _execute(query, params)[1]
+    
+    return affected
+
+def execute_query(query, params=None):
+    """Execute a query with parameters and return the last row id if applicable"""
+    last_row_id = execute(query, params)
+    
+    if query.strip().upper().startswith("INSERT"):
+        return last_row_id
+    return None
+
+def fetch_results(query, params=None):
+    """Execute a SELECT query and return results as a list of dictionaries"""
+    return query_all(query, params)
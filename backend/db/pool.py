@@ -0,0 +1,228 @@
+import os
+import time
+import threading
+from collections import deque
+import mysql.connector.pooling
+from mysql.connector import errors
+import logging
+
+logger = logging.getLogger(__name__)
+
+# mysql.connector refuses pools larger than this
+MAX_POOL_SIZE = mysql.connector.pooling.CNX_POOL_MAXSIZE
+
+# Number of recent checkout waits kept for percentile calculations
+WAIT_SAMPLE_SIZE = 1000
+
+def default_pool_size():
+    """
+    Size a worker's pool from configuration.
+    
+    ``DB_POOL_SIZE`` wins if set. Otherwise the pool gets one connection per
+    request thread in this worker (``GUNICORN_THREADS``/``WEB_THREADS``) plus
+    headroom for streaming responses, which hold a second connection.
+    
+    Returns:
+        int: Pool size between 1 and MAX_POOL_SIZE
+    """
+    configured = os.environ.get("DB_POOL_SIZE")
+    if configured:
+        size = int(configured)
+    else:
+        threads = int(os.environ.get("GUNICORN_THREADS", os.environ.get("WEB_THREADS", "4")))
+        size = max(5, threads + 2)
+    
+    return max(1, min(size, MAX_POOL_SIZE))
+
+class InstrumentedPool:
+    """
+    Wrapper around MySQLConnectionPool that waits for free connections and
+    records checkout metrics.
+    
+    When the pool is exhausted callers join a bounded wait queue and are
+    woken as connections are returned, up to ``timeout`` seconds.
+    """
+    
+    def __init__(self, pool_name, pool_size, timeout=5.0, max_waiters=None, **connection_args):
+        """
+        Create the underlying pool.
+        
+        Args:
+            pool_name (str): Name of the pool
+            pool_size (int): Number of connections
+            timeout (float): Seconds to wait for a free connection
+            max_waiters (int, optional): Longest allowed wait queue (default: 2 x pool_size)
+            **connection_args: Arguments passed to mysql.connector
+        """
+        self.pool = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name=pool_name,
+            pool_size=pool_size,
+            **connection_args
+        )
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_waiters = max_waiters if max_waiters is not None else pool_size * 2
+        
+        self.condition = threading.Condition()
+        self.waiting = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.releases = 0
+        self.exhausted_events = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self.total_held = 0.0
+        self.max_held = 0.0
+        self.connection_created = {}  # Maps id of the underlying connection to (server thread id, opened at)
+    
+    def get_connection(self, timeout=None):
+        """
+        Check out a connection, waiting if the pool is exhausted.
+        
+        Args:
+            timeout (float, optional): Override the pool's wait timeout
+        
+        Returns:
+            TrackedConnection: Connection that reports back when closed
+        
+        Raises:
+            mysql.connector.errors.PoolError: If the wait queue is full or the
+                timeout expires
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        exhausted = False
+        
+        with self.condition:
+            while self.in_use >= self.pool_size:
+                if not exhausted:
+                    exhausted = True
+                    self.exhausted_events += 1
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise errors.PoolError(
+                        f"Timed out after {timeout:.1f}s waiting for a connection from {self.pool_name}"
+                    )
+                if self.waiting >= self.max_waiters:
+                    self.rejected += 1
+                    raise errors.PoolError(
+                        f"Connection wait queue for {self.pool_name} is full ({self.max_waiters} waiting)"
+                    )
+                
+                self.waiting += 1
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            
+            # Reserve a connection; connections are back in the underlying
+            # pool before their slot is released, so one is free for us
+            self.in_use += 1
+        
+        # Checking out may reconnect or reset the session, which is network
+        # I/O, so do it without blocking other checkouts and releases
+        try:
+            connection = self.pool.get_connection()
+        except Exception:
+            with self.condition:
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+        
+        with self.condition:
+            waited = time.monotonic() - started
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.recent_waits.append(waited)
+            
+            # A changed server thread id means the pool reconnected it, so the age restarts
+            raw = connection._cnx
+            thread_id, created = self.connection_created.get(id(raw), (None, None))
+            if created is None or thread_id != raw.connection_id:
+                created = time.time()
+                self.connection_created[id(raw)] = (raw.connection_id, created)
+        
+        return TrackedConnection(connection, self, created)
+    
+    def release(self, connection, held):
+        """Record a returned connection and wake one waiter"""
+        with self.condition:
+            self.in_use -= 1
+            self.releases += 1
+            self.total_held += held
+            self.max_held = max(self.max_held, held)
+            self.condition.notify()
+    
+    def stats(self):
+        """
+        Get a snapshot of the pool metrics.
+        
+        Returns:
+            dict: Sizes, queue state, wait/hold times (seconds) and connection ages
+        """
+        with self.condition:
+            waits = sorted(self.recent_waits)
+            now = time.time()
+            ages = [now - created for _, created in self.connection_created.values()]
+            
+            return {
+                'pool_name': self.pool_name,
+                'pool_size': self.pool_size,
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'max_waiters': self.max_waiters,
+                'timeout': self.timeout,
+                'checkouts': self.checkouts,
+                'exhausted_events': self.exhausted_events,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'wait': {
+                    'total': self.total_wait,
+                    'avg': self.total_wait / self.checkouts if self.checkouts else 0,
+                    'max': self.max_wait,
+                    'p50': waits[len(waits) // 2] if waits else 0,
+                    'p99': waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0
+                },
+                'held': {
+                    'avg': self.total_held / self.releases if self.releases else 0,
+                    'max': self.max_held
+                },
+                'connection_age': {
+                    'count': len(ages),
+                    'avg': sum(ages) / len(ages) if ages else 0,
+                    'max': max(ages) if ages else 0
+                }
+            }
+
+class TrackedConnection:
+    """Pooled connection proxy that reports its checkout back to the pool on close"""
+    
+    def __init__(self, connection, pool, created):
+        self._connection = connection
+        self._pool = pool
+        self._checked_out = time.monotonic()
+        self._closed = False
+        self.created = created
+    
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+    
+    def close(self):
+        """Return the connection to the pool"""
+        if self._closed:
+            return
+        
+        self._closed = True
+        
+        try:
+            self._connection.close()
+        finally:
+            self._pool.release(self, time.monotonic() - self._checked_out)
@@ -0,0 +1,191 @@
+import os
+import re
+import time
+import threading
+from collections import deque
+from functools import lru_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this many milliseconds are logged
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "200"))
+
+# Most distinct fingerprints tracked; anything new after that is counted under OTHER_FINGERPRINT
+DB_STATEMENT_STATS_MAX = int(os.environ.get("DB_STATEMENT_STATS_MAX", "500"))
+
+# Recent latencies kept per fingerprint for percentile calculations
+LATENCY_SAMPLE_SIZE = 500
+
+OTHER_FINGERPRINT = '<other>'
+
+_COMMENTS = re.compile(r"/\*.*?\*/|--[^\n]*|#[^\n]*", re.S)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUE_ROWS = re.compile(r"(\(\?\))(?:\s*,\s*\(\?\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    """
+    Normalize a statement so that executions differing only in values group together.
+    
+    Literals and placeholders become ``?``, IN lists and multi-row VALUES
+    collapse to one entry, comments are dropped and whitespace and case are
+    normalized.
+    
+    Args:
+        query (str): SQL statement
+    
+    Returns:
+        str: Statement fingerprint
+    """
+    text = _COMMENTS.sub(' ', query)
+    text = _STRINGS.sub('?', text)
+    text = _PLACEHOLDERS.sub('?', text)
+    text = _NUMBERS.sub('?', text)
+    text = _LISTS.sub('(?)', text)
+    text = _VALUE_ROWS.sub(r'\1', text)
+    return _WHITESPACE.sub(' ', text).strip().lower()
+
+def redact_params(params):
+    """
+    Describe statement parameters without their values.
+    
+    Args:
+        params (tuple|list|dict): Statement parameters
+    
+    Returns:
+        str: Parameter types, e.g. "[int, str, datetime]"
+    """
+    if params is None:
+        return '[]'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in params.items()) + '}'
+    
+    params = list(params)
+    if len(params) > 10:
+        return '[' + ', '.join(type(value).__name__ for value in params[:10]) + f", ... {len(params)} total]"
+    return '[' + ', '.join(type(value).__name__ for value in params) + ']'
+
+class StatementStats:
+    """
+    In-process aggregates per statement fingerprint.
+    
+    Keeps call and error counts, total and maximum latency, rows returned or
+    affected, and a window of recent latencies for p50/p99.
+    """
+    
+    def __init__(self, max_fingerprints=DB_STATEMENT_STATS_MAX, slow_query_ms=DB_SLOW_QUERY_MS):
+        """
+        Create an empty collector.
+        
+        Args:
+            max_fingerprints (int): Most distinct statements tracked
+            slow_query_ms (float): Latency above which statements are logged
+        """
+        self.max_fingerprints = max_fingerprints
+        self.slow_query_ms = slow_query_ms
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.started = time.time()
+    
+    def record(self, query, elapsed, rows=0, params=None, error=False):
+        """
+        Record one execution.
+        
+        Args:
+            query (str): SQL statement
+            elapsed (float): Execution time in seconds
+            rows (int): Rows returned or affected
+            params (tuple|list|dict, optional): Parameters, only used for the slow log
+            error (bool): Whether the statement failed
+        """
+        key = fingerprint(query)
+        
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= self.max_fingerprints:
+                    key = OTHER_FINGERPRINT
+                    entry = self.entries.get(key)
+                if entry is None:
+                    entry = self.entries[key] = {
+                        'calls': 0,
+                        'errors': 0,
+                        'rows': 0,
+                        'total_time': 0.0,
+                        'max_time': 0.0,
+                        'slow': 0,
+                        'samples': deque(maxlen=LATENCY_SAMPLE_SIZE)
+                    }
+            
+            entry['calls'] += 1
+            entry['rows'] += max(rows or 0, 0)
+            entry['total_time'] += elapsed
+            entry['max_time'] = max(entry['max_time'], elapsed)
+            entry['samples'].append(elapsed)
+            if error:
+                entry['errors'] += 1
+            
+            slow = elapsed * 1000 >= self.slow_query_ms
+            if slow:
+                entry['slow'] += 1
+        
+        if slow:
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.1f} ms, {rows or 0} rows"
+                f"{', failed' if error else ''}): {key} params={redact_params(params)}"
+            )
+    
+    def snapshot(self, sort='total_time', limit=50):
+        """
+        Get aggregates for the most expensive statements.
+        
+        Args:
+            sort (str): Field to order by, descending (total_time, calls, p99, max_time, rows, errors)
+            limit (int): Number of statements returned
+        
+        Returns:
+            dict: Collection window and per-statement aggregates (times in milliseconds)
+        """
+        with self.lock:
+            statements = []
+            
+            for key, entry in self.entries.items():
+                samples = sorted(entry['samples'])
+                statements.append({
+                    'fingerprint': key,
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'slow': entry['slow'],
+                    'rows': entry['rows'],
+                    'rows_per_call': entry['rows'] / entry['calls'],
+                    'total_time': entry['total_time'] * 1000,
+                    'mean_time': entry['total_time'] * 1000 / entry['calls'],
+                    'max_time': entry['max_time'] * 1000,
+                    'p50': samples[len(samples) // 2] * 1000,
+                    'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+                })
+            
+            since = self.started
+        
+        statements.sort(key=lambda statement: statement.get(sort, 0), reverse=True)
+        
+        return {
+            'since': since,
+            'slow_query_ms': self.slow_query_ms,
+            'tracked': len(statements),
+            'statements': statements[:limit]
+        }
+    
+    def reset(self):
+        """Drop all aggregates and start a new collection window"""
+        with self.lock:
+            self.entries = {}
+            self.started = time.time()
+
+# Collector shared by the database helpers in this process
+statement_stats = StatementStats()
@@ -0,0 +1,152 @@
+from backend.dsa.minheap import MinHeap
+
+class HeapMap:
+    """
+    Keyed collection of indexed MinHeaps, e.g. one appointment queue per doctor.
+    
+    Every item lives in exactly one heap. An item index maps each item to its
+    heap's key, so items can be moved, reprioritized or removed by id in
+    O(log n) of their own heap's size without knowing which heap holds them.
+    """
+    
+    def __init__(self):
+        """Initialize an empty collection."""
+        self.heaps = {}  # key -> MinHeap
+        self.item_keys = {}  # item_id -> key of the heap holding it
+    
+    def load(self, groups):
+        """
+        Replace the contents with pre-grouped items, heapifying each group in O(n).
+        
+        Args:
+            groups (dict): key -> list of (priority, item_id, item_data) tuples
+        """
+        self.heaps = {}
+        self.item_keys = {}
+        
+        for key, items in groups.items():
+            heap = MinHeap()
+            heap.heapify(items)
+            if heap.is_empty():
+                continue
+            self.heaps[key] = heap
+            for item_id in heap.position_map:
+                self.item_keys[item_id] = key
+    
+    def upsert(self, key, priority, item_id, item_data):
+        """
+        Insert an item, or move/reprioritize it if it is already present.
+        
+        Args:
+            key: Heap the item belongs in
+            priority: Sort key (lower comes first)
+            item_id: Unique ID of the item
+            item_data (dict): Additional item information
+        """
+        current_key = self.item_keys.get(item_id)
+        
+        if current_key is not None and current_key != key:
+            self.remove(item_id)
+            current_key = None
+        
+        if current_key is None:
+            self.heaps.setdefault(key, MinHeap()).insert(priority, item_id, item_data)
+            self.item_keys[item_id] = key
+            return
+        
+        heap = self.heaps[key]
+        heap.update_priority(item_id, priority)
+        heap.replace_data(item_id, item_data)
+    
+    def update_priority(self, item_id, priority):
+        """
+        Change an item's priority within its heap.
+        
+        Args:
+            item_id: Unique ID of the item
+            priority: New sort key
+        
+        Returns:
+            bool: True if updated, False if the item is not present
+        """
+        key = self.item_keys.get(item_id)
+        if key is None:
+            return False
+        return self.heaps[key].update_priority(item_id, priority)
+    
+    def remove(self, item_id):
+        """
+        Remove an item from whichever heap holds it.
+        
+        Args:
+            item_id: Unique ID of the item
+        
+        Returns:
+            bool: True if removed, False if not found
+        """
+        key = self.item_keys.pop(item_id, None)
+        if key is None:
+            return False
+        
+        heap = self.heaps[key]
+        heap.remove(item_id)
+        if heap.is_empty():
+            del self.heaps[key]
+        return True
+    
+    def peek(self, key):
+        """
+        Get the first item of one heap without removing it.
+        
+        Args:
+            key: Heap key
+        
+        Returns:
+            list: [priority, item_id, item_data] or None if the heap is empty
+        """
+        heap = self.heaps.get(key)
+        return heap.get_min() if heap else None
+    
+    def pop(self, key):
+        """
+        Remove and return the first item of one heap.
+        
+        Args:
+            key: Heap key
+        
+        Returns:
+            list: [priority, item_id, item_data] or None if the heap is empty
+        """
+        heap = self.heaps.get(key)
+        if not heap:
+            return None
+        
+        entry = heap.extract_min()
+        del self.item_keys[entry[1]]
+        if heap.is_empty():
+            del self.heaps[key]
+        return entry
+    
+    def smallest(self, key, k):
+        """
+        Get the first k items of one heap in order without removing them.
+        
+        Args:
+            key: Heap key
+            k (int): Number of items wanted
+        
+        Returns:
+            list: Up to k [priority, item_id, item_data] entries
+        """
+        heap = self.heaps.get(key)
+        return heap.smallest(k) if heap else []
+    
+    def size(self, key=None):
+        """Get the number of items in one heap, or in all of them."""
+        if key is None:
+            return len(self.item_keys)
+        heap = self.heaps.get(key)
+        return heap.size() if heap else 0
+    
+    def __contains__(self, item_id):
+        return item_id in self.item_keys
@@ -0,0 +1,262 @@
+class IntervalNode:
+    """Node in an IntervalTree."""
+    
+    def __init__(self, start, end, item_id):
+        """
+        Initialize a node holding one interval.
+        
+        Args:
+            start: Interval start (inclusive)
+            end: Interval end (exclusive)
+            item_id: Unique ID of the item the interval belongs to
+        """
+        self.start = start
+        self.end = end
+        self.item_id = item_id
+        self.max_end = end  # Largest end in this subtree
+        self.height = 1
+        self.left = None
+        self.right = None
+
+class IntervalTree:
+    """
+    Interval tree for finding overlapping appointments in a doctor's schedule.
+    
+    An AVL tree ordered by (start, item_id), where each node also records the
+    largest end time in its subtree. Intervals are half-open, [start, end),
+    so back-to-back appointments do not overlap. Insert, remove and
+    "does anything overlap" are O(log n). Listing every overlap is
+    O(log n + k) for k results.
+    """
+    
+    def __init__(self):
+        """Initialize an empty interval tree."""
+        self.root = None
+        self.intervals = {}  # item_id -> (start, end)
+    
+    def _height(self, node):
+        """Get the height of a subtree (0 for None)."""
+        return node.height if node else 0
+    
+    def _update(self, node):
+        """Recompute a node's height and max_end from its children."""
+        node.height = 1 + max(self._height(node.left), self._height(node.right))
+        node.max_end = node.end
+        if node.left and node.left.max_end > node.max_end:
+            node.max_end = node.left.max_end
+        if node.right and node.right.max_end > node.max_end:
+            node.max_end = node.right.max_end
+    
+    def _rotate_right(self, node):
+        """Rotate a subtree right and return its new root."""
+        pivot = node.left
+        node.left = pivot.right
+        pivot.right = node
+        self._update(node)
+        self._update(pivot)
+        return pivot
+    
+    def _rotate_left(self, node):
+        """Rotate a subtree left and return its new root."""
+        pivot = node.right
+        node.right = pivot.left
+        pivot.left = node
+        self._update(node)
+        self._update(pivot)
+        return pivot
+    
+    def _balance(self, node):
+        """Restore the AVL balance of a subtree and return its root."""
+        self._update(node)
+        balance = self._height(node.left) - self._height(node.right)
+        
+        if balance > 1:
+            if self._height(node.left.left) < self._height(node.left.right):
+                node.left = self._rotate_left(node.left)
+            return self._rotate_right(node)
+        
+        if balance < -1:
+            if self._height(node.right.right) < self._height(node.right.left):
+                node.right = self._rotate_right(node.right)
+            return self._rotate_left(node)
+        
+        return node
+    
+    def _insert(self, node, new_node):
+        """Insert a node into a subtree and return the subtree's new root."""
+        if node is None:
+            return new_node
+        
+        if (new_node.start, new_node.item_id) < (node.start, node.item_id):
+            node.left = self._insert(node.left, new_node)
+        else:
+            node.right = self._insert(node.right, new_node)
+        
+        return self._balance(node)
+    
+    def _remove_min(self, node):
+        """Detach the leftmost node of a subtree; return (new root, detached node)."""
+        if node.left is None:
+            return node.right, node
+        
+        node.left, minimum = self._remove_min(node.left)
+        return self._balance(node), minimum
+    
+    def _remove(self, node, key):
+        """Remove the node with the given (start, item_id) key and return the new root."""
+        if node is None:
+            return None
+        
+        node_key = (node.start, node.item_id)
+        
+        if key < node_key:
+            node.left = self._remove(node.left, key)
+        elif key > node_key:
+            node.right = self._remove(node.right, key)
+        else:
+            if node.left is None:
+                return node.right
+            if node.right is None:
+                return node.left
+            
+            # Replace the node with its in-order successor
+            right, successor = self._remove_min(node.right)
+            successor.left = node.left
+            successor.right = right
+            node = successor
+        
+        return self._balance(node)
+    
+    def _build(self, nodes, lo, hi):
+        """Build a balanced subtree from sorted nodes[lo:hi]."""
+        if lo >= hi:
+            return None
+        
+        mid = (lo + hi) // 2
+        node = nodes[mid]
+        node.left = self._build(nodes, lo, mid)
+        node.right = self._build(nodes, mid + 1, hi)
+        self._update(node)
+        return node
+    
+    def build(self, intervals):
+        """
+        Replace the tree's contents with a batch of intervals.
+        
+        Sorting once and building a balanced tree from the middle out costs
+        O(n log n) for the sort and O(n) for the tree, with no rotations.
+        
+        Args:
+            intervals (iterable): (start, end, item_id) tuples
+        """
+        nodes = [IntervalNode(start, end, item_id) for start, end, item_id in intervals]
+        nodes.sort(key=lambda node: (node.start, node.item_id))
+        
+        self.intervals = {node.item_id: (node.start, node.end) for node in nodes}
+        self.root = self._build(nodes, 0, len(nodes))
+    
+    def insert(self, start, end, item_id):
+        """
+        Add an interval, replacing any existing one for the same item.
+        
+        Args:
+            start: Interval start (inclusive)
+            end: Interval end (exclusive)
+            item_id: Unique ID of the item
+        """
+        if item_id in self.intervals:
+            self.remove(item_id)
+        
+        self.root = self._insert(self.root, IntervalNode(start, end, item_id))
+        self.intervals[item_id] = (start, end)
+    
+    def remove(self, item_id):
+        """
+        Remove an item's interval.
+        
+        Args:
+            item_id: Unique ID of the item
+        
+        Returns:
+            bool: True if removed, False if not found
+        """
+        interval = self.intervals.pop(item_id, None)
+        if interval is None:
+            return False
+        
+        self.root = self._remove(self.root, (interval[0], item_id))
+        return True
+    
+    def find_overlap(self, start, end, exclude=None):
+        """
+        Find any interval overlapping [start, end).
+        
+        Args:
+            start: Query start
+            end: Query end
+            exclude: Item ID to ignore, e.g. the appointment being moved
+        
+        Returns:
+            item_id of an overlapping interval, or None if there is none
+        """
+        if exclude is not None:
+            overlaps = self.overlapping(start, end)
+            return next((item_id for item_id in overlaps if item_id != exclude), None)
+        
+        node = self.root
+        
+        while node:
+            if node.start < end and start < node.end:
+                return node.item_id
+            
+            # If anything in the left subtree ends after start, an overlap
+            # (if there is one) must be there: every interval to the right
+            # starts no earlier than the left one that failed to overlap
+            if node.left and node.left.max_end > start:
+                node = node.left
+            else:
+                node = node.right
+        
+        return None
+    
+    def overlapping(self, start, end):
+        """
+        List every interval overlapping [start, end).
+        
+        Args:
+            start: Query start
+            end: Query end
+        
+        Returns:
+            list: item_ids in start order
+        """
+        result = []
+        stack = []
+        node = self.root
+        
+        # In-order walk that skips subtrees ending before start and stops
+        # once intervals start at or after end
+        while stack or node:
+            while node and node.max_end > start:
+                stack.append(node)
+                node = node.left
+            
+            if not stack:
+                break
+            
+            node = stack.pop()
+            if node.start >= end:
+                break
+            if start < node.end:
+                result.append(node.item_id)
+            node = node.right
+        
+        return result
+    
+    def size(self):
+        """Get the number of intervals in the tree."""
+        return len(self.intervals)
+    
+    def is_empty(self):
+        """Check if the tree is empty."""
+        return not self.intervals
@@ -1,3 +1,20 @@
+import heapq
+from itertools import islice
+
+class _Descending:
+    """Wrap a priority so heapq's min-heap pops the largest first."""
+    
+    __slots__ = ('value',)
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def __lt__(self, other):
+        return other.value < self.value
+    
+    def __eq__(self, other):
+        return self.value == other.value
+
 class MaxHeap:
     """
     MaxHeap data structure for finding most available doctors.
@@ -55,6 +72,40 @@ class MaxHeap:
             self.swap(i, largest)
             self.heapify_down(largest)
     
+    def heapify(self, items):
+        """
+        Replace the heap's contents with a batch of doctors in O(n).
+        
+        Sifting down from the last parent to the root is linear overall,
+        against O(n log n) for inserting the doctors one by one.
+        
+        Args:
+            items (iterable): (availability, doctor_id, doctor_data) tuples
+        """
+        heap = [[availability, doctor_id, doctor_data] for availability, doctor_id, doctor_data in items]
+        size = len(heap)
+        
+        # Sift each parent down by moving children up into the gap, then
+        # build the position map once at the end instead of on every swap
+        for i in range(size // 2 - 1, -1, -1):
+            entry = heap[i]
+            availability = entry[0]
+            child = 2 * i + 1
+            
+            while child < size:
+                if child + 1 < size and heap[child + 1][0] > heap[child][0]:
+                    child += 1
+                if not heap[child][0] > availability:
+                    break
+                heap[i] = heap[child]
+                i = child
+                child = 2 * i + 1
+            
+            heap[i] = entry
+        
+        self.heap = heap
+        self.position_map = {entry[1]: i for i, entry in enumerate(heap)}
+    
     def insert(self, availability, doctor_id, doctor_data):
         """
         Insert a new doctor into the heap.
@@ -138,6 +189,23 @@ class MaxHeap:
         
         return True
     
+    def replace_data(self, doctor_id, doctor_data):
+        """
+        Replace the data stored with a doctor without changing its position.
+        
+        Args:
+            doctor_id (int): ID of the doctor
+            doctor_data (dict): New doctor information
+            
+        Returns:
+            bool: True if replaced, False if doctor not found
+        """
+        if doctor_id not in self.position_map:
+            return False
+        
+        self.heap[self.position_map[doctor_id]][2] = doctor_data
+        return True
+    
     def remove(self, doctor_id):
         """
         Remove a specific doctor from the heap.
@@ -153,6 +221,7 @@ class MaxHeap:
         
         # Get position of doctor to remove
         pos = self.position_map[doctor_id]
+        old_availability = self.heap[pos][0]
         
         # Replace with last element
         last_element = self.heap.pop()
@@ -162,9 +231,6 @@ class MaxHeap:
             self.heap[pos] = last_element
             self.position_map[last_element[1]] = pos
             
-            # Get old availability for comparison
-            old_availability = self.heap[pos][0]
-            
             # Restore heap property
             if last_element[0] > old_availability:
                 self.heapify_up(pos)
@@ -176,6 +242,30 @@ class MaxHeap:
         
         return True
     
+    def iter_largest(self):
+        """
+        Lazily yield doctors from most to least available without removing them.
+        
+        Walks the heap from the root with a small frontier heap of candidate
+        nodes: taking the first n costs O(n log n) however large the heap is,
+        and nothing is copied. The heap must not change while iterating.
+        
+        Yields:
+            list: [availability, doctor_id, doctor_data] entries of the heap itself
+        """
+        if not self.heap:
+            return
+        
+        frontier = [(_Descending(self.heap[0][0]), 0)]
+        
+        while frontier:
+            _, i = heapq.heappop(frontier)
+            yield self.heap[i]
+            
+            for child in (self.left_child(i), self.right_child(i)):
+                if child < len(self.heap):
+                    heapq.heappush(frontier, (_Descending(self.heap[child][0]), child))
+    
     def get_top_n(self, n):
         """
         Get the top N most available doctors without removing them.
@@ -188,18 +278,7 @@ class MaxHeap:
         """
         if n <= 0:
             return []
-        
-        # Clone the heap to avoid modifying the original
-        temp_heap = MaxHeap()
-        temp_heap.heap = [item.copy() for item in self.heap]
-        temp_heap.position_map = self.position_map.copy()
-        
-        # Extract the top N doctors
-        result = []
-        for _ in range(min(n, len(temp_heap.heap))):
-            result.append(temp_heap.extract_max())
-        
-        return result
+        return list(islice(self.iter_largest(), n))
     
     def size(self):
         """Get the number of doctors in the heap."""
@@ -1,3 +1,6 @@
+import heapq
+from itertools import islice
+
 class MinHeap:
     """
     MinHeap data structure for prioritizing appointments based on urgency.
@@ -55,6 +58,40 @@ class MinHeap:
             self.swap(i, smallest)
             self.heapify_down(smallest)
     
+    def heapify(self, items):
+        """
+        Replace the heap's contents with a batch of appointments in O(n).
+        
+        Sifting down from the last parent to the root is linear overall,
+        against O(n log n) for inserting the appointments one by one.
+        
+        Args:
+            items (iterable): (urgency, appointment_id, appointment_data) tuples
+        """
+        heap = [[urgency, appointment_id, appointment_data] for urgency, appointment_id, appointment_data in items]
+        size = len(heap)
+        
+        # Sift each parent down by moving children up into the gap, then
+        # build the position map once at the end instead of on every swap
+        for i in range(size // 2 - 1, -1, -1):
+            entry = heap[i]
+            urgency = entry[0]
+            child = 2 * i + 1
+            
+            while child < size:
+                if child + 1 < size and heap[child + 1][0] < heap[child][0]:
+                    child += 1
+                if heap[child][0] >= urgency:
+                    break
+                heap[i] = heap[child]
+                i = child
+                child = 2 * i + 1
+            
+            heap[i] = entry
+        
+        self.heap = heap
+        self.position_map = {entry[1]: i for i, entry in enumerate(heap)}
+    
     def insert(self, urgency, appointment_id, appointment_data):
         """
         Insert a new appointment into the heap.
@@ -109,6 +146,44 @@ class MinHeap:
             return None
         return self.heap[0]
     
+    def iter_smallest(self):
+        """
+        Lazily yield appointments from most to least urgent without removing them.
+        
+        Walks the heap from the root with a small frontier heap of candidate
+        nodes: taking the first k costs O(k log k) however large the heap is,
+        and nothing is copied. The heap must not change while iterating.
+        
+        Yields:
+            list: [urgency, appointment_id, appointment_data] entries of the heap itself
+        """
+        if not self.heap:
+            return
+        
+        frontier = [(self.heap[0][0], 0)]
+        
+        while frontier:
+            _, i = heapq.heappop(frontier)
+            yield self.heap[i]
+            
+            for child in (self.left_child(i), self.right_child(i)):
+                if child < len(self.heap):
+                    heapq.heappush(frontier, (self.heap[child][0], child))
+    
+    def smallest(self, k):
+        """
+        Get the k most urgent appointments in order without removing them.
+        
+        Args:
+            k (int): Number of appointments wanted
+            
+        Returns:
+            list: Up to k (urgency, appointment_id, appointment_data) entries, most urgent first
+        """
+        if k <= 0:
+            return []
+        return list(islice(self.iter_smallest(), k))
+    
     def update_priority(self, appointment_id, new_urgency):
         """
         Update the urgency/priority of an existing appointment.
@@ -138,6 +213,23 @@ class MinHeap:
         
         return True
     
+    def replace_data(self, appointment_id, appointment_data):
+        """
+        Replace the data stored with an appointment without changing its position.
+        
+        Args:
+            appointment_id (int): ID of the appointment
+            appointment_data (dict): New appointment information
+            
+        Returns:
+            bool: True if replaced, False if appointment not found
+        """
+        if appointment_id not in self.position_map:
+            return False
+        
+        self.heap[self.position_map[appointment_id]][2] = appointment_data
+        return True
+    
     def remove(self, appointment_id):
         """
         Remove a specific appointment from the heap.
@@ -159,12 +251,12 @@ class MinHeap:
         
         # If the removed element was not the last one
         if pos < len(self.heap):
-            self.heap[pos] = last_element
-            self.position_map[last_element[1]] = pos
-            
             # Get old urgency for comparison
             old_urgency = self.heap[pos][0]
             
+            self.heap[pos] = last_element
+            self.position_map[last_element[1]] = pos
+            
             # Restore heap property
             if last_element[0] < old_urgency:
                 self.heapify_up(pos)
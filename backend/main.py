@@ -2,18 +2,21 @@ import os
 import logging
 from flask import Flask, jsonify, request, session
 from flask_cors import CORS
-from backend.auth.auth import token_required
-from backend.db.mysql import initialize_db
+from backend.auth.auth import token_required, init_auth
+from backend.auth.passwords import PasswordPoolBusy, PASSWORD_RETRY_AFTER
+from backend.db.mysql import initialize_db, init_app
 from backend.routes.appointments import appointments_bp
 from backend.routes.doctors import doctors_bp
 from backend.routes.patients import patients_bp
 from backend.routes.admin import admin_bp
+from backend.utils.appointment_queue import appointment_queue, start_background_sync
+from backend.utils.availability import doctor_availability
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
+# Configure logging once for the app; the backend modules only create loggers
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
@@ -26,6 +29,19 @@ CORS(app)
 
 # Initialize database
 initialize_db()
+init_app(app)
+
+# Verify each request's bearer token once, before any route runs
+init_auth(app)
+
+# Load the urgency queue and the doctor directory now rather than on the
+# first request, then keep them caught up with other workers in the background
+try:
+    appointment_queue.warm_start()
+    doctor_availability.refresh()
+except Exception as e:
+    logger.error(f"Could not warm-start the appointment queue: {str(e)}")
+start_background_sync()
 
 # Register blueprints
 app.register_blueprint(appointments_bp, url_prefix='/api/appointments')
@@ -59,33 +75,12 @@ def login():
     role = payload['role']
     uid = payload['uid']
     
-    # Get user profile info based on role
+    # Profile info travels in the token's claims
     user_info = {'uid': uid, 'email': data['email'], 'role': role}
     
-    if role == 'patient':
-        from backend.db.mysql import execute_query, fetch_results
-        
-        query = "SELECT patient_id, name FROM patients WHERE uid = %s"
-        params = (uid,)
-        execute_query(query, params)
-        patient = fetch_results()
-        
-        if patient:
-            user_info['patient_id'] = patient[0]['patient_id']
-            user_info['name'] = patient[0]['name']
-            
-    elif role == 'doctor':
-        from backend.db.mysql import execute_query, fetch_results
-        
-        query = "SELECT doctor_id, name, specialization FROM doctors WHERE uid = %s"
-        params = (uid,)
-        execute_query(query, params)
-        doctor = fetch_results()
-        
-        if doctor:
-            user_info['doctor_id'] = doctor[0]['doctor_id']
-            user_info['name'] = doctor[0]['name']
-            user_info['specialization'] = doctor[0]['specialization']
+    for claim in ('patient_id', 'doctor_id', 'name', 'specialization'):
+        if claim in payload:
+            user_info[claim] = payload[claim]
     
     return jsonify({'token': token, 'user': user_info}), 200
 
@@ -131,6 +126,14 @@ def not_found(e):
         return jsonify({'message': 'API endpoint not found'}), 404
     return app.send_static_file('index.html')
 
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    """Shed login/signup load when the password pool is saturated"""
+    logger.warning(f"Rejected request to {request.path}: {str(e)}")
+    response = jsonify({'message': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = str(PASSWORD_RETRY_AFTER)
+    return response, 503
+
 @app.errorhandler(500)
 def server_error(e):
     """Handle 500 errors"""
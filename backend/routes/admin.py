@@ -1,20 +1,39 @@
+import asyncio
 from flask import Blueprint, request, jsonify
-from backend.auth.auth import token_required
-from backend.db.mysql import execute_query, fetch_results
+from backend.auth.auth import token_required, revoke_user_tokens
+from backend.db.mysql import query_one, query_all, execute, transaction, upsert_many, stream_query, pool_stats
+from backend.db.async_mysql import query_one_async, query_all_async
+from backend.db.stats import statement_stats
+from backend.db.cache import query_cache
+from backend.utils.helpers import stream_requested, stream_rows, get_page_args, paginate
 from backend.dsa.segment_tree import SegmentTree
+import json
 import logging
 from datetime import datetime, timedelta
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Create Blueprint
 admin_bp = Blueprint('admin', __name__)
 
+# Performance metric columns written by the upsert endpoints
+METRIC_COLUMNS = ['doctor_id', 'date', 'avg_response_time', 'patients_seen', 'satisfaction_score']
+METRIC_UPDATE_COLUMNS = ['avg_response_time', 'patients_seen', 'satisfaction_score']
+
+# Rows per transaction for batch metric ingestion
+DEFAULT_METRICS_CHUNK_SIZE = 1000
+MAX_METRICS_CHUNK_SIZE = 5000
+
+# Page sizes for the user listing
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 500
+
+# Orderings accepted by the statement stats endpoint
+STATEMENT_SORT_FIELDS = ('total_time', 'mean_time', 'calls', 'p99', 'max_time', 'rows', 'errors', 'slow')
+
 @admin_bp.route('/generate_report', methods=['GET'])
 @token_required
-def generate_report(current_user):
+async def generate_report(current_user):
     """Generate analytics report for administrators"""
     try:
         # Verify user is an admin
@@ -31,7 +50,7 @@ def generate_report(current_user):
         
         if report_type == 'general':
             # General hospital statistics
-            return generate_general_report(start_date, end_date)
+            return await generate_general_report(start_date, end_date)
         elif report_type == 'doctor':
             # Doctor performance report
             return generate_doctor_report(start_date, end_date)
@@ -45,41 +64,38 @@ def generate_report(current_user):
         logger.error(f"Error generating report: {str(e)}")
         return jsonify({'message': f'Error generating report: {str(e)}'}), 500
 
-def generate_general_report(start_date, end_date):
+def datetime_range(start_date, end_date):
+    """
+    Convert an inclusive date range into a half-open datetime range.
+    
+    Comparing ``appointment_time`` directly against these bounds keeps the
+    predicate sargable, unlike ``DATE(appointment_time) BETWEEN ...``.
+    
+    Args:
+        start_date (date): First day of the range
+        end_date (date): Last day of the range (inclusive)
+        
+    Returns:
+        tuple: (range_start, range_end) for ``>= range_start AND < range_end``
+    """
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    return range_start, range_end
+
+async def generate_general_report(start_date, end_date):
     """Generate general hospital statistics report"""
     # Total patients, doctors, and appointments
     query_total_patients = "SELECT COUNT(*) as count FROM patients"
-    execute_query(query_total_patients)
-    total_patients = fetch_results()[0]['count']
-    
     query_total_doctors = "SELECT COUNT(*) as count FROM doctors"
-    execute_query(query_total_doctors)
-    total_doctors = fetch_results()[0]['count']
-    
     query_total_appointments = "SELECT COUNT(*) as count FROM appointments"
-    execute_query(query_total_appointments)
-    total_appointments = fetch_results()[0]['count']
     
     # Recent appointments (within date range)
     query_recent_appointments = """
         SELECT COUNT(*) as count, status 
         FROM appointments 
-        WHERE DATE(appointment_time) BETWEEN %s AND %s 
+        WHERE appointment_time >= %s AND appointment_time < %s 
         GROUP BY status
     """
-    params = (start_date, end_date)
-    execute_query(query_recent_appointments, params)
-    recent_appointments = fetch_results()
-    
-    # Format recent appointments
-    appointment_stats = {
-        'scheduled': 0,
-        'completed': 0,
-        'cancelled': 0
-    }
-    
-    for row in recent_appointments:
-        appointment_stats[row['status']] = row['count']
     
     # Specialization distribution
     query_specializations = """
@@ -88,8 +104,6 @@ def generate_general_report(start_date, end_date):
         GROUP BY specialization 
         ORDER BY count DESC
     """
-    execute_query(query_specializations)
-    specializations = fetch_results()
     
     # Performance metrics summary
     query_performance = """
@@ -99,9 +113,28 @@ def generate_general_report(start_date, end_date):
         FROM performance_metrics
         WHERE date BETWEEN %s AND %s
     """
-    params = (start_date, end_date)
-    execute_query(query_performance, params)
-    performance = fetch_results()[0]
+    
+    # The queries are independent, so run them concurrently; each result is
+    # cached until its table is written
+    (total_patients, total_doctors, total_appointments,
+     recent_appointments, specializations, performance) = await asyncio.gather(
+        query_one_async(query_total_patients, cache_tables=('patients',)),
+        query_one_async(query_total_doctors, cache_tables=('doctors',)),
+        query_one_async(query_total_appointments, cache_tables=('appointments',)),
+        query_all_async(query_recent_appointments, datetime_range(start_date, end_date), cache_tables=('appointments',)),
+        query_all_async(query_specializations, cache_tables=('doctors',)),
+        query_one_async(query_performance, (start_date, end_date), cache_tables=('performance_metrics',))
+    )
+    
+    # Format recent appointments
+    appointment_stats = {
+        'scheduled': 0,
+        'completed': 0,
+        'cancelled': 0
+    }
+    
+    for row in recent_appointments:
+        appointment_stats[row['status']] = row['count']
     
     return jsonify({
         'period': {
@@ -110,9 +143,9 @@ def generate_general_report(start_date, end_date):
             'days': (end_date - start_date).days
         },
         'totals': {
-            'patients': total_patients,
-            'doctors': total_doctors,
-            'appointments': total_appointments
+            'patients': total_patients['count'],
+            'doctors': total_doctors['count'],
+            'appointments': total_appointments['count']
         },
         'recent_appointments': appointment_stats,
         'specializations': specializations,
@@ -140,8 +173,7 @@ def generate_doctor_report(start_date, end_date):
         ORDER BY avg_satisfaction DESC
     """
     params = (start_date, end_date)
-    execute_query(query_performance, params)
-    doctor_performance = fetch_results()
+    doctor_performance = query_all(query_performance, params)
     
     # Get appointment counts per doctor
     query_appointments = """
@@ -151,12 +183,12 @@ def generate_doctor_report(start_date, end_date):
             SUM(CASE WHEN a.status = 'completed' THEN 1 ELSE 0 END) as completed,
             SUM(CASE WHEN a.status = 'cancelled' THEN 1 ELSE 0 END) as cancelled
         FROM doctors d
-        LEFT JOIN appointments a ON d.doctor_id = a.doctor_id AND DATE(a.appointment_time) BETWEEN %s AND %s
+        LEFT JOIN appointments a ON d.doctor_id = a.doctor_id
+            AND a.appointment_time >= %s AND a.appointment_time < %s
         GROUP BY d.doctor_id
     """
-    params = (start_date, end_date)
-    execute_query(query_appointments, params)
-    appointment_stats = fetch_results()
+    params = datetime_range(start_date, end_date)
+    appointment_stats = query_all(query_appointments, params)
     
     # Create a dictionary of appointment stats by doctor_id for easy lookup
     appointment_dict = {}
@@ -204,13 +236,12 @@ def generate_appointment_report(start_date, end_date):
             SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed,
             SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END) as cancelled
         FROM appointments
-        WHERE DATE(appointment_time) BETWEEN %s AND %s
+        WHERE appointment_time >= %s AND appointment_time < %s
         GROUP BY DATE(appointment_time)
         ORDER BY date
     """
-    params = (start_date, end_date)
-    execute_query(query_daily, params)
-    daily_stats = fetch_results()
+    params = datetime_range(start_date, end_date)
+    daily_stats = query_all(query_daily, params)
     
     # Use SegmentTree for analyzing time ranges of appointment data
     # First, extract just the total appointments per day
@@ -254,13 +285,12 @@ def generate_appointment_report(start_date, end_date):
             urgency,
             COUNT(*) as count
         FROM appointments
-        WHERE DATE(appointment_time) BETWEEN %s AND %s
+        WHERE appointment_time >= %s AND appointment_time < %s
         GROUP BY urgency
         ORDER BY urgency
     """
-    params = (start_date, end_date)
-    execute_query(query_urgency, params)
-    urgency_stats = fetch_results()
+    params = datetime_range(start_date, end_date)
+    urgency_stats = query_all(query_urgency, params)
     
     # Calculate overall statistics
     total_appointments = sum(totals) if totals else 0
@@ -292,17 +322,87 @@ def get_users(current_user):
         if current_user['role'] != 'admin':
             return jsonify({'message': 'Only administrators can access this endpoint'}), 403
         
-        # Get all users
-        query = "SELECT uid, email, role, created_at FROM users"
-        execute_query(query)
-        users = fetch_results()
+        limit, after, error = get_page_args(1, USERS_PAGE_SIZE, USERS_MAX_PAGE_SIZE)
+        if error:
+            return jsonify({'message': error}), 400
+        
+        # Get users in primary key order, starting after the cursor
+        query = "SELECT uid, email, role, created_at FROM users WHERE uid > %s ORDER BY uid"
+        params = [after[0] if after else 0]
         
-        return jsonify({'users': users}), 200
+        # Stream large lists row by row instead of buffering them
+        stream = stream_requested()
+        if stream:
+            return stream_rows(stream_query(query, params), 'users', stream)
+        
+        query += " LIMIT %s"
+        params.append(limit + 1)
+        users, next_cursor = paginate(query_all(query, params), limit, ['uid'])
+        
+        return jsonify({'users': users, 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         logger.error(f"Error getting users: {str(e)}")
         return jsonify({'message': f'Error getting users: {str(e)}'}), 500
 
+@admin_bp.route('/users/<int:uid>', methods=['DELETE'])
+@token_required
+def delete_user(current_user, uid):
+    """Delete a user and their profile (admin only)"""
+    try:
+        # Verify user is an admin
+        if current_user['role'] != 'admin':
+            return jsonify({'message': 'Only administrators can access this endpoint'}), 403
+        
+        if uid == current_user['uid']:
+            return jsonify({'message': 'Administrators cannot delete their own account'}), 400
+        
+        # Profiles, appointments and metrics go with the user (ON DELETE CASCADE)
+        deleted = execute("DELETE FROM users WHERE uid = %s", (uid,))
+        
+        if not deleted:
+            return jsonify({'message': 'User not found'}), 404
+        
+        revoke_user_tokens(uid, deleted=True)
+        
+        return jsonify({'message': 'User deleted successfully'}), 200
+        
+    except Exception as e:
+        logger.error(f"Error deleting user: {str(e)}")
+        return jsonify({'message': f'Error deleting user: {str(e)}'}), 500
+
+@admin_bp.route('/users/<int:uid>/role', methods=['PUT'])
+@token_required
+def change_user_role(current_user, uid):
+    """Change a user's role (admin only); their existing tokens stop working"""
+    try:
+        # Verify user is an admin
+        if current_user['role'] != 'admin':
+            return jsonify({'message': 'Only administrators can access this endpoint'}), 403
+        
+        data = request.get_json()
+        
+        if not data or data.get('role') not in ['patient', 'doctor', 'admin']:
+            return jsonify({'message': 'role must be one of: patient, doctor, admin'}), 400
+        
+        if uid == current_user['uid']:
+            return jsonify({'message': 'Administrators cannot change their own role'}), 400
+        
+        user = query_one("SELECT uid, role FROM users WHERE uid = %s", (uid,))
+        
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+        
+        if user['role'] != data['role']:
+            execute("UPDATE users SET role = %s WHERE uid = %s", (data['role'], uid))
+            revoke_user_tokens(uid)
+        
+        return jsonify({'message': 'User role updated successfully', 'uid': uid, 'role': data['role']}), 200
+        
+    except Exception as e:
+        logger.error(f"Error changing user role: {str(e)}")
+        return jsonify({'message': f'Error changing user role: {str(e)}'}), 500
+
 @admin_bp.route('/update_performance', methods=['POST'])
 @token_required
 def update_performance(current_user):
@@ -318,59 +418,241 @@ def update_performance(current_user):
         if not data:
             return jsonify({'message': 'No input data provided'}), 400
         
-        required_fields = ['doctor_id', 'date', 'avg_response_time', 'patients_seen', 'satisfaction_score']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'message': f'Missing required field: {field}'}), 400
+        values, error = parse_metric_row(data)
+        if error:
+            return jsonify({'message': error}), 400
         
         # Check if doctor exists
-        query = "SELECT * FROM doctors WHERE doctor_id = %s"
+        query = "SELECT doctor_id FROM doctors WHERE doctor_id = %s"
         params = (data['doctor_id'],)
-        execute_query(query, params)
-        doctor = fetch_results()
+        doctor = query_one(query, params)
         
         if not doctor:
             return jsonify({'message': 'Doctor not found'}), 404
         
-        # Check if metrics already exist for this date
-        query = "SELECT * FROM performance_metrics WHERE doctor_id = %s AND date = %s"
-        params = (data['doctor_id'], data['date'])
-        execute_query(query, params)
-        existing = fetch_results()
-        
-        if existing:
-            # Update existing metrics
-            query = """
-                UPDATE performance_metrics
-                SET avg_response_time = %s, patients_seen = %s, satisfaction_score = %s
-                WHERE doctor_id = %s AND date = %s
-            """
-            params = (
-                data['avg_response_time'],
-                data['patients_seen'],
-                data['satisfaction_score'],
-                data['doctor_id'],
-                data['date']
-            )
-        else:
-            # Insert new metrics
-            query = """
-                INSERT INTO performance_metrics 
-                (doctor_id, date, avg_response_time, patients_seen, satisfaction_score)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            params = (
-                data['doctor_id'],
-                data['date'],
-                data['avg_response_time'],
-                data['patients_seen'],
-                data['satisfaction_score']
-            )
-        
-        execute_query(query, params)
+        # Insert or overwrite the metrics for this doctor and date
+        upsert_many('performance_metrics', METRIC_COLUMNS, [values], METRIC_UPDATE_COLUMNS)
         
         return jsonify({'message': 'Performance metrics updated successfully'}), 200
         
     except Exception as e:
         logger.error(f"Error updating performance metrics: {str(e)}")
         return jsonify({'message': f'Error updating performance metrics: {str(e)}'}), 500
+
+@admin_bp.route('/db/pool', methods=['GET'])
+@token_required
+def get_pool_stats(current_user):
+    """Get database connection pool metrics for this worker (admin only)"""
+    try:
+        # Verify user is an admin
+        if current_user['role'] != 'admin':
+            return jsonify({'message': 'Only administrators can access this endpoint'}), 403
+        
+        return jsonify({'pools': pool_stats()}), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting pool stats: {str(e)}")
+        return jsonify({'message': f'Error getting pool stats: {str(e)}'}), 500
+
+@admin_bp.route('/db/statements', methods=['GET'])
+@token_required
+def get_statement_stats(current_user):
+    """Get per-statement latency and row statistics for this worker (admin only)"""
+    try:
+        # Verify user is an admin
+        if current_user['role'] != 'admin':
+            return jsonify({'message': 'Only administrators can access this endpoint'}), 403
+        
+        sort = request.args.get('sort', default='total_time')
+        if sort not in STATEMENT_SORT_FIELDS:
+            return jsonify({'message': f"sort must be one of: {', '.join(STATEMENT_SORT_FIELDS)}"}), 400
+        
+        limit = request.args.get('limit', default=50, type=int)
+        if limit < 1:
+            return jsonify({'message': 'limit must be a positive integer'}), 400
+        
+        return jsonify(statement_stats.snapshot(sort, limit)), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting statement stats: {str(e)}")
+        return jsonify({'message': f'Error getting statement stats: {str(e)}'}), 500
+
+@admin_bp.route('/db/statements/reset', methods=['POST'])
+@token_required
+def reset_statement_stats(current_user):
+    """Clear the per-statement statistics for this worker (admin only)"""
+    try:
+        # Verify user is an admin
+        if current_user['role'] != 'admin':
+            return jsonify({'message': 'Only administrators can access this endpoint'}), 403
+        
+        statement_stats.reset()
+        return jsonify({'message': 'Statement statistics reset'}), 200
+        
+    except Exception as e:
+        logger.error(f"Error resetting statement stats: {str(e)}")
+        return jsonify({'message': f'Error resetting statement stats: {str(e)}'}), 500
+
+@admin_bp.route('/db/cache', methods=['GET'])
+@token_required
+def get_cache_stats(current_user):
+    """Get query result cache hit/miss statistics for this worker (admin only)"""
+    try:
+        # Verify user is an admin
+        if current_user['role'] != 'admin':
+            return jsonify({'message': 'Only administrators can access this endpoint'}), 403
+        
+        return jsonify(query_cache.stats()), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {str(e)}")
+        return jsonify({'message': f'Error getting cache stats: {str(e)}'}), 500
+
+@admin_bp.route('/db/cache/clear', methods=['POST'])
+@token_required
+def clear_query_cache(current_user):
+    """Drop every cached query result and reset the cache statistics (admin only)"""
+    try:
+        # Verify user is an admin
+        if current_user['role'] != 'admin':
+            return jsonify({'message': 'Only administrators can access this endpoint'}), 403
+        
+        query_cache.clear()
+        return jsonify({'message': 'Query cache cleared'}), 200
+        
+    except Exception as e:
+        logger.error(f"Error clearing query cache: {str(e)}")
+        return jsonify({'message': f'Error clearing query cache: {str(e)}'}), 500
+
+def parse_metric_row(row):
+    """
+    Validate a performance metrics record and convert it to column values.
+    
+    Args:
+        row (dict): Metrics record
+        
+    Returns:
+        tuple: (values, error) - values in METRIC_COLUMNS order, or an error message
+    """
+    if not isinstance(row, dict):
+        return None, 'Row must be a JSON object'
+    
+    for field in METRIC_COLUMNS:
+        if field not in row:
+            return None, f'Missing required field: {field}'
+    
+    try:
+        doctor_id = int(row['doctor_id'])
+        date = datetime.strptime(str(row['date']), '%Y-%m-%d').date()
+        avg_response_time = float(row['avg_response_time'])
+        patients_seen = int(row['patients_seen'])
+        satisfaction_score = float(row['satisfaction_score'])
+    except (TypeError, ValueError) as e:
+        return None, f'Invalid value: {str(e)}'
+    
+    return (doctor_id, date, avg_response_time, patients_seen, satisfaction_score), None
+
+def read_metric_rows():
+    """
+    Read metric records from a JSON array or NDJSON request body.
+    
+    Returns:
+        tuple: (rows, errors) - rows is a list of (index, record) and errors
+        holds per-row parse failures
+    """
+    errors = []
+    
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        rows = []
+        for index, line in enumerate(request.get_data(as_text=True).splitlines()):
+            if not line.strip():
+                continue
+            try:
+                rows.append((index, json.loads(line)))
+            except ValueError as e:
+                errors.append({'row': index, 'message': f'Invalid JSON: {str(e)}'})
+        return rows, errors
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('metrics')
+    if not isinstance(data, list):
+        return None, errors
+    
+    return list(enumerate(data)), errors
+
+@admin_bp.route('/update_performance/batch', methods=['POST'])
+@token_required
+def update_performance_batch(current_user):
+    """Upsert many doctor performance metrics in chunked transactions (admin only)"""
+    try:
+        # Verify user is an admin
+        if current_user['role'] != 'admin':
+            return jsonify({'message': 'Only administrators can access this endpoint'}), 403
+        
+        rows, errors = read_metric_rows()
+        
+        if rows is None:
+            return jsonify({'message': 'Expected a JSON array, {"metrics": [...]} or an NDJSON body'}), 400
+        
+        received = len(rows) + len(errors)
+        
+        chunk_size = request.args.get('chunk_size', default=DEFAULT_METRICS_CHUNK_SIZE, type=int)
+        chunk_size = max(1, min(chunk_size, MAX_METRICS_CHUNK_SIZE))
+        
+        # Validate every row before touching the database
+        valid = []
+        for index, row in rows:
+            values, error = parse_metric_row(row)
+            if error:
+                errors.append({'row': index, 'message': error})
+            else:
+                valid.append((index, values))
+        
+        # Check all referenced doctors with a single query
+        doctor_ids = sorted({values[0] for _, values in valid})
+        known_doctors = set()
+        if doctor_ids:
+            placeholders = ', '.join(['%s'] * len(doctor_ids))
+            query = f"SELECT doctor_id FROM doctors WHERE doctor_id IN ({placeholders})"
+            known_doctors = {row['doctor_id'] for row in query_all(query, doctor_ids)}
+        
+        writable = []
+        for index, values in valid:
+            if values[0] in known_doctors:
+                writable.append((index, values))
+            else:
+                errors.append({'row': index, 'message': 'Doctor not found'})
+        
+        # Write each chunk in its own transaction so one bad chunk does not
+        # discard the rest of the feed
+        written = 0
+        for start in range(0, len(writable), chunk_size):
+            chunk = writable[start:start + chunk_size]
+            try:
+                with transaction():
+                    upsert_many(
+                        'performance_metrics',
+                        METRIC_COLUMNS,
+                        [values for _, values in chunk],
+                        METRIC_UPDATE_COLUMNS,
+                        chunk_size=chunk_size
+                    )
+                written += len(chunk)
+            except Exception as e:
+                logger.error(f"Error writing performance metrics chunk: {str(e)}")
+                errors.extend({'row': index, 'message': f'Write failed: {str(e)}'} for index, _ in chunk)
+        
+        errors.sort(key=lambda error: error['row'])
+        
+        return jsonify({
+            'message': 'Performance metrics processed',
+            'received': received,
+            'written': written,
+            'failed': len(errors),
+            'errors': errors
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error updating performance metrics: {str(e)}")
+        return jsonify({'message': f'Error updating performance metrics: {str(e)}'}), 500
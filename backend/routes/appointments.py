@@ -1,18 +1,124 @@
+import datetime
+from itertools import islice
 from flask import Blueprint, request, jsonify
-from backend.auth.auth import token_required
-from backend.db.mysql import execute_query, fetch_results
-from backend.dsa.minheap import MinHeap
+from backend.auth.auth import token_required, current_patient_id, current_doctor_id
+from backend.db.mysql import query_one, query_all, execute, execute_many, stream_query, transaction
+from backend.utils.helpers import stream_requested, stream_rows, get_page_args, paginate
+from backend.utils.appointment_queue import (
+    appointment_queue, record_change, record_changes, appointment_end, APPOINTMENT_MINUTES, MAX_APPOINTMENT_MINUTES
+)
+from backend.dsa.interval_tree import IntervalTree
+from backend.utils.availability import doctor_availability, free_starts, slot_indexes, SLOT_MINUTES
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Create Blueprint
 appointments_bp = Blueprint('appointments', __name__)
 
-# Initialize urgency heap for appointment priority
-appointment_heap = MinHeap()
+# Times /next and /queue refill after finding stale queue entries
+NEXT_APPOINTMENT_RETRIES = 5
+
+# Default and largest number of appointments returned by /queue
+QUEUE_PAGE_SIZE = 10
+QUEUE_MAX_PAGE_SIZE = 100
+
+# Default and largest number of free slots returned by /slots, and the
+# longest date window it searches
+SLOTS_PAGE_SIZE = 10
+SLOTS_MAX_PAGE_SIZE = 100
+SLOTS_DEFAULT_DAYS = 7
+SLOTS_MAX_DAYS = 31
+
+# Most appointments one bulk cancel or reschedule may touch, and the most
+# occurrences of a recurring series
+BULK_MAX_APPOINTMENTS = 1000
+SERIES_MAX_OCCURRENCES = 52
+
+# Page sizes for appointment listings
+APPOINTMENTS_PAGE_SIZE = 50
+APPOINTMENTS_MAX_PAGE_SIZE = 200
+
+def appointment_interval(data, appointment=None):
+    """
+    Work out the time span an appointment occupies.
+    
+    Args:
+        data (dict): Request data with ``appointment_time`` and optional
+            ``duration`` in minutes
+        appointment (dict, optional): Existing appointment whose time and
+            length are kept where the request leaves them out
+    
+    Returns:
+        tuple: (start, end, None), or (None, None, error message)
+    """
+    if 'appointment_time' in data:
+        try:
+            start = datetime.datetime.fromisoformat(str(data['appointment_time']))
+        except ValueError:
+            return None, None, 'Invalid appointment_time'
+    else:
+        start = appointment['appointment_time']
+    
+    if 'duration' in data:
+        try:
+            duration = int(data['duration'])
+        except (TypeError, ValueError):
+            return None, None, 'Invalid duration'
+        if duration < 1 or duration > MAX_APPOINTMENT_MINUTES:
+            return None, None, f'duration must be between 1 and {MAX_APPOINTMENT_MINUTES} minutes'
+        length = datetime.timedelta(minutes=duration)
+    elif appointment:
+        length = appointment_end(appointment) - appointment['appointment_time']
+    else:
+        length = datetime.timedelta(minutes=APPOINTMENT_MINUTES)
+    
+    return start, start + length, None
+
+def lock_doctor(doctor_id):
+    """
+    Lock a doctor's row until the current transaction ends.
+    
+    Args:
+        doctor_id (int): Doctor id
+    
+    Returns:
+        bool: False if the doctor does not exist
+    """
+    query = "SELECT doctor_id FROM doctors WHERE doctor_id = %s FOR UPDATE"
+    return query_one(query, (doctor_id,)) is not None
+
+def find_conflict(doctor_id, start, end, exclude=None):
+    """
+    Find an active appointment of a doctor's that overlaps [start, end).
+    
+    Run inside the transaction holding ``lock_doctor``. This is a locking
+    read, so it sees every booking committed before the lock was taken even
+    if the connection's snapshot is older. Appointments are at most
+    MAX_APPOINTMENT_MINUTES long, so only those starting that far before
+    ``start`` need to be looked at, which keeps the scan on
+    (doctor_id, appointment_time) short.
+    
+    Args:
+        doctor_id (int): Doctor id
+        start (datetime): Proposed start
+        end (datetime): Proposed end
+        exclude (int, optional): Appointment being moved, ignored
+    
+    Returns:
+        int: Id of a clashing appointment, or None
+    """
+    query = """
+        SELECT id FROM appointments
+        WHERE doctor_id = %s AND status != 'cancelled'
+          AND appointment_time > %s AND appointment_time < %s AND end_time > %s
+          AND id != %s
+        LIMIT 1
+        FOR UPDATE
+    """
+    params = (doctor_id, start - datetime.timedelta(minutes=MAX_APPOINTMENT_MINUTES), end, start, exclude or 0)
+    row = query_one(query, params, primary=True)
+    return row['id'] if row else None
 
 @appointments_bp.route('/book', methods=['POST'])
 @token_required
@@ -23,17 +129,12 @@ def book_appointment(current_user):
         if current_user['role'] != 'patient':
             return jsonify({'message': 'Only patients can book appointments'}), 403
         
-        # Get patient_id from the database
-        query = "SELECT patient_id FROM patients WHERE uid = %s"
-        params = (current_user['uid'],)
-        execute_query(query, params)
-        patient_result = fetch_results()
+        # Get patient_id from the token's claims
+        patient_id = current_patient_id(current_user)
         
-        if not patient_result:
+        if not patient_id:
             return jsonify({'message': 'Patient profile not found'}), 404
         
-        patient_id = patient_result[0]['patient_id']
-        
         # Parse request data
         data = request.get_json()
         
@@ -45,54 +146,49 @@ def book_appointment(current_user):
             if field not in data:
                 return jsonify({'message': f'Missing required field: {field}'}), 400
         
-        doctor_id = data['doctor_id']
-        appointment_time = data['appointment_time']
-        reason = data['reason']
-        urgency = data.get('urgency', 0)  # Default urgency is 0 (lowest)
-        
-        # Check if doctor exists
-        query = "SELECT * FROM doctors WHERE doctor_id = %s"
-        params = (doctor_id,)
-        execute_query(query, params)
-        doctor_result = fetch_results()
+        try:
+            doctor_id = int(data['doctor_id'])
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Invalid doctor_id'}), 400
         
-        if not doctor_result:
-            return jsonify({'message': 'Doctor not found'}), 404
+        start, end, error = appointment_interval(data)
+        if error:
+            return jsonify({'message': error}), 400
         
-        # Check for conflicting appointments
-        query = """
-            SELECT * FROM appointments 
-            WHERE doctor_id = %s AND appointment_time = %s AND status != 'cancelled'
-        """
-        params = (doctor_id, appointment_time)
-        execute_query(query, params)
-        existing_appointments = fetch_results()
+        reason = data['reason']
+        urgency = data.get('urgency', 0)  # Default urgency is 0 (lowest)
         
-        if existing_appointments:
+        # Turn away clear clashes from this worker's copy of the schedule
+        # before taking any lock
+        if appointment_queue.find_conflict(doctor_id, start, end):
             return jsonify({'message': 'This time slot is already booked'}), 409
         
         # Insert appointment into database
         query = """
             INSERT INTO appointments 
-            (patient_id, doctor_id, appointment_time, urgency, reason, status) 
-            VALUES (%s, %s, %s, %s, %s, 'scheduled')
+            (patient_id, doctor_id, appointment_time, end_time, urgency, reason, status) 
+            VALUES (%s, %s, %s, %s, %s, %s, 'scheduled')
         """
-        params = (patient_id, doctor_id, appointment_time, urgency, reason)
-        appointment_id = execute_query(query, params)
+        params = (patient_id, doctor_id, start, end, urgency, reason)
+        
+        with transaction():
+            # Bookings for the same doctor queue on the doctor's row, so the
+            # overlap check and the insert cannot interleave with another's
+            if not lock_doctor(doctor_id):
+                return jsonify({'message': 'Doctor not found'}), 404
+            
+            if find_conflict(doctor_id, start, end):
+                return jsonify({'message': 'This time slot is already booked'}), 409
+            
+            appointment_id = execute(query, params)
+            
+            # Queue it for priority-based processing in every worker
+            if appointment_id:
+                record_change(appointment_id)
         
         if not appointment_id:
             return jsonify({'message': 'Failed to book appointment'}), 500
         
-        # Add to urgency heap for priority-based processing
-        appointment_data = {
-            'patient_id': patient_id,
-            'doctor_id': doctor_id,
-            'appointment_time': appointment_time,
-            'reason': reason,
-            'status': 'scheduled'
-        }
-        appointment_heap.insert(urgency, appointment_id, appointment_data)
-        
         return jsonify({
             'message': 'Appointment booked successfully',
             'appointment_id': appointment_id
@@ -107,52 +203,43 @@ def book_appointment(current_user):
 def list_appointments(current_user):
     """List appointments for the current user based on their role"""
     try:
-        user_id = current_user['uid']
         role = current_user['role']
         
+        limit, after, error = get_page_args(2, APPOINTMENTS_PAGE_SIZE, APPOINTMENTS_MAX_PAGE_SIZE)
+        if error:
+            return jsonify({'message': error}), 400
+        
         if role == 'patient':
             # Get patient_id
-            query = "SELECT patient_id FROM patients WHERE uid = %s"
-            params = (user_id,)
-            execute_query(query, params)
-            patient_result = fetch_results()
+            patient_id = current_patient_id(current_user)
             
-            if not patient_result:
+            if not patient_id:
                 return jsonify({'message': 'Patient profile not found'}), 404
             
-            patient_id = patient_result[0]['patient_id']
-            
             # Get appointments for this patient
             query = """
                 SELECT a.*, d.name as doctor_name, d.specialization 
                 FROM appointments a 
                 JOIN doctors d ON a.doctor_id = d.doctor_id 
                 WHERE a.patient_id = %s
-                ORDER BY a.appointment_time
             """
-            params = (patient_id,)
+            params = [patient_id]
             
         elif role == 'doctor':
             # Get doctor_id
-            query = "SELECT doctor_id FROM doctors WHERE uid = %s"
-            params = (user_id,)
-            execute_query(query, params)
-            doctor_result = fetch_results()
+            doctor_id = current_doctor_id(current_user)
             
-            if not doctor_result:
+            if not doctor_id:
                 return jsonify({'message': 'Doctor profile not found'}), 404
             
-            doctor_id = doctor_result[0]['doctor_id']
-            
             # Get appointments for this doctor
             query = """
                 SELECT a.*, p.name as patient_name
                 FROM appointments a 
                 JOIN patients p ON a.patient_id = p.patient_id 
                 WHERE a.doctor_id = %s
-                ORDER BY a.appointment_time
             """
-            params = (doctor_id,)
+            params = [doctor_id]
             
         elif role == 'admin':
             # Admins can see all appointments
@@ -161,17 +248,30 @@ def list_appointments(current_user):
                 FROM appointments a 
                 JOIN patients p ON a.patient_id = p.patient_id 
                 JOIN doctors d ON a.doctor_id = d.doctor_id
-                ORDER BY a.appointment_time
+                WHERE 1 = 1
             """
-            params = ()
+            params = []
             
         else:
             return jsonify({'message': 'Invalid role'}), 403
         
-        execute_query(query, params)
-        appointments = fetch_results()
+        # Keyset pagination on (appointment_time, id): seek past the last row
+        # of the previous page instead of counting through an OFFSET
+        if after:
+            query += " AND (a.appointment_time > %s OR (a.appointment_time = %s AND a.id > %s))"
+            params.extend([after[0], after[0], after[1]])
+        query += " ORDER BY a.appointment_time, a.id"
+        
+        # Stream large lists row by row instead of buffering them
+        stream = stream_requested()
+        if stream:
+            return stream_rows(stream_query(query, params), 'appointments', stream)
         
-        return jsonify({'appointments': appointments}), 200
+        query += " LIMIT %s"
+        params.append(limit + 1)
+        appointments, next_cursor = paginate(query_all(query, params), limit, ['appointment_time', 'id'])
+        
+        return jsonify({'appointments': appointments, 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         logger.error(f"Error listing appointments: {str(e)}")
@@ -185,36 +285,22 @@ def cancel_appointment(current_user, appointment_id):
         # Check if the appointment exists
         query = "SELECT * FROM appointments WHERE id = %s"
         params = (appointment_id,)
-        execute_query(query, params)
-        appointment = fetch_results()
+        appointment = query_one(query, params)
         
         if not appointment:
             return jsonify({'message': 'Appointment not found'}), 404
         
-        appointment = appointment[0]
-        
         # Check if user has permission to cancel
-        user_id = current_user['uid']
         role = current_user['role']
         
         if role == 'patient':
             # Verify this is the patient's appointment
-            query = "SELECT patient_id FROM patients WHERE uid = %s"
-            params = (user_id,)
-            execute_query(query, params)
-            patient_result = fetch_results()
-            
-            if not patient_result or patient_result[0]['patient_id'] != appointment['patient_id']:
+            if current_patient_id(current_user) != appointment['patient_id']:
                 return jsonify({'message': 'You do not have permission to cancel this appointment'}), 403
                 
         elif role == 'doctor':
             # Verify this is the doctor's appointment
-            query = "SELECT doctor_id FROM doctors WHERE uid = %s"
-            params = (user_id,)
-            execute_query(query, params)
-            doctor_result = fetch_results()
-            
-            if not doctor_result or doctor_result[0]['doctor_id'] != appointment['doctor_id']:
+            if current_doctor_id(current_user) != appointment['doctor_id']:
                 return jsonify({'message': 'You do not have permission to cancel this appointment'}), 403
                 
         elif role != 'admin':
@@ -223,10 +309,11 @@ def cancel_appointment(current_user, appointment_id):
         # Update appointment status to cancelled
         query = "UPDATE appointments SET status = 'cancelled' WHERE id = %s"
         params = (appointment_id,)
-        execute_query(query, params)
         
-        # Remove from urgency heap if it exists
-        appointment_heap.remove(appointment_id)
+        # Remove from the urgency queue in every worker
+        with transaction():
+            execute(query, params)
+            record_change(appointment_id)
         
         return jsonify({'message': 'Appointment cancelled successfully'}), 200
         
@@ -242,36 +329,22 @@ def update_appointment(current_user, appointment_id):
         # Check if the appointment exists
         query = "SELECT * FROM appointments WHERE id = %s"
         params = (appointment_id,)
-        execute_query(query, params)
-        appointment = fetch_results()
+        appointment = query_one(query, params)
         
         if not appointment:
             return jsonify({'message': 'Appointment not found'}), 404
         
-        appointment = appointment[0]
-        
         # Check if user has permission to update
-        user_id = current_user['uid']
         role = current_user['role']
         
         if role == 'patient':
             # Verify this is the patient's appointment
-            query = "SELECT patient_id FROM patients WHERE uid = %s"
-            params = (user_id,)
-            execute_query(query, params)
-            patient_result = fetch_results()
-            
-            if not patient_result or patient_result[0]['patient_id'] != appointment['patient_id']:
+            if current_patient_id(current_user) != appointment['patient_id']:
                 return jsonify({'message': 'You do not have permission to update this appointment'}), 403
                 
         elif role == 'doctor':
             # Verify this is the doctor's appointment
-            query = "SELECT doctor_id FROM doctors WHERE uid = %s"
-            params = (user_id,)
-            execute_query(query, params)
-            doctor_result = fetch_results()
-            
-            if not doctor_result or doctor_result[0]['doctor_id'] != appointment['doctor_id']:
+            if current_doctor_id(current_user) != appointment['doctor_id']:
                 return jsonify({'message': 'You do not have permission to update this appointment'}), 403
                 
         elif role != 'admin':
@@ -287,9 +360,18 @@ def update_appointment(current_user, appointment_id):
         update_fields = []
         params = []
         
-        if 'appointment_time' in data:
+        interval = None
+        
+        if 'appointment_time' in data or 'duration' in data:
+            start, end, error = appointment_interval(data, appointment)
+            if error:
+                return jsonify({'message': error}), 400
+            
             update_fields.append("appointment_time = %s")
-            params.append(data['appointment_time'])
+            params.append(start)
+            update_fields.append("end_time = %s")
+            params.append(end)
+            interval = (start, end)
             
         if 'reason' in data:
             update_fields.append("reason = %s")
@@ -304,9 +386,6 @@ def update_appointment(current_user, appointment_id):
             # Only doctors and admins can update urgency
             update_fields.append("urgency = %s")
             params.append(data['urgency'])
-            
-            # Update urgency in the heap
-            appointment_heap.update_priority(appointment_id, data['urgency'])
         
         if not update_fields:
             return jsonify({'message': 'No valid fields to update'}), 400
@@ -315,7 +394,25 @@ def update_appointment(current_user, appointment_id):
         query = f"UPDATE appointments SET {', '.join(update_fields)} WHERE id = %s"
         params.append(appointment_id)
         
-        execute_query(query, params)
+        # Moving an appointment, or reinstating a cancelled one, must not
+        # make it overlap another of the doctor's
+        status = data.get('status', appointment['status']) if role in ['doctor', 'admin'] else appointment['status']
+        if status != 'cancelled' and (interval or appointment['status'] == 'cancelled'):
+            interval = interval or (appointment['appointment_time'], appointment_end(appointment))
+        else:
+            interval = None
+        
+        with transaction():
+            if interval:
+                lock_doctor(appointment['doctor_id'])
+                
+                if find_conflict(appointment['doctor_id'], interval[0], interval[1], exclude=appointment_id):
+                    return jsonify({'message': 'This time slot is already booked'}), 409
+            
+            execute(query, params)
+            
+            # Re-rank (or drop) the appointment in every worker's urgency queue
+            record_change(appointment_id)
         
         return jsonify({'message': 'Appointment updated successfully'}), 200
         
@@ -323,43 +420,611 @@ def update_appointment(current_user, appointment_id):
         logger.error(f"Error updating appointment: {str(e)}")
         return jsonify({'message': f'Error updating appointment: {str(e)}'}), 500
 
-@appointments_bp.route('/next', methods=['GET'])
+def bulk_range(data):
+    """
+    Read the doctor and time range of a bulk operation from request data.
+    
+    Args:
+        data (dict): Request data with ``doctor_id``, ``from`` and ``to``
+    
+    Returns:
+        tuple: (doctor_id, start, end, None), or (None, None, None, error message)
+    """
+    for field in ['doctor_id', 'from', 'to']:
+        if field not in data:
+            return None, None, None, f'Missing required field: {field}'
+    
+    try:
+        doctor_id = int(data['doctor_id'])
+    except (TypeError, ValueError):
+        return None, None, None, 'Invalid doctor_id'
+    
+    try:
+        start = datetime.datetime.fromisoformat(str(data['from']))
+        end = datetime.datetime.fromisoformat(str(data['to']))
+    except ValueError:
+        return None, None, None, 'Invalid from/to date'
+    
+    if end <= start:
+        return None, None, None, '"to" must be after "from"'
+    
+    return doctor_id, start, end, None
+
+def bulk_permission(current_user, doctor_id):
+    """
+    Check that the caller may cancel or move a doctor's appointments in bulk.
+    
+    Admins may act on any doctor, doctors only on themselves.
+    
+    Returns:
+        tuple: Error response, or None if allowed
+    """
+    role = current_user['role']
+    
+    if role == 'doctor':
+        if current_doctor_id(current_user) != doctor_id:
+            return jsonify({'message': 'You do not have permission to change these appointments'}), 403
+        return None
+    
+    if role != 'admin':
+        return jsonify({'message': 'Only doctors and admins can change appointments in bulk'}), 403
+    
+    return None
+
+def scheduled_in_range(doctor_id, start, end):
+    """
+    Lock and return a doctor's scheduled appointments starting in [start, end).
+    
+    Run inside a transaction; the rows stay locked until it ends.
+    
+    Returns:
+        list: Appointments in time order
+    """
+    query = """
+        SELECT id, patient_id, appointment_time, end_time FROM appointments
+        WHERE doctor_id = %s AND status = 'scheduled'
+          AND appointment_time >= %s AND appointment_time < %s
+        ORDER BY appointment_time, id
+        FOR UPDATE
+    """
+    return query_all(query, (doctor_id, start, end))
+
+def schedule_tree(doctor_id, start, end, exclude=()):
+    """
+    Load a doctor's active appointments overlapping [start, end) into an interval tree.
+    
+    One range query replaces a conflict check per appointment of a bulk
+    operation. Run inside the transaction holding ``lock_doctor``.
+    
+    Args:
+        doctor_id (int): Doctor id
+        start (datetime): Earliest time of interest
+        end (datetime): Latest time of interest
+        exclude (collection): Appointment ids to leave out, e.g. those being moved
+    
+    Returns:
+        IntervalTree: The appointments, keyed by id
+    """
+    query = """
+        SELECT id, appointment_time, end_time FROM appointments
+        WHERE doctor_id = %s AND status != 'cancelled'
+          AND appointment_time > %s AND appointment_time < %s AND end_time > %s
+    """
+    params = (doctor_id, start - datetime.timedelta(minutes=MAX_APPOINTMENT_MINUTES), end, start)
+    
+    tree = IntervalTree()
+    tree.build(
+        (row['appointment_time'], appointment_end(row), row['id'])
+        for row in query_all(query, params, primary=True) if row['id'] not in exclude
+    )
+    return tree
+
+def shift_conflicts(appointments, tree, shift, same_doctor):
+    """
+    Work out which appointments cannot be moved by ``shift`` into a schedule.
+    
+    The ones that move keep their spacing, so they never clash with each
+    other. When they stay with the same doctor, one that cannot move stays
+    where it is and may block another's new time, so this repeats until
+    nothing else fails. Appointments handed to another doctor that cannot
+    move stay with the old doctor and block nothing in the new schedule.
+    
+    Args:
+        appointments (list): Appointments to move
+        tree (IntervalTree): Target doctor's schedule without the appointments
+            being moved; stuck appointments are added to it when ``same_doctor``
+        shift (timedelta): How far to move them
+        same_doctor (bool): Whether the target schedule is their own doctor's
+    
+    Returns:
+        dict: Id of each appointment that cannot move -> id it clashes with
+    """
+    conflicts = {}
+    changed = True
+    
+    while changed:
+        changed = False
+        for a in appointments:
+            if a['id'] in conflicts:
+                continue
+            clash = tree.find_overlap(a['appointment_time'] + shift, appointment_end(a) + shift)
+            if clash is not None:
+                conflicts[a['id']] = clash
+                if same_doctor:
+                    tree.insert(a['appointment_time'], appointment_end(a), a['id'])
+                    changed = True
+    
+    return conflicts
+
+def bulk_summary(results):
+    """Count the per-appointment results of a bulk operation"""
+    summary = {}
+    for result in results:
+        summary[result['result']] = summary.get(result['result'], 0) + 1
+    return summary
+
+@appointments_bp.route('/bulk/cancel', methods=['PUT'])
 @token_required
-def get_next_appointment(current_user):
-    """Get the next most urgent appointment (for doctors and admins)"""
+def bulk_cancel_appointments(current_user):
+    """
+    Cancel every scheduled appointment of a doctor in a time range, e.g. a sick day.
+    
+    Request body: ``doctor_id``, ``from`` and ``to`` (ISO times). The
+    appointments are cancelled with one UPDATE and leave every worker's
+    urgency queue in one batch.
+    """
     try:
-        role = current_user['role']
+        data = request.get_json()
         
-        if role not in ['doctor', 'admin']:
-            return jsonify({'message': 'Only doctors and admins can access this endpoint'}), 403
+        if not data:
+            return jsonify({'message': 'No input data provided'}), 400
         
-        # Get the most urgent appointment
-        next_appointment = appointment_heap.get_min()
+        doctor_id, start, end, error = bulk_range(data)
+        if error:
+            return jsonify({'message': error}), 400
         
-        if not next_appointment:
-            return jsonify({'message': 'No appointments in queue'}), 404
+        error = bulk_permission(current_user, doctor_id)
+        if error:
+            return error
+        
+        with transaction():
+            appointments = scheduled_in_range(doctor_id, start, end)
+            if len(appointments) > BULK_MAX_APPOINTMENTS:
+                return jsonify({'message': f'More than {BULK_MAX_APPOINTMENTS} appointments in range; narrow it'}), 400
+            
+            if appointments:
+                # The rows are locked, so the same predicate matches exactly them
+                query = """
+                    UPDATE appointments SET status = 'cancelled'
+                    WHERE doctor_id = %s AND status = 'scheduled'
+                      AND appointment_time >= %s AND appointment_time < %s
+                """
+                execute(query, (doctor_id, start, end))
+                record_changes(a['id'] for a in appointments)
         
-        urgency, appointment_id, appointment_data = next_appointment
+        # Drop them from this worker's queue now rather than on its next read
+        appointment_queue.sync()
         
-        # Get full appointment details from database
-        query = """
+        results = [{
+            'appointment_id': a['id'],
+            'patient_id': a['patient_id'],
+            'appointment_time': a['appointment_time'].isoformat(),
+            'result': 'cancelled'
+        } for a in appointments]
+        
+        return jsonify({
+            'message': f'{len(results)} appointments cancelled',
+            'summary': bulk_summary(results),
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error cancelling appointments: {str(e)}")
+        return jsonify({'message': f'Error cancelling appointments: {str(e)}'}), 500
+
+@appointments_bp.route('/bulk/reschedule', methods=['PUT'])
+@token_required
+def bulk_reschedule_appointments(current_user):
+    """
+    Move every scheduled appointment of a doctor in a time range.
+    
+    Request body: ``doctor_id``, ``from`` and ``to`` (ISO times),
+    ``shift_minutes`` to move them by and optionally ``new_doctor_id`` to hand
+    them to another doctor. Appointments whose new time clashes with the
+    target doctor's schedule stay where they are and are reported as
+    conflicts; the rest move with one UPDATE.
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'message': 'No input data provided'}), 400
+        
+        doctor_id, start, end, error = bulk_range(data)
+        if error:
+            return jsonify({'message': error}), 400
+        
+        try:
+            shift_minutes = int(data.get('shift_minutes', 0))
+            new_doctor_id = int(data.get('new_doctor_id', doctor_id))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Invalid shift_minutes or new_doctor_id'}), 400
+        
+        if not shift_minutes and new_doctor_id == doctor_id:
+            return jsonify({'message': 'Provide shift_minutes or new_doctor_id'}), 400
+        
+        error = bulk_permission(current_user, doctor_id)
+        if error:
+            return error
+        if new_doctor_id != doctor_id and current_user['role'] != 'admin':
+            return jsonify({'message': 'Only admins can move appointments to another doctor'}), 403
+        
+        shift = datetime.timedelta(minutes=shift_minutes)
+        
+        with transaction():
+            # Lock both doctors in id order so two opposite moves cannot deadlock
+            for locked_id in sorted({doctor_id, new_doctor_id}):
+                if not lock_doctor(locked_id):
+                    return jsonify({'message': 'Doctor not found'}), 404
+            
+            appointments = scheduled_in_range(doctor_id, start, end)
+            if len(appointments) > BULK_MAX_APPOINTMENTS:
+                return jsonify({'message': f'More than {BULK_MAX_APPOINTMENTS} appointments in range; narrow it'}), 400
+            
+            conflicts = {}
+            
+            if appointments:
+                moving = {a['id'] for a in appointments}
+                tree = schedule_tree(
+                    new_doctor_id,
+                    min(a['appointment_time'] for a in appointments) + shift,
+                    max(appointment_end(a) for a in appointments) + shift,
+                    exclude=moving
+                )
+                conflicts = shift_conflicts(appointments, tree, shift, new_doctor_id == doctor_id)
+            
+            moved = [a['id'] for a in appointments if a['id'] not in conflicts]
+            
+            if moved:
+                query = f"""
+                    UPDATE appointments
+                    SET appointment_time = appointment_time + INTERVAL %s MINUTE,
+                        end_time = end_time + INTERVAL %s MINUTE,
+                        doctor_id = %s
+                    WHERE id IN ({', '.join(['%s'] * len(moved))})
+                """
+                execute(query, [shift_minutes, shift_minutes, new_doctor_id] + moved)
+                record_changes(moved)
+        
+        appointment_queue.sync()
+        
+        results = []
+        for a in appointments:
+            result = {
+                'appointment_id': a['id'],
+                'patient_id': a['patient_id'],
+                'appointment_time': a['appointment_time'].isoformat()
+            }
+            if a['id'] in conflicts:
+                result.update(result='conflict', conflicts_with=conflicts[a['id']])
+            else:
+                result.update(result='rescheduled', new_time=(a['appointment_time'] + shift).isoformat())
+            results.append(result)
+        
+        return jsonify({
+            'message': f'{len(moved)} of {len(results)} appointments rescheduled',
+            'summary': bulk_summary(results),
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error rescheduling appointments: {str(e)}")
+        return jsonify({'message': f'Error rescheduling appointments: {str(e)}'}), 500
+
+@appointments_bp.route('/bulk/book', methods=['POST'])
+@token_required
+def book_recurring_appointments(current_user):
+    """
+    Book a recurring series of appointments, e.g. weekly physiotherapy.
+    
+    Request body: as for /book, plus ``count`` (occurrences, at most
+    SERIES_MAX_OCCURRENCES) and ``interval_days`` (default 7). Occurrences
+    that clash with the doctor's schedule are skipped and reported; the rest
+    are inserted with one multi-row INSERT.
+    """
+    try:
+        if current_user['role'] != 'patient':
+            return jsonify({'message': 'Only patients can book appointments'}), 403
+        
+        patient_id = current_patient_id(current_user)
+        
+        if not patient_id:
+            return jsonify({'message': 'Patient profile not found'}), 404
+        
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'message': 'No input data provided'}), 400
+        
+        for field in ['doctor_id', 'appointment_time', 'reason', 'count']:
+            if field not in data:
+                return jsonify({'message': f'Missing required field: {field}'}), 400
+        
+        try:
+            doctor_id = int(data['doctor_id'])
+            count = int(data['count'])
+            interval_days = int(data.get('interval_days', 7))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Invalid doctor_id, count or interval_days'}), 400
+        
+        if count < 1 or count > SERIES_MAX_OCCURRENCES:
+            return jsonify({'message': f'count must be between 1 and {SERIES_MAX_OCCURRENCES}'}), 400
+        if interval_days < 1:
+            return jsonify({'message': 'interval_days must be at least 1'}), 400
+        
+        start, end, error = appointment_interval(data)
+        if error:
+            return jsonify({'message': error}), 400
+        
+        reason = data['reason']
+        urgency = data.get('urgency', 0)
+        step = datetime.timedelta(days=interval_days)
+        occurrences = [(start + step * i, end + step * i) for i in range(count)]
+        
+        with transaction():
+            if not lock_doctor(doctor_id):
+                return jsonify({'message': 'Doctor not found'}), 404
+            
+            # One range query covers the whole series; occurrences are at
+            # least a day apart and at most MAX_APPOINTMENT_MINUTES long, so
+            # they cannot clash with each other
+            tree = schedule_tree(doctor_id, occurrences[0][0], occurrences[-1][1])
+            conflicts = {}
+            for occurrence_start, occurrence_end in occurrences:
+                clash = tree.find_overlap(occurrence_start, occurrence_end)
+                if clash is not None:
+                    conflicts[occurrence_start] = clash
+            
+            rows = [
+                (patient_id, doctor_id, occurrence_start, occurrence_end, urgency, reason)
+                for occurrence_start, occurrence_end in occurrences if occurrence_start not in conflicts
+            ]
+            booked = {}
+            
+            if rows:
+                query = """
+                    INSERT INTO appointments 
+                    (patient_id, doctor_id, appointment_time, end_time, urgency, reason, status) 
+                    VALUES (%s, %s, %s, %s, %s, %s, 'scheduled')
+                """
+                execute_many(query, rows)
+                
+                # Read back the new ids; the doctor's row lock keeps anyone
+                # else from booking these times meanwhile
+                times = [row[2] for row in rows]
+                query = f"""
+                    SELECT id, appointment_time FROM appointments
+                    WHERE doctor_id = %s AND patient_id = %s AND status = 'scheduled'
+                      AND appointment_time IN ({', '.join(['%s'] * len(times))})
+                """
+                booked = {
+                    row['appointment_time']: row['id']
+                    for row in query_all(query, [doctor_id, patient_id] + times)
+                }
+                record_changes(booked.values())
+        
+        appointment_queue.sync()
+        
+        results = []
+        for occurrence_start, occurrence_end in occurrences:
+            result = {'appointment_time': occurrence_start.isoformat(), 'end_time': occurrence_end.isoformat()}
+            if occurrence_start in conflicts:
+                result.update(result='conflict', conflicts_with=conflicts[occurrence_start])
+            else:
+                result.update(result='booked', appointment_id=booked.get(occurrence_start))
+            results.append(result)
+        
+        status = 201 if booked else 409
+        return jsonify({
+            'message': f'{len(booked)} of {count} appointments booked',
+            'summary': bulk_summary(results),
+            'results': results
+        }), status
+        
+    except Exception as e:
+        logger.error(f"Error booking appointment series: {str(e)}")
+        return jsonify({'message': f'Error booking appointment series: {str(e)}'}), 500
+
+def queue_scope(current_user):
+    """
+    Work out whose queue a caller may read.
+    
+    Doctors see their own queue. Admins see the whole hospital's, or one
+    doctor's with ?doctor_id=.
+    
+    Returns:
+        tuple: (doctor_id or None for every doctor, None), or (None, error response)
+    """
+    role = current_user['role']
+    
+    if role == 'doctor':
+        doctor_id = current_doctor_id(current_user)
+        if not doctor_id:
+            return None, (jsonify({'message': 'Doctor profile not found'}), 404)
+        return doctor_id, None
+    
+    if role == 'admin':
+        return request.args.get('doctor_id', type=int), None
+    
+    return None, (jsonify({'message': 'Only doctors and admins can access this endpoint'}), 403)
+
+def queued_appointments(k, doctor_id):
+    """
+    Get the k most urgent scheduled appointments with their details.
+    
+    Entries whose appointment is gone or no longer scheduled (e.g. removed by
+    a cascading delete) are dropped from the queue and the next ones used.
+    
+    Args:
+        k (int): Number of appointments wanted
+        doctor_id (int): Only this doctor's appointments, or None for all
+    
+    Returns:
+        list: Appointments, most urgent first
+    """
+    for _ in range(NEXT_APPOINTMENT_RETRIES):
+        entries = appointment_queue.top(k, doctor_id)
+        if not entries:
+            return []
+        
+        ids = [entry[1] for entry in entries]
+        
+        # Get full appointment details from database in one query
+        query = f"""
             SELECT a.*, p.name as patient_name, d.name as doctor_name
             FROM appointments a 
             JOIN patients p ON a.patient_id = p.patient_id 
             JOIN doctors d ON a.doctor_id = d.doctor_id
-            WHERE a.id = %s
+            WHERE a.id IN ({', '.join(['%s'] * len(ids))})
         """
-        params = (appointment_id,)
-        execute_query(query, params)
-        appointment = fetch_results()
+        appointments = {row['id']: row for row in query_all(query, ids) if row['status'] == 'scheduled'}
         
-        if not appointment:
-            # This shouldn't happen, but handle it anyway
-            appointment_heap.extract_min()  # Remove inconsistent entry
-            return jsonify({'message': 'Appointment not found in database'}), 404
+        stale = [appointment_id for appointment_id in ids if appointment_id not in appointments]
+        for appointment_id in stale:
+            appointment_queue.discard(appointment_id)
+        
+        if not stale:
+            break
+    
+    return [appointments[appointment_id] for appointment_id in ids if appointment_id in appointments]
+
+@appointments_bp.route('/next', methods=['GET'])
+@token_required
+def get_next_appointment(current_user):
+    """Get the next most urgent appointment (for doctors and admins)"""
+    try:
+        doctor_id, error = queue_scope(current_user)
+        if error:
+            return error
+        
+        # Most urgent first, earliest first among equally urgent ones
+        appointments = queued_appointments(1, doctor_id)
         
-        return jsonify({'appointment': appointment[0], 'urgency': urgency}), 200
+        if not appointments:
+            return jsonify({'message': 'No appointments in queue'}), 404
+        
+        appointment = appointments[0]
+        
+        return jsonify({'appointment': appointment, 'urgency': appointment['urgency']}), 200
         
     except Exception as e:
         logger.error(f"Error getting next appointment: {str(e)}")
         return jsonify({'message': f'Error getting next appointment: {str(e)}'}), 500
+
+@appointments_bp.route('/queue', methods=['GET'])
+@token_required
+def get_appointment_queue(current_user):
+    """Get the next K most urgent appointments (for doctors and admins)"""
+    try:
+        doctor_id, error = queue_scope(current_user)
+        if error:
+            return error
+        
+        limit = request.args.get('limit', default=QUEUE_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, QUEUE_MAX_PAGE_SIZE))
+        
+        appointments = queued_appointments(limit, doctor_id)
+        
+        return jsonify({'appointments': appointments, 'queued': appointment_queue.size(doctor_id)}), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting appointment queue: {str(e)}")
+        return jsonify({'message': f'Error getting appointment queue: {str(e)}'}), 500
+
+@appointments_bp.route('/slots', methods=['GET'])
+@token_required
+def find_free_slots(current_user):
+    """
+    Find the earliest free slots with the doctors of a specialization or a list of doctors.
+    
+    Query parameters: ``specialization`` and/or ``doctor_ids`` (comma
+    separated), ``from`` and ``to`` (ISO dates or times, default the next
+    SLOTS_DEFAULT_DAYS days), ``duration`` in minutes and ``limit``.
+    """
+    try:
+        specialization = request.args.get('specialization')
+        doctor_ids = None
+        
+        if request.args.get('doctor_ids'):
+            try:
+                doctor_ids = [int(value) for value in request.args['doctor_ids'].split(',') if value.strip()]
+            except ValueError:
+                return jsonify({'message': 'Invalid doctor_ids'}), 400
+        
+        if not specialization and doctor_ids is None:
+            return jsonify({'message': 'Provide a specialization or doctor_ids'}), 400
+        
+        now = datetime.datetime.now()
+        try:
+            start = datetime.datetime.fromisoformat(request.args['from']) if 'from' in request.args else now
+            end = (datetime.datetime.fromisoformat(request.args['to']) if 'to' in request.args
+                   else start + datetime.timedelta(days=SLOTS_DEFAULT_DAYS))
+        except ValueError:
+            return jsonify({'message': 'Invalid from/to date'}), 400
+        
+        # Never offer slots in the past
+        start = max(start, now)
+        if end <= start:
+            return jsonify({'slots': []}), 200
+        if (end - start).days >= SLOTS_MAX_DAYS:
+            return jsonify({'message': f'The search window can be at most {SLOTS_MAX_DAYS} days'}), 400
+        
+        duration = request.args.get('duration', default=APPOINTMENT_MINUTES, type=int)
+        if duration < 1 or duration > MAX_APPOINTMENT_MINUTES:
+            return jsonify({'message': f'duration must be between 1 and {MAX_APPOINTMENT_MINUTES} minutes'}), 400
+        length = -(-duration // SLOT_MINUTES)
+        
+        limit = request.args.get('limit', default=SLOTS_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, SLOTS_MAX_PAGE_SIZE))
+        
+        doctors = doctor_availability.select(specialization, doctor_ids)
+        appointment_queue.sync()
+        
+        slots = []
+        day = start.date()
+        
+        # Walk the window a day at a time; each doctor's free time that day
+        # is working hours minus booked slots, one AND per doctor
+        while day <= end.date() and len(slots) < limit:
+            midnight = datetime.datetime.combine(day, datetime.time())
+            first = max(0, -(-int((start - midnight).total_seconds()) // (SLOT_MINUTES * 60)))
+            last = int((end - midnight).total_seconds()) // (SLOT_MINUTES * 60)
+            window = ((1 << max(0, last - first)) - 1) << first
+            
+            booked = appointment_queue.booked_masks(day, doctors)
+            remaining = limit - len(slots)
+            candidates = []
+            
+            for doctor_id, doctor in doctors.items():
+                free = doctor['week'][day.weekday()] & ~booked.get(doctor_id, 0)
+                starts = free_starts(free, length) & window
+                candidates.extend((index, doctor_id) for index in islice(slot_indexes(starts), remaining))
+            
+            candidates.sort()
+            for index, doctor_id in candidates[:remaining]:
+                slot_start = midnight + datetime.timedelta(minutes=index * SLOT_MINUTES)
+                slots.append({
+                    'doctor_id': doctor_id,
+                    'doctor_name': doctors[doctor_id]['name'],
+                    'specialization': doctors[doctor_id]['specialization'],
+                    'start': slot_start.isoformat(),
+                    'end': (slot_start + datetime.timedelta(minutes=duration)).isoformat()
+                })
+            
+            day += datetime.timedelta(days=1)
+        
+        return jsonify({'slots': slots}), 200
+        
+    except Exception as e:
+        logger.error(f"Error finding free slots: {str(e)}")
+        return jsonify({'message': f'Error finding free slots: {str(e)}'}), 500
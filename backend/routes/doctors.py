@@ -1,82 +1,46 @@
+import asyncio
 from flask import Blueprint, request, jsonify
-from backend.auth.auth import token_required
-from backend.db.mysql import execute_query, fetch_results
-from backend.dsa.maxheap import MaxHeap
+from backend.auth.auth import token_required, current_principal, current_patient_id, current_doctor_id, hash_password, create_user, DuplicateEmailError
+from backend.auth.passwords import PasswordPoolBusy
+from backend.db.mysql import query_one, query_all, execute, transaction
+from backend.db.async_mysql import query_one_async, query_all_async
+from backend.utils.appointment_queue import appointment_queue
+from backend.utils.availability import doctor_availability
+from backend.utils.recommendations import doctor_recommender, patient_visits
+from backend.utils.helpers import get_page_args, paginate
+from backend.utils.response_cache import cached_response
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Create Blueprint
 doctors_bp = Blueprint('doctors', __name__)
 
-# Initialize maxheap for doctor availability
-doctor_availability_heap = MaxHeap()
+# Page sizes for the doctor directory
+DOCTORS_PAGE_SIZE = 100
+DOCTORS_MAX_PAGE_SIZE = 500
 
-def load_doctors_into_heap():
-    """Load all doctors and their availability into the max heap"""
-    try:
-        # Get all doctors
-        query = "SELECT * FROM doctors"
-        execute_query(query)
-        doctors = fetch_results()
-        
-        # Clear existing heap
-        while not doctor_availability_heap.is_empty():
-            doctor_availability_heap.extract_max()
-        
-        # Calculate availability score for each doctor and add to heap
-        for doctor in doctors:
-            doctor_id = doctor['doctor_id']
-            
-            # Count scheduled appointments for the doctor
-            query = """
-                SELECT COUNT(*) as appointment_count 
-                FROM appointments 
-                WHERE doctor_id = %s AND status = 'scheduled'
-            """
-            params = (doctor_id,)
-            execute_query(query, params)
-            result = fetch_results()
-            
-            appointment_count = result[0]['appointment_count'] if result else 0
-            
-            # Higher availability score means more available
-            # Inverse relationship with appointment count
-            availability_score = 100 - min(appointment_count * 5, 95)  # Cap at 5, minimum score of 5
-            
-            # Insert into max heap
-            doctor_availability_heap.insert(availability_score, doctor_id, doctor)
-            
-        logger.debug(f"Loaded {len(doctors)} doctors into availability heap")
-        
-    except Exception as e:
-        logger.error(f"Error loading doctors into heap: {str(e)}")
+# Default and largest number of doctors returned by /recommend
+RECOMMEND_PAGE_SIZE = 5
+RECOMMEND_MAX_PAGE_SIZE = 50
 
 @doctors_bp.route('/available', methods=['GET'])
 def available_doctors():
     """Get a list of available doctors sorted by availability"""
     try:
-        # Refresh the heap with latest data
-        load_doctors_into_heap()
-        
         # Get limit parameter, default is 10
         limit = request.args.get('limit', default=10, type=int)
         
         # Get specialization filter if provided
         specialization = request.args.get('specialization', default=None, type=str)
         
-        # Get top N doctors from heap
-        top_doctors = doctor_availability_heap.get_top_n(limit)
+        # Answered from memory: the ranking is kept current as appointments
+        # change, and the background sync applies other workers' changes
+        top_doctors = doctor_availability.most_available(limit, specialization)
         
         # Format the response
         available_doctors = []
         for availability, doctor_id, doctor_data in top_doctors:
-            # Apply specialization filter if provided
-            if specialization and doctor_data['specialization'].lower() != specialization.lower():
-                continue
-                
             doctor_info = {
                 'doctor_id': doctor_id,
                 'name': doctor_data['name'],
@@ -92,71 +56,110 @@ def available_doctors():
         logger.error(f"Error getting available doctors: {str(e)}")
         return jsonify({'message': f'Error getting available doctors: {str(e)}'}), 500
 
+@doctors_bp.route('/recommend', methods=['GET'])
+@token_required
+def recommend_doctors(current_user):
+    """
+    Recommend doctors for a patient, best match first.
+    
+    Query parameters: ``specialization`` asked for and ``limit``. Patients get
+    recommendations for themselves; doctors and admins may pass ``patient_id``.
+    """
+    try:
+        role = current_user['role']
+        
+        if role == 'patient':
+            patient_id = current_patient_id(current_user)
+            if not patient_id:
+                return jsonify({'message': 'Patient profile not found'}), 404
+        elif role in ['doctor', 'admin']:
+            patient_id = request.args.get('patient_id', type=int)
+        else:
+            return jsonify({'message': 'Invalid role'}), 403
+        
+        specialization = request.args.get('specialization', default=None, type=str)
+        
+        limit = request.args.get('limit', default=RECOMMEND_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, RECOMMEND_MAX_PAGE_SIZE))
+        
+        # Loads and free slots come from the queue, so catch up with other workers
+        appointment_queue.sync()
+        visits = patient_visits(patient_id) if patient_id else {}
+        
+        doctors = doctor_recommender.recommend(limit, specialization, visits)
+        
+        return jsonify({'doctors': doctors}), 200
+        
+    except Exception as e:
+        logger.error(f"Error recommending doctors: {str(e)}")
+        return jsonify({'message': f'Error recommending doctors: {str(e)}'}), 500
+
 @doctors_bp.route('/all', methods=['GET'])
+@cached_response(('doctors',))
 def all_doctors():
     """Get a list of all doctors"""
     try:
-        query = "SELECT * FROM doctors"
-        execute_query(query)
-        doctors = fetch_results()
+        limit, after, error = get_page_args(1, DOCTORS_PAGE_SIZE, DOCTORS_MAX_PAGE_SIZE)
+        if error:
+            return jsonify({'message': error}), 400
         
-        return jsonify({'doctors': doctors}), 200
+        query = "SELECT * FROM doctors WHERE doctor_id > %s ORDER BY doctor_id LIMIT %s"
+        params = (after[0] if after else 0, limit + 1)
+        doctors, next_cursor = paginate(query_all(query, params, cache_tables=('doctors',)), limit, ['doctor_id'])
+        
+        return jsonify({'doctors': doctors, 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         logger.error(f"Error getting doctors: {str(e)}")
         return jsonify({'message': f'Error getting doctors: {str(e)}'}), 500
 
 @doctors_bp.route('/detail/<int:doctor_id>', methods=['GET'])
-def doctor_detail(doctor_id):
+@cached_response(('doctors', 'performance_metrics'), anonymous_only=True)
+async def doctor_detail(doctor_id):
     """Get detailed information about a specific doctor"""
     try:
-        # Get doctor information
-        query = "SELECT * FROM doctors WHERE doctor_id = %s"
-        params = (doctor_id,)
-        execute_query(query, params)
-        doctor = fetch_results()
+        # Get doctor's upcoming appointments (if token provided and authorized)
+        payload = current_principal()
+        include_appointments = bool(payload and payload['role'] in ['doctor', 'admin'])
+        
+        # Get doctor information, performance metrics and (when allowed)
+        # upcoming appointments concurrently
+        queries = [
+            query_one_async("SELECT * FROM doctors WHERE doctor_id = %s", (doctor_id,), cache_tables=('doctors',)),
+            query_one_async(
+                """
+                SELECT AVG(avg_response_time) as avg_response, 
+                       AVG(satisfaction_score) as avg_satisfaction
+                FROM performance_metrics
+                WHERE doctor_id = %s
+                """,
+                (doctor_id,),
+                cache_tables=('performance_metrics',)
+            )
+        ]
+        
+        if include_appointments:
+            queries.append(query_all_async(
+                """
+                SELECT a.*, p.name as patient_name
+                FROM appointments a 
+                JOIN patients p ON a.patient_id = p.patient_id 
+                WHERE a.doctor_id = %s AND a.status = 'scheduled'
+                ORDER BY a.appointment_time
+                """,
+                (doctor_id,)
+            ))
+        
+        results = await asyncio.gather(*queries)
+        doctor, performance = results[0], results[1]
+        upcoming_appointments = results[2] if include_appointments else []
         
         if not doctor:
             return jsonify({'message': 'Doctor not found'}), 404
         
-        doctor = doctor[0]
-        
-        # Get doctor's upcoming appointments (if token provided and authorized)
-        auth_header = request.headers.get('Authorization')
-        upcoming_appointments = []
-        
-        if auth_header and auth_header.startswith('Bearer '):
-            from backend.auth.auth import verify_token
-            
-            token = auth_header.split(' ')[1]
-            payload = verify_token(token)
-            
-            if payload and payload['role'] in ['doctor', 'admin']:
-                query = """
-                    SELECT a.*, p.name as patient_name
-                    FROM appointments a 
-                    JOIN patients p ON a.patient_id = p.patient_id 
-                    WHERE a.doctor_id = %s AND a.status = 'scheduled'
-                    ORDER BY a.appointment_time
-                """
-                params = (doctor_id,)
-                execute_query(query, params)
-                upcoming_appointments = fetch_results()
-        
-        # Get doctor's performance metrics
-        query = """
-            SELECT AVG(avg_response_time) as avg_response, 
-                   AVG(satisfaction_score) as avg_satisfaction
-            FROM performance_metrics
-            WHERE doctor_id = %s
-        """
-        params = (doctor_id,)
-        execute_query(query, params)
-        performance = fetch_results()
-        
         performance_data = {
-            'avg_response_time': performance[0]['avg_response'] if performance and performance[0]['avg_response'] else 0,
-            'avg_satisfaction': performance[0]['avg_satisfaction'] if performance and performance[0]['avg_satisfaction'] else 0
+            'avg_response_time': performance['avg_response'] if performance and performance['avg_response'] else 0,
+            'avg_satisfaction': performance['avg_satisfaction'] if performance and performance['avg_satisfaction'] else 0
         }
         
         response = {
@@ -193,51 +196,38 @@ def register_doctor(current_user):
             if field not in data:
                 return jsonify({'message': f'Missing required field: {field}'}), 400
         
-        # First create user account
-        from backend.auth.auth import signup
-        
-        token, error = signup(data['email'], data['password'], 'doctor')
+        # Hash first so the transaction is not held open during bcrypt
+        hashed_password = hash_password(data['password'])
         
-        if error:
-            return jsonify({'message': f'Error creating user account: {error}'}), 400
-        
-        # Get UID from token
-        from backend.auth.auth import decode_token
-        
-        payload = decode_token(token)
-        if not payload:
-            return jsonify({'message': 'Error decoding token'}), 500
-        
-        uid = payload['uid']
-        
-        # Create doctor profile
-        query = """
-            INSERT INTO doctors (uid, name, specialization, contact, availability)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        params = (uid, data['name'], data['specialization'], data['contact'], data['availability'])
-        doctor_id = execute_query(query, params)
+        # Create the user account and doctor profile in one commit; a taken
+        # email is reported by the unique constraint
+        try:
+            with transaction():
+                uid = create_user(data['email'], hashed_password, 'doctor')
+                
+                query = """
+                    INSERT INTO doctors (uid, name, specialization, contact, availability)
+                    VALUES (%s, %s, %s, %s, %s)
+                """
+                params = (uid, data['name'], data['specialization'], data['contact'], data['availability'])
+                doctor_id = execute(query, params)
+        except DuplicateEmailError as e:
+            return jsonify({'message': f'Error creating user account: {str(e)}'}), 400
         
         if not doctor_id:
             return jsonify({'message': 'Failed to create doctor profile'}), 500
         
-        # Add to availability heap
-        availability_score = 100  # New doctor starts with high availability
-        doctor_data = {
-            'doctor_id': doctor_id,
-            'name': data['name'],
-            'specialization': data['specialization'],
-            'contact': data['contact'],
-            'availability': data['availability']
-        }
-        doctor_availability_heap.insert(availability_score, doctor_id, doctor_data)
+        # Add to the availability ranking (a new doctor has no appointments)
+        doctor_availability.upsert(doctor_id, data)
         
         return jsonify({
             'message': 'Doctor registered successfully',
-            'doctor_id': doctor_id,
-            'token': token
+            'doctor_id': doctor_id
         }), 201
         
+    except PasswordPoolBusy:
+        # Answered with 503 by the app's error handler
+        raise
     except Exception as e:
         logger.error(f"Error registering doctor: {str(e)}")
         return jsonify({'message': f'Error registering doctor: {str(e)}'}), 500
@@ -248,17 +238,11 @@ def update_doctor(current_user, doctor_id):
     """Update doctor information"""
     try:
         # Check if this is the doctor's own profile or an admin
-        user_id = current_user['uid']
         role = current_user['role']
         
         if role == 'doctor':
             # Verify this is the doctor's own profile
-            query = "SELECT uid FROM doctors WHERE doctor_id = %s"
-            params = (doctor_id,)
-            execute_query(query, params)
-            result = fetch_results()
-            
-            if not result or result[0]['uid'] != user_id:
+            if current_doctor_id(current_user) != doctor_id:
                 return jsonify({'message': 'You do not have permission to update this profile'}), 403
                 
         elif role != 'admin':
@@ -297,34 +281,19 @@ def update_doctor(current_user, doctor_id):
         query = f"UPDATE doctors SET {', '.join(update_fields)} WHERE doctor_id = %s"
         params.append(doctor_id)
         
-        execute_query(query, params)
-        
-        # Update in availability heap if doctor exists there
-        if not doctor_availability_heap.remove(doctor_id):
-            # If doctor wasn't in heap, refresh the heap
-            load_doctors_into_heap()
-        else:
-            # Get updated doctor information
-            query = "SELECT * FROM doctors WHERE doctor_id = %s"
-            params = (doctor_id,)
-            execute_query(query, params)
-            doctor = fetch_results()[0]
-            
-            # Calculate availability score
-            query = """
-                SELECT COUNT(*) as appointment_count 
-                FROM appointments 
-                WHERE doctor_id = %s AND status = 'scheduled'
-            """
-            params = (doctor_id,)
-            execute_query(query, params)
-            result = fetch_results()
+        # Check and update under a row lock so a concurrent delete cannot
+        # slip in between. The UPDATE's row count cannot tell a missing
+        # doctor apart: MySQL counts changed rows, not matched ones.
+        with transaction():
+            doctor = query_one("SELECT doctor_id FROM doctors WHERE doctor_id = %s FOR UPDATE", (doctor_id,))
             
-            appointment_count = result[0]['appointment_count'] if result else 0
-            availability_score = 100 - min(appointment_count * 5, 95)
+            if not doctor:
+                return jsonify({'message': 'Doctor not found'}), 404
             
-            # Add back to heap
-            doctor_availability_heap.insert(availability_score, doctor_id, doctor)
+            execute(query, params)
+        
+        # Reposition the doctor in the availability ranking
+        doctor_availability.upsert(doctor_id, data)
         
         return jsonify({'message': 'Doctor information updated successfully'}), 200
         
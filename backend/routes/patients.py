@@ -1,11 +1,13 @@
+import asyncio
 from flask import Blueprint, request, jsonify
-from backend.auth.auth import token_required
-from backend.db.mysql import execute_query, fetch_results
+from backend.auth.auth import token_required, current_patient_id, hash_password, create_user, generate_token, DuplicateEmailError
+from backend.auth.passwords import PasswordPoolBusy
+from backend.db.mysql import query_all, execute, transaction
+from backend.db.async_mysql import query_one_async, query_all_async
 from backend.dsa.trie import Trie
+from backend.utils.helpers import get_page_args, paginate
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Create Blueprint
@@ -14,13 +16,16 @@ patients_bp = Blueprint('patients', __name__)
 # Initialize Trie for patient search
 patient_trie = Trie()
 
+# Page sizes for a patient's appointment history
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
 def load_patients_into_trie():
     """Load all patients into the trie for autocomplete search"""
     try:
         # Get all patients
         query = "SELECT patient_id, name FROM patients"
-        execute_query(query)
-        patients = fetch_results()
+        patients = query_all(query)
         
         # Reset trie
         global patient_trie
@@ -77,8 +82,7 @@ def search_patients(current_user):
             WHERE p.patient_id IN ({placeholders})
         """
         
-        execute_query(query, patient_ids)
-        patients = fetch_results()
+        patients = query_all(query, patient_ids)
         
         return jsonify({'patients': patients}), 200
         
@@ -88,52 +92,57 @@ def search_patients(current_user):
 
 @patients_bp.route('/detail/<int:patient_id>', methods=['GET'])
 @token_required
-def patient_detail(current_user, patient_id):
+async def patient_detail(current_user, patient_id):
     """Get detailed information about a specific patient"""
     try:
         # Only doctors and admins can view patient details
         # or the patient themselves
         role = current_user['role']
         
-        if role == 'patient':
-            # Verify this is the patient's own profile
-            query = "SELECT uid FROM patients WHERE patient_id = %s"
-            params = (patient_id,)
-            execute_query(query, params)
-            result = fetch_results()
-            
-            if not result or result[0]['uid'] != current_user['uid']:
-                return jsonify({'message': 'You do not have permission to view this profile'}), 403
-        
-        elif role not in ['doctor', 'admin']:
+        if role not in ['patient', 'doctor', 'admin']:
             return jsonify({'message': 'You do not have permission to view patient details'}), 403
         
-        # Get patient information
-        query = "SELECT * FROM patients WHERE patient_id = %s"
-        params = (patient_id,)
-        execute_query(query, params)
-        patient = fetch_results()
+        # Verify a patient is viewing their own profile (from the token's
+        # claims) before reading anything
+        if role == 'patient' and current_patient_id(current_user) != patient_id:
+            return jsonify({'message': 'You do not have permission to view this profile'}), 403
         
-        if not patient:
-            return jsonify({'message': 'Patient not found'}), 404
-        
-        patient = patient[0]
+        limit, after, error = get_page_args(2, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+        if error:
+            return jsonify({'message': error}), 400
         
-        # Get patient's appointment history
-        query = """
+        # Get patient's appointment history, newest first, one page at a time
+        history_query = """
             SELECT a.*, d.name as doctor_name, d.specialization
             FROM appointments a 
             JOIN doctors d ON a.doctor_id = d.doctor_id 
             WHERE a.patient_id = %s
-            ORDER BY a.appointment_time DESC
         """
-        params = (patient_id,)
-        execute_query(query, params)
-        appointments = fetch_results()
+        history_params = [patient_id]
+        
+        if after:
+            history_query += " AND (a.appointment_time < %s OR (a.appointment_time = %s AND a.id < %s))"
+            history_params.extend([after[0], after[0], after[1]])
+        
+        history_query += " ORDER BY a.appointment_time DESC, a.id DESC LIMIT %s"
+        history_params.append(limit + 1)
+        
+        # The profile and the history do not depend on each other, so both
+        # queries run concurrently
+        patient, history = await asyncio.gather(
+            query_one_async("SELECT * FROM patients WHERE patient_id = %s", (patient_id,)),
+            query_all_async(history_query, history_params)
+        )
+        
+        if not patient:
+            return jsonify({'message': 'Patient not found'}), 404
+        
+        appointments, next_cursor = paginate(history, limit, ['appointment_time', 'id'])
         
         return jsonify({
             'patient': patient,
-            'appointments': appointments
+            'appointments': appointments,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -155,38 +164,31 @@ def register_patient():
             if field not in data:
                 return jsonify({'message': f'Missing required field: {field}'}), 400
         
-        # First create user account
-        from backend.auth.auth import signup
-        
-        token, error = signup(data['email'], data['password'], 'patient')
-        
-        if error:
-            return jsonify({'message': f'Error creating user account: {error}'}), 400
-        
-        # Get UID from token
-        from backend.auth.auth import decode_token
+        # Hash first so the transaction is not held open during bcrypt
+        hashed_password = hash_password(data['password'])
         
-        payload = decode_token(token)
-        if not payload:
-            return jsonify({'message': 'Error decoding token'}), 500
-        
-        uid = payload['uid']
-        
-        # Create patient profile
-        query = """
-            INSERT INTO patients (uid, name, dob, gender, contact, address, history)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        params = (
-            uid, 
-            data['name'], 
-            data['dob'], 
-            data['gender'], 
-            data['contact'], 
-            data['address'], 
-            data.get('history', '')
-        )
-        patient_id = execute_query(query, params)
+        # Create the user account and patient profile in one commit; a taken
+        # email is reported by the unique constraint
+        try:
+            with transaction():
+                uid = create_user(data['email'], hashed_password, 'patient')
+                
+                query = """
+                    INSERT INTO patients (uid, name, dob, gender, contact, address, history)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """
+                params = (
+                    uid, 
+                    data['name'], 
+                    data['dob'], 
+                    data['gender'], 
+                    data['contact'], 
+                    data['address'], 
+                    data.get('history', '')
+                )
+                patient_id = execute(query, params)
+        except DuplicateEmailError as e:
+            return jsonify({'message': f'Error creating user account: {str(e)}'}), 400
         
         if not patient_id:
             return jsonify({'message': 'Failed to create patient profile'}), 500
@@ -194,12 +196,18 @@ def register_patient():
         # Add to search trie
         patient_trie.insert(data['name'], patient_id)
         
+        # The token carries the new profile id
+        token = generate_token(uid, 'patient', {'patient_id': patient_id, 'name': data['name']})
+        
         return jsonify({
             'message': 'Patient registered successfully',
             'patient_id': patient_id,
             'token': token
         }), 201
         
+    except PasswordPoolBusy:
+        # Answered with 503 by the app's error handler
+        raise
     except Exception as e:
         logger.error(f"Error registering patient: {str(e)}")
         return jsonify({'message': f'Error registering patient: {str(e)}'}), 500
@@ -210,17 +218,11 @@ def update_patient(current_user, patient_id):
     """Update patient information"""
     try:
         # Check if this is the patient's own profile or a doctor/admin
-        user_id = current_user['uid']
         role = current_user['role']
         
         if role == 'patient':
             # Verify this is the patient's own profile
-            query = "SELECT uid FROM patients WHERE patient_id = %s"
-            params = (patient_id,)
-            execute_query(query, params)
-            result = fetch_results()
-            
-            if not result or result[0]['uid'] != user_id:
+            if current_patient_id(current_user) != patient_id:
                 return jsonify({'message': 'You do not have permission to update this profile'}), 403
                 
         elif role not in ['doctor', 'admin']:
@@ -268,7 +270,7 @@ def update_patient(current_user, patient_id):
         query = f"UPDATE patients SET {', '.join(update_fields)} WHERE patient_id = %s"
         params.append(patient_id)
         
-        execute_query(query, params)
+        execute(query, params)
         
         # If name was updated, update in trie
         if 'name' in data:
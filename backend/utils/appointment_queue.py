@@ -0,0 +1,572 @@
+"""
+Appointment urgency queue shared by every worker process.
+
+Appointments are ordered by urgency (0-3, higher first), then by time, then
+by id, so ties always resolve the same way. The database is the source of
+truth. Each worker keeps a hospital-wide MinHeap and one heap per doctor
+(a HeapMap) of the scheduled appointments, built with one scan and an O(n)
+heapify at startup. It also keeps an interval tree per doctor, so a booking
+that clashes with the doctor's schedule can be turned away without locking
+anything in the database, and a bitmap of booked slots per doctor and day
+for free-slot search. Each doctor's number of scheduled appointments is
+passed on to subscribers (the doctor availability ranking, the doctor
+recommender) whenever it changes.
+
+Every booking, cancellation or update also appends the appointment id to
+``appointment_queue_events`` in the same transaction. Before answering, a
+worker applies the events it has not seen yet, re-reading the current state
+of those appointments. All workers therefore converge on the same queue,
+whichever of them handled the write.
+
+Event ids are handed out when the event is inserted, not when it commits,
+so a lower id can become visible after a higher one has been read. Ids
+skipped over are kept as gaps and asked for again on every sync until they
+show up, or until QUEUE_GAP_TIMEOUT has passed and the insert is taken to
+have rolled back.
+"""
+import os
+import time
+import datetime
+import threading
+from backend.db.mysql import query_one, query_all, execute, execute_many, stream_query
+from backend.dsa.minheap import MinHeap
+from backend.dsa.heap_map import HeapMap
+from backend.dsa.interval_tree import IntervalTree
+from backend.utils.availability import day_masks, free_starts, doctor_availability, SLOT_MINUTES
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker may go without applying events before it rebuilds the
+# queue from scratch. Events older than twice this are pruned.
+QUEUE_MAX_LAG = float(os.environ.get("QUEUE_MAX_LAG", "3600"))
+
+# Seconds between each worker's deletes of pruned events
+QUEUE_PRUNE_INTERVAL = float(os.environ.get("QUEUE_PRUNE_INTERVAL", "300"))
+
+# Seconds between background syncs, see start_background_sync
+QUEUE_SYNC_INTERVAL = float(os.environ.get("QUEUE_SYNC_INTERVAL", "1"))
+
+# Seconds a skipped event id is waited for before it is taken for a rolled-back
+# insert; longer than any transaction that records a queue change
+QUEUE_GAP_TIMEOUT = float(os.environ.get("QUEUE_GAP_TIMEOUT", "60"))
+
+# Most skipped event ids waited for at once; the oldest are given up first
+QUEUE_MAX_GAPS = 1000
+
+# Rows fetched per round trip while warm-starting
+QUEUE_LOAD_BATCH = 5000
+
+# Length of an appointment booked without a duration, and the longest allowed
+APPOINTMENT_MINUTES = 30
+MAX_APPOINTMENT_MINUTES = 240
+
+# Scheduled appointments with the fields kept alongside each heap entry
+SCHEDULED_QUERY = """
+    SELECT id, urgency, patient_id, doctor_id, appointment_time, end_time, reason
+    FROM appointments
+    WHERE status = 'scheduled'
+"""
+
+def queue_key(row):
+    """
+    Heap ordering key of an appointment: most urgent first, then earliest.
+    
+    Args:
+        row (dict): Appointment with urgency, appointment_time and id
+    
+    Returns:
+        tuple: (-urgency, appointment_time, id)
+    """
+    return -(row['urgency'] or 0), row['appointment_time'], row['id']
+
+def appointment_end(row):
+    """Get an appointment's end time, assuming the default length if it has none"""
+    return row['end_time'] or row['appointment_time'] + datetime.timedelta(minutes=APPOINTMENT_MINUTES)
+
+def _entry(row):
+    """Convert an appointment row into a (key, appointment_id, appointment_data) heap entry"""
+    return queue_key(row), row['id'], {
+        'urgency': row['urgency'] or 0,
+        'patient_id': row['patient_id'],
+        'doctor_id': row['doctor_id'],
+        'appointment_time': row['appointment_time'],
+        'end_time': appointment_end(row),
+        'reason': row['reason'],
+        'status': 'scheduled'
+    }
+
+def record_change(appointment_id):
+    """
+    Tell every worker that an appointment's place in the queue may have changed.
+    
+    Call inside the ``transaction()`` that writes the appointment, so the event
+    commits (or rolls back) with it.
+    
+    Args:
+        appointment_id (int): Appointment that was booked, cancelled or updated
+    """
+    execute("INSERT INTO appointment_queue_events (appointment_id) VALUES (%s)", (appointment_id,))
+
+def record_changes(appointment_ids):
+    """
+    Record changes to many appointments with one multi-row INSERT.
+    
+    Args:
+        appointment_ids (iterable): Appointments that were booked, cancelled or updated
+    """
+    execute_many(
+        "INSERT INTO appointment_queue_events (appointment_id) VALUES (%s)",
+        [(appointment_id,) for appointment_id in appointment_ids]
+    )
+
+class AppointmentQueue:
+    """
+    Per-process heaps of scheduled appointments kept in step with the database:
+    one across the hospital and one per doctor, plus each doctor's schedule
+    as an interval tree and as booked-slot masks per day.
+    """
+    
+    def __init__(self):
+        """Create an empty queue; it is loaded on first use or by ``warm_start``"""
+        self.heap = MinHeap()
+        self.doctors = HeapMap()
+        self.schedules = {}  # doctor_id -> IntervalTree
+        self.booked = {}  # doctor_id -> {date: mask of booked slots}
+        self.lock = threading.RLock()
+        self.last_event_id = None  # None until the queue has been loaded
+        self.gaps = {}  # event id below last_event_id not seen yet -> monotonic time it was skipped
+        self.synced_at = 0.0
+        self.pruned_at = 0.0
+        self.subscribers = []  # Told of scheduled counts per doctor, see subscribe()
+    
+    def subscribe(self, subscriber):
+        """
+        Keep an object told of every doctor's number of scheduled appointments.
+        
+        The subscriber's ``set_scheduled(counts)`` gets all counts when the
+        queue (re)loads, and ``scheduled_changed(doctor_id, count)`` gets each
+        change, both called with the queue's lock held. A subscriber added
+        after the queue has loaded gets the current counts straight away.
+        
+        Args:
+            subscriber: Object with set_scheduled and scheduled_changed methods
+        """
+        with self.lock:
+            self.subscribers.append(subscriber)
+            if self.last_event_id is not None:
+                subscriber.set_scheduled({doctor_id: heap.size() for doctor_id, heap in self.doctors.heaps.items()})
+    
+    def warm_start(self):
+        """
+        Rebuild the queue from the scheduled appointments.
+        
+        Returns:
+            int: Appointments loaded
+        """
+        with self.lock:
+            started = time.perf_counter()
+            
+            # Take the event position first: changes made during the scan are
+            # replayed on the next sync, and replaying is idempotent
+            last_event_id, gaps = self._event_position()
+            
+            rows = stream_query(SCHEDULED_QUERY, batch_size=QUEUE_LOAD_BATCH, primary=True)
+            try:
+                entries = [_entry(row) for row in rows]
+            finally:
+                rows.close()
+            
+            by_doctor = {}
+            for entry in entries:
+                by_doctor.setdefault(entry[2]['doctor_id'], []).append(entry)
+            
+            self.heap.heapify(entries)
+            self.doctors.load(by_doctor)
+            
+            self.schedules = {}
+            for doctor_id, doctor_entries in by_doctor.items():
+                tree = IntervalTree()
+                tree.build((data['appointment_time'], data['end_time'], appointment_id)
+                           for _, appointment_id, data in doctor_entries)
+                self.schedules[doctor_id] = tree
+            
+            self.booked = {}
+            for _, _, data in entries:
+                self._book(data['doctor_id'], data['appointment_time'], data['end_time'])
+            
+            for subscriber in self.subscribers:
+                subscriber.set_scheduled({
+                    doctor_id: len(doctor_entries) for doctor_id, doctor_entries in by_doctor.items()
+                })
+            
+            self.last_event_id = last_event_id
+            self.gaps = gaps
+            self.synced_at = time.monotonic()
+            self.prune()
+            
+            logger.info(f"Loaded {self.heap.size()} scheduled appointments into the urgency queue "
+                        f"in {time.perf_counter() - started:.2f}s")
+            return self.heap.size()
+    
+    def _event_position(self):
+        """
+        Get the newest event id, and the ids below it that may still commit.
+        
+        Ids inserted less than QUEUE_GAP_TIMEOUT ago that are not visible yet
+        belong to transactions still in flight (or rolled back), so they start
+        out as gaps.
+        
+        Returns:
+            tuple: (last_event_id, gaps dict)
+        """
+        row = query_one(
+            """
+            SELECT COALESCE(MAX(id), 0) AS last_id,
+                   COALESCE(MAX(CASE WHEN created_at < NOW() - INTERVAL %s SECOND THEN id END), 0) AS settled_id
+            FROM appointment_queue_events
+            """,
+            (int(QUEUE_GAP_TIMEOUT),),
+            primary=True
+        )
+        last_event_id = row['last_id']
+        first = max(row['settled_id'], last_event_id - QUEUE_MAX_GAPS)
+        
+        seen = {
+            row['id'] for row in
+            query_all("SELECT id FROM appointment_queue_events WHERE id > %s", (first,), primary=True)
+        }
+        now = time.monotonic()
+        return last_event_id, {event_id: now for event_id in range(first + 1, last_event_id) if event_id not in seen}
+    
+    def _fetch_events(self, last_event_id, gaps):
+        """
+        Read the events after a position, and any gaps that have committed since,
+        with the current row of each event's appointment.
+        
+        Args:
+            last_event_id (int): Newest event already applied
+            gaps (iterable): Lower event ids still missing
+        
+        Returns:
+            list: Event rows in id order
+        """
+        gaps = list(gaps)
+        missing = f" OR e.id IN ({', '.join(['%s'] * len(gaps))})" if gaps else ''
+        
+        query = f"""
+            SELECT e.id AS event_id, a.id, a.urgency, a.patient_id, a.doctor_id,
+                   a.appointment_time, a.end_time, a.reason, a.status, e.appointment_id
+            FROM appointment_queue_events e
+            LEFT JOIN appointments a ON a.id = e.appointment_id
+            WHERE e.id > %s{missing}
+            ORDER BY e.id
+        """
+        return query_all(query, (last_event_id, *gaps), primary=True)
+    
+    def _advance(self, event_id):
+        """
+        Move the event position past an event about to be applied (lock held).
+        
+        Ids jumped over become gaps.
+        
+        Args:
+            event_id (int): Event id
+        
+        Returns:
+            bool: False if the event was already applied
+        """
+        if self.gaps.pop(event_id, None) is not None:
+            return True
+        if event_id <= self.last_event_id:
+            return False
+        
+        now = time.monotonic()
+        for skipped in range(max(self.last_event_id + 1, event_id - QUEUE_MAX_GAPS), event_id):
+            self.gaps[skipped] = now
+        self.last_event_id = event_id
+        return True
+    
+    def _expire_gaps(self):
+        """Stop waiting for gaps older than QUEUE_GAP_TIMEOUT, and for the oldest beyond QUEUE_MAX_GAPS (lock held)"""
+        cutoff = time.monotonic() - QUEUE_GAP_TIMEOUT
+        for event_id in [event_id for event_id, skipped_at in self.gaps.items() if skipped_at < cutoff]:
+            del self.gaps[event_id]
+        
+        for event_id in sorted(self.gaps)[:max(0, len(self.gaps) - QUEUE_MAX_GAPS)]:
+            del self.gaps[event_id]
+    
+    def sync(self):
+        """
+        Apply changes made by any worker since the last sync.
+        
+        The events are read without holding the lock, so other requests can
+        use the queue during the round trip; only applying them is locked.
+        A full rebuild, which is rare, holds the lock throughout.
+        """
+        with self.lock:
+            if self.last_event_id is None or time.monotonic() - self.synced_at > QUEUE_MAX_LAG:
+                # Never loaded, or idle long enough that events may have been pruned
+                self.warm_start()
+                return
+            
+            last_event_id, gaps = self.last_event_id, list(self.gaps)
+        
+        events = self._fetch_events(last_event_id, gaps)
+        
+        with self.lock:
+            # Events another thread applied meanwhile, from its own read, are skipped
+            for event in events:
+                if self._advance(event['event_id']):
+                    self._apply(event['appointment_id'], event if event['status'] == 'scheduled' else None)
+            
+            self._expire_gaps()
+            self.synced_at = time.monotonic()
+            
+            prune = self.synced_at - self.pruned_at > QUEUE_PRUNE_INTERVAL
+            if prune:
+                self.pruned_at = self.synced_at
+        
+        if prune:
+            self.prune()
+    
+    def prune(self):
+        """
+        Delete events older than twice QUEUE_MAX_LAG.
+        
+        Any worker that has not synced for QUEUE_MAX_LAG rebuilds instead of
+        reading events, so none of them still needs these. Run by ``sync``
+        every QUEUE_PRUNE_INTERVAL seconds.
+        """
+        self.pruned_at = time.monotonic()
+        execute(
+            "DELETE FROM appointment_queue_events WHERE created_at < NOW() - INTERVAL %s SECOND",
+            (int(QUEUE_MAX_LAG * 2),)
+        )
+    
+    def _apply(self, appointment_id, row):
+        """Make one heap entry match the appointment's current row (None: not scheduled) (lock held)"""
+        previous_doctor_id = self.doctors.item_keys.get(appointment_id)
+        self._unschedule(appointment_id)
+        
+        if row is None:
+            self.heap.remove(appointment_id)
+            self.doctors.remove(appointment_id)
+            self._report_scheduled(previous_doctor_id)
+            return
+        
+        key, _, appointment_data = _entry(row)
+        self.doctors.upsert(appointment_data['doctor_id'], key, appointment_id, appointment_data)
+        self._report_scheduled(previous_doctor_id, appointment_data['doctor_id'])
+        self.schedules.setdefault(appointment_data['doctor_id'], IntervalTree()).insert(
+            appointment_data['appointment_time'], appointment_data['end_time'], appointment_id
+        )
+        self._book(appointment_data['doctor_id'], appointment_data['appointment_time'], appointment_data['end_time'])
+        
+        if not self.heap.update_priority(appointment_id, key):
+            self.heap.insert(key, appointment_id, appointment_data)
+            return
+        
+        self.heap.replace_data(appointment_id, appointment_data)
+    
+    def _report_scheduled(self, *doctor_ids):
+        """Pass the scheduled counts of doctors whose queues changed on to subscribers (lock held)"""
+        for doctor_id in set(doctor_ids):
+            if doctor_id is not None:
+                for subscriber in self.subscribers:
+                    subscriber.scheduled_changed(doctor_id, self.doctors.size(doctor_id))
+    
+    def _unschedule(self, appointment_id):
+        """Remove an appointment from its doctor's interval tree and booked slots, if present (lock held)"""
+        doctor_id = self.doctors.item_keys.get(appointment_id)
+        if doctor_id is None:
+            return
+        
+        tree = self.schedules.get(doctor_id)
+        if tree is None or appointment_id not in tree.intervals:
+            return
+        
+        start, end = tree.intervals[appointment_id]
+        tree.remove(appointment_id)
+        if tree.is_empty():
+            del self.schedules[doctor_id]
+        
+        # Rebuild the affected days from what is still booked, in case
+        # another appointment shares one of the slots
+        days = self.booked.get(doctor_id, {})
+        for day, _ in day_masks(start, end):
+            mask = 0
+            midnight = datetime.datetime.combine(day, datetime.time())
+            for other in tree.overlapping(midnight, midnight + datetime.timedelta(days=1)):
+                mask |= dict(day_masks(*tree.intervals[other])).get(day, 0)
+            
+            if mask:
+                days[day] = mask
+            else:
+                days.pop(day, None)
+        
+        if not days:
+            self.booked.pop(doctor_id, None)
+    
+    def _book(self, doctor_id, start, end):
+        """Mark an appointment's slots as booked (lock held)"""
+        days = self.booked.setdefault(doctor_id, {})
+        for day, mask in day_masks(start, end):
+            days[day] = days.get(day, 0) | mask
+    
+    def booked_masks(self, day, doctor_ids):
+        """
+        Get the booked slots of some doctors on one day.
+        
+        Call ``sync`` first to include other workers' changes.
+        
+        Args:
+            day (date): Day
+            doctor_ids (iterable): Doctors of interest
+        
+        Returns:
+            dict: doctor_id -> mask, for the doctors with bookings that day
+        """
+        with self.lock:
+            masks = {}
+            for doctor_id in doctor_ids:
+                mask = self.booked.get(doctor_id, {}).get(day)
+                if mask:
+                    masks[doctor_id] = mask
+            return masks
+    
+    def next_free_slot(self, doctor_id, week, after, length, days):
+        """
+        Find when a doctor next has ``length`` free slots in a row.
+        
+        Call ``sync`` first to include other workers' changes.
+        
+        Args:
+            doctor_id (int): Doctor id
+            week (list): The doctor's seven weekday working-hour masks
+            after (datetime): Earliest start
+            length (int): Slots needed
+            days (int): Days to look ahead
+        
+        Returns:
+            datetime: Start of the first free slot, or None if there is none in time
+        """
+        with self.lock:
+            booked = self.booked.get(doctor_id, {})
+            day = after.date()
+            
+            for _ in range(days):
+                midnight = datetime.datetime.combine(day, datetime.time())
+                first = max(0, -(-int((after - midnight).total_seconds()) // (SLOT_MINUTES * 60)))
+                starts = free_starts(week[day.weekday()] & ~booked.get(day, 0), length) >> first
+                if starts:
+                    index = first + (starts & -starts).bit_length() - 1
+                    return midnight + datetime.timedelta(minutes=index * SLOT_MINUTES)
+                day += datetime.timedelta(days=1)
+            
+            return None
+    
+    def find_conflict(self, doctor_id, start, end, exclude=None):
+        """
+        Find a scheduled appointment of a doctor's that overlaps [start, end).
+        
+        Only looks at this worker's copy of the schedule, as of its last sync,
+        without a database round trip. Bookings must still check the database
+        under a lock; this just turns clear clashes away cheaply.
+        
+        Args:
+            doctor_id (int): Doctor id
+            start (datetime): Proposed start
+            end (datetime): Proposed end
+            exclude (int, optional): Appointment being moved, ignored
+        
+        Returns:
+            int: Id of a clashing appointment, or None
+        """
+        with self.lock:
+            tree = self.schedules.get(doctor_id)
+            return tree.find_overlap(start, end, exclude) if tree else None
+    
+    def peek(self, doctor_id=None):
+        """
+        Get the most urgent scheduled appointment after catching up with other workers.
+        
+        Args:
+            doctor_id (int, optional): Only consider this doctor's appointments
+        
+        Returns:
+            list: [key, appointment_id, appointment_data], or None if the queue is empty
+        """
+        entries = self.top(1, doctor_id)
+        return entries[0] if entries else None
+    
+    def top(self, k, doctor_id=None):
+        """
+        Get the k most urgent scheduled appointments in order, without removing them.
+        
+        Args:
+            k (int): Number of appointments wanted
+            doctor_id (int, optional): Only consider this doctor's appointments
+        
+        Returns:
+            list: Up to k [key, appointment_id, appointment_data] entries
+        """
+        self.sync()
+        with self.lock:
+            if doctor_id is None:
+                entries = self.heap.smallest(k)
+            else:
+                entries = self.doctors.smallest(doctor_id, k)
+            return [list(entry) for entry in entries]
+    
+    def discard(self, appointment_id):
+        """
+        Drop an entry found to be stale, e.g. an appointment removed by a cascading delete.
+        
+        Args:
+            appointment_id (int): Appointment id
+        """
+        with self.lock:
+            doctor_id = self.doctors.item_keys.get(appointment_id)
+            self._unschedule(appointment_id)
+            self.heap.remove(appointment_id)
+            self.doctors.remove(appointment_id)
+            self._report_scheduled(doctor_id)
+    
+    def size(self, doctor_id=None):
+        """Get the number of queued appointments, overall or for one doctor"""
+        with self.lock:
+            return self.heap.size() if doctor_id is None else self.doctors.size(doctor_id)
+
+# Urgency queue for this process
+appointment_queue = AppointmentQueue()
+appointment_queue.subscribe(doctor_availability)
+
+def start_background_sync(interval=QUEUE_SYNC_INTERVAL):
+    """
+    Keep this process's queue and doctor directory caught up from a daemon thread.
+    
+    Other workers' bookings and doctor edits are applied every ``interval``
+    seconds (the doctors table only once ``doctor_availability`` is stale),
+    so views that only read rankings, such as ``/api/doctors/available``,
+    need no round trip of their own.
+    
+    Args:
+        interval (float): Seconds between syncs
+    
+    Returns:
+        threading.Thread: The started thread
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                appointment_queue.sync()
+                if doctor_availability.is_stale():
+                    doctor_availability.refresh()
+            except Exception as e:
+                logger.error(f"Background queue sync failed: {str(e)}")
+    
+    thread = threading.Thread(target=run, name='hdims-queue-sync', daemon=True)
+    thread.start()
+    return thread
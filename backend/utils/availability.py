@@ -0,0 +1,483 @@
+"""
+Doctor availability as per-day slot bitmaps.
+
+A day is split into SLOT_MINUTES slots. Bit i of a day mask is the slot
+starting i * SLOT_MINUTES after midnight. A doctor's working hours, parsed
+from the free-text ``doctors.availability`` ("Monday-Friday: 9AM-5PM,
+Saturday: 9AM-1PM"), become one mask per weekday. Booked time becomes one
+mask per doctor and date (kept by the appointment queue), so the free slots
+of a day are ``working & ~booked``. Masks are Python ints, which give
+bitwise AND/OR/shift over the whole day at once.
+
+The same per-process directory ranks doctors by how free they are, for
+``/api/doctors/available``. It is built once. After that the appointment
+queue reports each doctor's number of scheduled appointments as it changes,
+and registrations and profile edits are applied one doctor at a time, so
+the ranking stays up to date in O(log n) per change and reads never touch
+the database. Other workers' doctor edits are picked up by ``refresh``,
+which the background sync runs off the request path.
+"""
+import re
+import time
+import datetime
+import threading
+from backend.db.mysql import query_all
+from backend.db.cache import query_cache, DB_QUERY_CACHE_TTL
+from backend.dsa.maxheap import MaxHeap
+from backend.dsa.heap_map import HeapMap
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Length of one slot, and slots in a day
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+DAY_NAMES = {
+    'mon': 0, 'monday': 0,
+    'tue': 1, 'tues': 1, 'tuesday': 1,
+    'wed': 2, 'weds': 2, 'wednesday': 2,
+    'thu': 3, 'thur': 3, 'thurs': 3, 'thursday': 3,
+    'fri': 4, 'friday': 4,
+    'sat': 5, 'saturday': 5,
+    'sun': 6, 'sunday': 6
+}
+
+DAY_GROUPS = {
+    'daily': range(7), 'everyday': range(7), 'every day': range(7), 'all week': range(7),
+    'weekdays': range(5), 'weekday': range(5),
+    'weekends': (5, 6), 'weekend': (5, 6)
+}
+
+# "Monday-Friday: 9AM-5PM": a day part starting with a letter, then the hours
+_DAYS_AND_HOURS = re.compile(r"^([A-Za-z][A-Za-z\s\-/&]*?)\s*:\s*(.*)$")
+
+_TIME = r"(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*(?:m\.?)?"
+_TIME_RANGE = re.compile(_TIME + r"\s*(?:-|–|to)\s*" + _TIME, re.I)
+
+_CLOSED = re.compile(r"\b(unavailable|closed|off|none|n/?a)\b", re.I)
+
+def _parse_days(text):
+    """
+    Parse a day list such as "Monday-Friday", "Sat & Sun" or "Weekdays".
+    
+    Returns:
+        list: Weekday numbers (Monday is 0), or None if the text is not a day list
+    """
+    text = text.strip().lower()
+    if text in DAY_GROUPS:
+        return list(DAY_GROUPS[text])
+    
+    days = []
+    for part in re.split(r"\s*(?:/|&|\band\b)\s*", text):
+        if not part:
+            continue
+        
+        ends = [end.strip() for end in re.split(r"\s*(?:-|–|\bto\b)\s*", part)]
+        if len(ends) == 1 and ends[0] in DAY_NAMES:
+            days.append(DAY_NAMES[ends[0]])
+        elif len(ends) == 2 and ends[0] in DAY_NAMES and ends[1] in DAY_NAMES:
+            # Ranges may wrap around the weekend, e.g. "Friday-Monday"
+            day, last = DAY_NAMES[ends[0]], DAY_NAMES[ends[1]]
+            days.append(day)
+            while day != last:
+                day = (day + 1) % 7
+                days.append(day)
+        elif part in DAY_GROUPS:
+            days.extend(DAY_GROUPS[part])
+        else:
+            return None
+    
+    return days or None
+
+def _minutes(hour, minute, meridiem):
+    """Convert a parsed clock time to minutes after midnight"""
+    hour = int(hour) % 24
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    return hour * 60 + int(minute or 0)
+
+def _parse_hours(text):
+    """
+    Parse working hours such as "9AM-5PM", "9:30 am to 1 pm & 2pm-6pm" or "09:00-17:00".
+    
+    Returns:
+        int: Day mask of the slots fully inside the hours
+    """
+    if _CLOSED.search(text):
+        return 0
+    
+    mask = 0
+    for start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem in _TIME_RANGE.findall(text):
+        # "9-5PM" means 9AM-5PM; "9-5" with no AM/PM means 9AM-5PM as well
+        if not start_meridiem and end_meridiem:
+            start_meridiem = end_meridiem
+            if _minutes(start_hour, start_minute, start_meridiem) > _minutes(end_hour, end_minute, end_meridiem):
+                start_meridiem = 'a'
+        
+        start = _minutes(start_hour, start_minute, start_meridiem)
+        end = _minutes(end_hour, end_minute, end_meridiem)
+        if not start_meridiem and not end_meridiem and end <= start:
+            end += 12 * 60
+        if end <= start:
+            # "10PM-12AM": until midnight
+            end = 24 * 60 if end == 0 else end
+        
+        first = -(-start // SLOT_MINUTES)
+        last = min(end // SLOT_MINUTES, SLOTS_PER_DAY)
+        if last > first:
+            mask |= ((1 << (last - first)) - 1) << first
+    
+    return mask
+
+def parse_availability(text):
+    """
+    Parse a doctor's free-text availability into weekly working-hour masks.
+    
+    Clauses are separated by commas, semicolons or new lines. Each one names
+    days and hours ("Monday-Friday: 9AM-5PM"), only days whose hours come in
+    the next clause ("Monday, Wednesday: 9AM-1PM"), or only hours for the
+    days of the previous clause ("Monday: 9AM-12PM, 2PM-5PM"). Clauses that
+    cannot be understood are ignored.
+    
+    Args:
+        text (str): Availability text
+    
+    Returns:
+        list: Seven day masks, Monday first
+    """
+    week = [0] * 7
+    pending = []
+    days = []
+    
+    for piece in re.split(r"[,;\n]+", text or ''):
+        piece = piece.strip()
+        if not piece:
+            continue
+        
+        match = _DAYS_AND_HOURS.match(piece)
+        if match:
+            days = pending + (_parse_days(match.group(1)) or [])
+            pending = []
+            hours = match.group(2)
+        elif not re.search(r"\d", piece) and _parse_days(piece):
+            pending += _parse_days(piece)
+            continue
+        else:
+            hours = piece
+        
+        mask = _parse_hours(hours)
+        for day in days:
+            week[day] |= mask
+    
+    return week
+
+def day_masks(start, end):
+    """
+    Split a time span into per-date slot masks.
+    
+    Every slot the span touches is included, so a 9:10-9:20 appointment
+    blocks the 9:00 slot.
+    
+    Args:
+        start (datetime): Span start
+        end (datetime): Span end (exclusive)
+    
+    Returns:
+        list: (date, mask) pairs in date order
+    """
+    masks = []
+    day = start.date()
+    
+    while True:
+        midnight = datetime.datetime.combine(day, datetime.time())
+        next_midnight = midnight + datetime.timedelta(days=1)
+        
+        first = int((max(start, midnight) - midnight).total_seconds() // 60) // SLOT_MINUTES
+        last = -(-int((min(end, next_midnight) - midnight).total_seconds() // 60) // SLOT_MINUTES)
+        if last > first:
+            masks.append((day, ((1 << (last - first)) - 1) << first))
+        
+        if end <= next_midnight:
+            return masks
+        day += datetime.timedelta(days=1)
+
+def free_starts(free, length):
+    """
+    Find the slots where a run of ``length`` free slots begins.
+    
+    Bit i of the result is set when bits i .. i + length - 1 of ``free`` all
+    are, found with ``length - 1`` shifts and ANDs rather than a scan.
+    
+    Args:
+        free (int): Day mask of free slots
+        length (int): Slots needed
+    
+    Returns:
+        int: Day mask of possible start slots
+    """
+    starts = free
+    for shift in range(1, length):
+        starts &= free >> shift
+    return starts
+
+def slot_indexes(mask):
+    """Yield the set bit positions of a mask in ascending order"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def specialization_key(specialization):
+    """Normalize a specialization for case-insensitive matching"""
+    return (specialization or '').strip().lower()
+
+def availability_score(scheduled):
+    """
+    Score how available a doctor is from their number of scheduled appointments.
+    
+    Args:
+        scheduled (int or numpy.ndarray): Scheduled appointments, or an array
+            of them to score every doctor at once
+    
+    Returns:
+        int or numpy.ndarray: 100 with no appointments, 5 less per appointment, at least 5
+    """
+    penalty = scheduled * 5
+    if np is not None and isinstance(penalty, np.ndarray):
+        return 100 - np.minimum(penalty, 95)
+    return 100 - min(penalty, 95)
+
+class DoctorAvailability:
+    """
+    Parsed working hours of every doctor, loaded once from the doctors
+    table, and a MaxHeap ranking them by availability score, plus one heap
+    per specialization so a filtered ranking only looks at that specialty.
+    
+    Becomes stale after DB_QUERY_CACHE_TTL seconds, or when this process
+    writes the doctors table other than through ``upsert``. The background
+    sync then calls ``refresh``, so edits made by other workers show up
+    within the same delay as cached queries. Reads never reload.
+    """
+    
+    def __init__(self, ttl=DB_QUERY_CACHE_TTL):
+        """
+        Create an empty index; it is loaded on first use.
+        
+        Args:
+            ttl (float): Seconds before the doctors table should be checked again
+        """
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.doctors = {}  # doctor_id -> {'name', 'specialization', 'availability', 'week'}
+        self.scheduled = {}  # doctor_id -> scheduled appointments, from the appointment queue
+        self.ranking = MaxHeap()  # [(score, -doctor_id), doctor_id, doctor]; ties go to the lower id
+        self.specialties = HeapMap()  # specialization_key -> MinHeap of [(-score, doctor_id), doctor_id, doctor]
+        self.loaded_at = None
+        self.generation = None
+        self.version = 0  # Bumped whenever any doctor's details change
+    
+    def _rank(self, doctor_id):
+        """Insert or reposition one doctor in the ranking (lock held)"""
+        doctor = self.doctors.get(doctor_id)
+        if doctor is None:
+            self.ranking.remove(doctor_id)
+            self.specialties.remove(doctor_id)
+            return
+        
+        score = availability_score(self.scheduled.get(doctor_id, 0))
+        if self.ranking.update_availability(doctor_id, (score, -doctor_id)):
+            self.ranking.replace_data(doctor_id, doctor)
+        else:
+            self.ranking.insert((score, -doctor_id), doctor_id, doctor)
+        
+        # Same order in the specialty's min-heap: highest score, then lowest id
+        self.specialties.upsert(specialization_key(doctor['specialization']), (-score, doctor_id), doctor_id, doctor)
+    
+    def _rank_all(self):
+        """Rebuild the rankings of every doctor with O(n) heapify (lock held)"""
+        ranking = []
+        specialties = {}
+        
+        for doctor_id, doctor in self.doctors.items():
+            score = availability_score(self.scheduled.get(doctor_id, 0))
+            ranking.append(((score, -doctor_id), doctor_id, doctor))
+            specialties.setdefault(specialization_key(doctor['specialization']), []).append(
+                ((-score, doctor_id), doctor_id, doctor)
+            )
+        
+        self.ranking.heapify(ranking)
+        self.specialties.load(specialties)
+    
+    def _load(self):
+        """Load the doctors the first time they are needed"""
+        if self.loaded_at is None:
+            self.refresh()
+    
+    def is_stale(self):
+        """Check whether ``refresh`` is due: never loaded, written by this process, or older than the TTL"""
+        return (self.loaded_at is None or self.generation != query_cache.generation(('doctors',))
+                or time.monotonic() - self.loaded_at >= self.ttl)
+    
+    def refresh(self):
+        """
+        Read the doctors table and apply the doctors that changed.
+        
+        The first call builds the rankings with heapify. Later calls only
+        reparse and reposition doctors that were added, edited or removed,
+        in O(log n) each. The table is read without holding the lock.
+        
+        Returns:
+            int: Doctors added, changed or removed
+        """
+        generation = query_cache.generation(('doctors',))
+        rows = query_all("SELECT doctor_id, name, specialization, availability FROM doctors")
+        
+        with self.lock:
+            if self.loaded_at is not None and query_cache.generation(('doctors',)) != generation:
+                # This process wrote a doctor during the read; try again next time
+                return 0
+            
+            doctors = {}
+            changed = []
+            
+            for row in rows:
+                previous = self.doctors.get(row['doctor_id'])
+                if previous and all(previous[key] == row[key] for key in ('name', 'specialization', 'availability')):
+                    doctors[row['doctor_id']] = previous
+                    continue
+                
+                doctors[row['doctor_id']] = {
+                    'name': row['name'],
+                    'specialization': row['specialization'],
+                    'availability': row['availability'],
+                    'week': (previous['week'] if previous and previous['availability'] == row['availability']
+                             else parse_availability(row['availability']))
+                }
+                changed.append(row['doctor_id'])
+            
+            changed.extend(doctor_id for doctor_id in self.doctors if doctor_id not in doctors)
+            
+            first = self.loaded_at is None
+            self.loaded_at = time.monotonic()
+            self.generation = generation
+            if not changed and not first:
+                return 0
+            
+            # select() iterates its snapshot unlocked, so swap in a new dict
+            self.doctors = doctors
+            self.version += 1
+            if first:
+                self._rank_all()
+            else:
+                for doctor_id in changed:
+                    self._rank(doctor_id)
+            return len(changed)
+    
+    def upsert(self, doctor_id, fields):
+        """
+        Apply a doctor's registration or profile update made by this process.
+        
+        Only that doctor is reparsed and repositioned, and the write does not
+        cause a reload. Does nothing until the directory has been loaded.
+        
+        Args:
+            doctor_id (int): Doctor id
+            fields (dict): New values of any of name, specialization and availability
+        """
+        with self.lock:
+            if self.loaded_at is None:
+                return
+            
+            doctor = dict(self.doctors.get(doctor_id) or {'name': None, 'specialization': None, 'availability': None})
+            doctor.update((key, fields[key]) for key in ('name', 'specialization', 'availability') if key in fields)
+            if 'week' not in doctor or 'availability' in fields:
+                doctor['week'] = parse_availability(doctor['availability'])
+            
+            if doctor_id not in self.doctors:
+                # select() iterates its snapshot unlocked, so never resize it
+                self.doctors = dict(self.doctors)
+            self.doctors[doctor_id] = doctor
+            self.generation = query_cache.generation(('doctors',))
+            self.version += 1
+            self._rank(doctor_id)
+    
+    def set_scheduled(self, counts):
+        """
+        Replace every doctor's scheduled appointment count, e.g. after the queue reloads.
+        
+        Args:
+            counts (dict): doctor_id -> scheduled appointments
+        """
+        with self.lock:
+            self.scheduled = dict(counts)
+            self._rank_all()
+    
+    def scheduled_changed(self, doctor_id, count):
+        """
+        Record a change in one doctor's scheduled appointment count in O(log n).
+        
+        Args:
+            doctor_id (int): Doctor id
+            count (int): Scheduled appointments now
+        """
+        with self.lock:
+            if count:
+                self.scheduled[doctor_id] = count
+            else:
+                self.scheduled.pop(doctor_id, None)
+            if doctor_id in self.doctors:
+                self._rank(doctor_id)
+    
+    def most_available(self, n, specialization=None):
+        """
+        Get the n doctors with the highest availability score.
+        
+        Args:
+            n (int): Number of doctors wanted
+            specialization (str, optional): Only doctors of this specialization,
+                matched case-insensitively
+        
+        Returns:
+            list: (score, doctor_id, doctor info) tuples, most available first
+        """
+        self._load()
+        with self.lock:
+            if specialization:
+                entries = self.specialties.smallest(specialization_key(specialization), n)
+                return [(-priority[0], doctor_id, doctor) for priority, doctor_id, doctor in entries]
+            return [(priority[0], doctor_id, doctor) for priority, doctor_id, doctor in self.ranking.get_top_n(n)]
+    
+    def select(self, specialization=None, doctor_ids=None):
+        """
+        Get the working hours of the doctors matching a filter.
+        
+        Args:
+            specialization (str, optional): Specialization, matched case-insensitively
+            doctor_ids (iterable, optional): Only these doctors
+        
+        Returns:
+            dict: doctor_id -> doctor info including 'week' masks
+        """
+        self._load()
+        with self.lock:
+            doctors = self.doctors
+        
+        if doctor_ids is not None:
+            doctors = {doctor_id: doctors[doctor_id] for doctor_id in doctor_ids if doctor_id in doctors}
+        if specialization:
+            specialization = specialization_key(specialization)
+            doctors = {
+                doctor_id: doctor for doctor_id, doctor in doctors.items()
+                if specialization_key(doctor['specialization']) == specialization
+            }
+        return doctors
+
+# Working hours of every doctor for this process
+doctor_availability = DoctorAvailability()
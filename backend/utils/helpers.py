@@ -1,9 +1,10 @@
 import json
+import base64
+import binascii
 import datetime
 import logging
+from flask import Response, current_app, request, stream_with_context
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -29,6 +30,146 @@ def format_response(data):
     """
     return json.dumps(data, cls=DateTimeEncoder)
 
+def stream_requested():
+    """
+    Get the streaming format requested by the client, if any.
+    
+    Clients opt in with ``?stream=ndjson`` / ``?stream=json`` or an
+    ``Accept: application/x-ndjson`` header.
+    
+    Returns:
+        str: 'ndjson', 'json' or None for a regular buffered response
+    """
+    stream = request.args.get('stream', default=None, type=str)
+    
+    if stream in ('ndjson', 'json'):
+        return stream
+    if request.accept_mimetypes.best == 'application/x-ndjson':
+        return 'ndjson'
+    return None
+
+def stream_rows(rows, key, fmt='ndjson'):
+    """
+    Build a streaming response from an iterable of rows.
+    
+    Args:
+        rows (iterable): Rows to send, typically from ``stream_query``
+        key (str): Top-level key for the JSON array format
+        fmt (str): 'ndjson' for one JSON object per line, or 'json' for a
+            chunked ``{"key": [...]}`` document
+        
+    Returns:
+        Response: Streaming Flask response; ``rows`` is closed when the
+        response is, even if the client disconnects early
+    """
+    dumps = current_app.json.dumps
+    
+    def generate_ndjson():
+        for row in rows:
+            yield dumps(row) + '\n'
+    
+    def generate_json():
+        yield '{' + json.dumps(key) + ': ['
+        first = True
+        for row in rows:
+            yield ('' if first else ', ') + dumps(row)
+            first = False
+        yield ']}\n'
+    
+    if fmt == 'ndjson':
+        response = Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    else:
+        response = Response(stream_with_context(generate_json()), mimetype='application/json')
+    
+    if hasattr(rows, 'close'):
+        response.call_on_close(rows.close)
+    return response
+
+def encode_cursor(values):
+    """
+    Encode keyset pagination values into an opaque cursor.
+    
+    Args:
+        values (list): Sort-key values of the last row on the page
+        
+    Returns:
+        str: URL-safe cursor string
+    """
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat(sep=' ')
+        elif isinstance(value, datetime.date):
+            value = value.isoformat()
+        encoded.append(value)
+    
+    raw = json.dumps(encoded, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    """
+    Decode a cursor produced by ``encode_cursor``.
+    
+    Args:
+        cursor (str): Cursor string from the client
+        size (int): Expected number of sort-key values
+        
+    Returns:
+        list: Sort-key values, or None if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+def get_page_args(key_size, default_limit=50, max_limit=200):
+    """
+    Read ``limit`` and ``cursor`` pagination arguments from the request.
+    
+    Args:
+        key_size (int): Number of values in the endpoint's sort key
+        default_limit (int): Page size when ``limit`` is not given
+        max_limit (int): Largest page size the server will return
+        
+    Returns:
+        tuple: (limit, after, error) - after is the decoded cursor (or None
+        for the first page); error is a message if the cursor is invalid
+    """
+    limit = request.args.get('limit', default=default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    
+    cursor = request.args.get('cursor', default=None, type=str)
+    if not cursor:
+        return limit, None, None
+    
+    after = decode_cursor(cursor, key_size)
+    if after is None:
+        return limit, None, 'Invalid pagination cursor'
+    return limit, after, None
+
+def paginate(rows, limit, key_fields):
+    """
+    Trim a ``limit + 1`` result to one page and build the next cursor.
+    
+    Args:
+        rows (list): Rows fetched with ``LIMIT limit + 1``
+        limit (int): Page size
+        key_fields (list): Row keys that make up the sort key
+        
+    Returns:
+        tuple: (page_rows, next_cursor) - next_cursor is None on the last page
+    """
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    return rows, encode_cursor([rows[-1][field] for field in key_fields])
+
 def validate_email(email):
     """
     Validate email format.
@@ -1,16 +1,15 @@
+import inspect
 from functools import wraps
-from flask import request, jsonify
-from backend.auth.auth import verify_token
-from backend.db.mysql import execute_query, fetch_results
+from flask import jsonify, g
+from backend.auth.auth import current_principal
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 def role_required(allowed_roles):
     """
     Decorator to restrict access to certain routes based on user role.
+    Works on both sync and async views.
     
     Args:
         allowed_roles (list): List of roles allowed to access the route
@@ -18,26 +17,41 @@ def role_required(allowed_roles):
     Returns:
         function: Decorated route function
     """
+    def check_access():
+        """Return (payload, None) if the caller may proceed, else (None, error response)"""
+        # The token was verified once for this request by the auth resolver
+        payload = current_principal()
+        
+        if g.auth_token is None:
+            return None, (jsonify({'message': 'Missing or invalid Authorization header'}), 401)
+        
+        if not payload:
+            return None, (jsonify({'message': 'Invalid or expired token'}), 401)
+        
+        # Check if user has required role
+        if payload['role'] not in allowed_roles:
+            return None, (jsonify({'message': 'You do not have permission to access this resource'}), 403)
+        
+        return payload, None
+    
     def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def decorated_async(*args, **kwargs):
+                payload, error = check_access()
+                if error:
+                    return error
+                
+                # Pass the user payload to the route function
+                return await f(payload, *args, **kwargs)
+            
+            return decorated_async
+        
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Get the token from the Authorization header
-            auth_header = request.headers.get('Authorization')
-            
-            if not auth_header or not auth_header.startswith('Bearer '):
-                return jsonify({'message': 'Missing or invalid Authorization header'}), 401
-            
-            token = auth_header.split(' ')[1]
-            
-            # Verify the token
-            payload = verify_token(token)
-            
-            if not payload:
-                return jsonify({'message': 'Invalid or expired token'}), 401
-            
-            # Check if user has required role
-            if payload['role'] not in allowed_roles:
-                return jsonify({'message': 'You do not have permission to access this resource'}), 403
+            payload, error = check_access()
+            if error:
+                return error
             
             # Pass the user payload to the route function
             return f(payload, *args, **kwargs)
@@ -0,0 +1,361 @@
+"""
+Doctor recommendations for a patient request.
+
+Every doctor is scored by a weighted sum of features: whether their
+specialization matches the request, how loaded they are, their average
+satisfaction score and response time from ``performance_metrics``, how soon
+they have a free slot, and how often the patient has already seen them.
+
+The features live in one array per feature, indexed by a row per doctor,
+so scoring every doctor is a single vectorized pass and the best N are
+picked with ``argpartition`` rather than a full sort. Loads change in O(1)
+as the appointment queue reports bookings and cancellations. A doctor's
+next free slot is recomputed only after their schedule changes or the slot
+has passed. Doctor details and performance averages are reloaded when they
+change, or after DB_QUERY_CACHE_TTL seconds.
+
+NumPy is optional: without it the same scores are computed with plain
+Python loops.
+"""
+import time
+import datetime
+import threading
+from heapq import nlargest
+from backend.db.mysql import query_all
+from backend.db.cache import query_cache, DB_QUERY_CACHE_TTL
+from backend.utils.appointment_queue import appointment_queue, APPOINTMENT_MINUTES
+from backend.utils.availability import doctor_availability, specialization_key, availability_score, SLOT_MINUTES
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Weight of each feature; every feature is scaled to 0-1 first
+RECOMMENDATION_WEIGHTS = {
+    'specialization': 4.0,
+    'load': 1.0,
+    'rating': 1.5,
+    'responsiveness': 0.5,
+    'next_free': 1.5,
+    'past_visits': 1.0
+}
+
+# Days searched for a doctor's next free slot
+NEXT_FREE_DAYS = 14
+
+# A free slot this many hours away scores half as well as one right now
+NEXT_FREE_HALF_SCORE_HOURS = 24
+
+# Completed visits after which seeing the same doctor again counts fully
+PAST_VISITS_CAP = 3
+
+# Average satisfaction and response time of every doctor with metrics
+PERFORMANCE_QUERY = """
+    SELECT doctor_id, AVG(satisfaction_score) AS satisfaction, AVG(avg_response_time) AS response_time
+    FROM performance_metrics
+    GROUP BY doctor_id
+"""
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+def _minutes(moment):
+    """Convert a datetime to minutes since 1970 for the next-free-slot arrays"""
+    return (moment - _EPOCH).total_seconds() / 60
+
+def patient_visits(patient_id):
+    """
+    Count a patient's completed visits per doctor.
+    
+    Args:
+        patient_id (int): Patient id
+    
+    Returns:
+        dict: doctor_id -> completed appointments
+    """
+    query = """
+        SELECT doctor_id, COUNT(*) AS visits
+        FROM appointments
+        WHERE patient_id = %s AND status = 'completed'
+        GROUP BY doctor_id
+    """
+    return {row['doctor_id']: row['visits'] for row in query_all(query, (patient_id,))}
+
+def _column(values, dtype=float):
+    """Make a feature column: a NumPy array, or a list without NumPy"""
+    return np.array(values, dtype=dtype) if np is not None else list(values)
+
+class DoctorRecommender:
+    """
+    Per-process feature arrays of every doctor, scored per request.
+    
+    Subscribes to the appointment queue for each doctor's scheduled count.
+    Lock order is the queue's lock, then this one, as the queue calls in
+    with its lock held.
+    """
+    
+    def __init__(self, ttl=DB_QUERY_CACHE_TTL):
+        """
+        Create empty arrays; they are loaded on first use.
+        
+        Args:
+            ttl (float): Seconds before rereading doctors and performance metrics
+        """
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.scheduled = {}  # doctor_id -> scheduled appointments, from the queue
+        self.loaded_at = None
+        self.version = None  # doctor_availability.version the arrays were built from
+        self.generation = None  # performance_metrics generation they were built from
+        
+        self.rows = {}  # doctor_id -> row
+        self.doctors = []  # row -> doctor info (name, specialization, week, ...)
+        self.specialties = {}  # specialization key -> code
+        self.doctor_ids = _column([], int)
+        self.specialty = _column([], int)
+        self.load = _column([])
+        self.rating = _column([])  # average satisfaction, scaled to 0-1
+        self.responsiveness = _column([])  # fastest average response time is 1, unknown is 0
+        self.next_free = _column([])  # minutes since 1970; inf if none in NEXT_FREE_DAYS
+        self.valid_until = _column([])  # next_free must be recomputed after this; -inf: now
+    
+    def _refresh(self):
+        """
+        Rebuild the arrays if doctors or performance metrics changed.
+        
+        The doctor directory and performance averages are read without the
+        lock, as the queue waits on it with its own lock held; only the
+        rebuild is done under it.
+        """
+        started = time.monotonic()
+        doctors = doctor_availability.select()
+        version = doctor_availability.version
+        generation = query_cache.generation(('performance_metrics',))
+        
+        with self.lock:
+            if (self.loaded_at is not None and version == self.version and generation == self.generation
+                    and started - self.loaded_at < self.ttl):
+                return
+        
+        performance = {
+            row['doctor_id']: row
+            for row in query_all(PERFORMANCE_QUERY, cache_tables=('performance_metrics',))
+        }
+        
+        with self.lock:
+            # Another request may have rebuilt from newer data meanwhile
+            if self.loaded_at is not None and self.loaded_at >= started:
+                return
+            
+            self._build(doctors, performance)
+            self.loaded_at = time.monotonic()
+            self.version = version
+            self.generation = generation
+    
+    def _build(self, doctors, performance):
+        """
+        Fill the arrays from the doctor directory and performance averages (lock held).
+        
+        Args:
+            doctors (dict): doctor_id -> doctor info, from ``doctor_availability.select``
+            performance (dict): doctor_id -> row of PERFORMANCE_QUERY
+        """
+        doctor_ids = sorted(doctors)
+        specialties = {}
+        satisfaction = []
+        response_times = []
+        next_free = []
+        valid_until = []
+        
+        for doctor_id in doctor_ids:
+            specialties.setdefault(specialization_key(doctors[doctor_id]['specialization']), len(specialties))
+            metrics = performance.get(doctor_id) or {}
+            satisfaction.append(float(metrics.get('satisfaction') or 0))
+            response_times.append(float(metrics.get('response_time') or 0))
+            
+            # Keep the next free slot of doctors whose working hours did not change
+            row = self.rows.get(doctor_id)
+            if row is not None and self.doctors[row]['week'] is doctors[doctor_id]['week']:
+                next_free.append(self.next_free[row])
+                valid_until.append(self.valid_until[row])
+            else:
+                next_free.append(float('inf'))
+                valid_until.append(float('-inf'))
+        
+        best_satisfaction = max(satisfaction, default=0) or 1
+        fastest = min((value for value in response_times if value > 0), default=0)
+        
+        self.rows = {doctor_id: row for row, doctor_id in enumerate(doctor_ids)}
+        self.doctors = [doctors[doctor_id] for doctor_id in doctor_ids]
+        self.specialties = specialties
+        self.doctor_ids = _column(doctor_ids, int)
+        self.specialty = _column(
+            [specialties[specialization_key(doctors[doctor_id]['specialization'])] for doctor_id in doctor_ids], int
+        )
+        self.load = _column([self.scheduled.get(doctor_id, 0) for doctor_id in doctor_ids])
+        self.rating = _column([value / best_satisfaction for value in satisfaction])
+        self.responsiveness = _column([fastest / value if value > 0 else 0.0 for value in response_times])
+        self.next_free = _column(next_free)
+        self.valid_until = _column(valid_until)
+    
+    def set_scheduled(self, counts):
+        """
+        Replace every doctor's scheduled appointment count (queue subscriber).
+        
+        Args:
+            counts (dict): doctor_id -> scheduled appointments
+        """
+        with self.lock:
+            self.scheduled = dict(counts)
+            for doctor_id, row in self.rows.items():
+                self.load[row] = self.scheduled.get(doctor_id, 0)
+                self.valid_until[row] = float('-inf')
+    
+    def scheduled_changed(self, doctor_id, count):
+        """
+        Record a change to one doctor's appointments in O(1) (queue subscriber).
+        
+        Args:
+            doctor_id (int): Doctor id
+            count (int): Scheduled appointments now
+        """
+        with self.lock:
+            if count:
+                self.scheduled[doctor_id] = count
+            else:
+                self.scheduled.pop(doctor_id, None)
+            
+            row = self.rows.get(doctor_id)
+            if row is not None:
+                self.load[row] = count
+                self.valid_until[row] = float('-inf')
+    
+    def _update_next_free(self, now):
+        """Recompute the next free slot of doctors whose value is out of date (both locks held)"""
+        now_minutes = _minutes(now)
+        if np is not None:
+            stale = np.flatnonzero(self.valid_until <= now_minutes)
+        else:
+            stale = [row for row, valid_until in enumerate(self.valid_until) if valid_until <= now_minutes]
+        
+        length = -(-APPOINTMENT_MINUTES // SLOT_MINUTES)
+        
+        for row in stale:
+            doctor_id = int(self.doctor_ids[row])
+            week = self.doctors[row]['week']
+            if not any(week):
+                # Never works, so never has a free slot
+                self.next_free[row] = self.valid_until[row] = float('inf')
+                continue
+            
+            slot = appointment_queue.next_free_slot(doctor_id, week, now, length, NEXT_FREE_DAYS)
+            if slot is None:
+                self.next_free[row] = float('inf')
+                self.valid_until[row] = now_minutes + SLOT_MINUTES
+            else:
+                self.next_free[row] = self.valid_until[row] = _minutes(slot)
+    
+    def _scores(self, code, visits, now):
+        """
+        Score every doctor (both locks held).
+        
+        Returns:
+            tuple: (scores, past visit counts) indexed by row
+        """
+        weights = RECOMMENDATION_WEIGHTS
+        now_minutes = _minutes(now)
+        half_score = NEXT_FREE_HALF_SCORE_HOURS * 60
+        
+        if np is not None:
+            visit_counts = np.zeros(len(self.rows))
+            rows = [self.rows[doctor_id] for doctor_id in visits if doctor_id in self.rows]
+            visit_counts[rows] = [visits[int(self.doctor_ids[row])] for row in rows]
+            
+            scores = (
+                weights['specialization'] * (self.specialty == code)
+                + weights['load'] * availability_score(self.load) / 100
+                + weights['rating'] * self.rating
+                + weights['responsiveness'] * self.responsiveness
+                + weights['next_free'] / (1 + np.maximum(self.next_free - now_minutes, 0) / half_score)
+                + weights['past_visits'] * np.minimum(visit_counts, PAST_VISITS_CAP) / PAST_VISITS_CAP
+            )
+            return scores, visit_counts
+        
+        visit_counts = [visits.get(doctor_id, 0) for doctor_id in self.doctor_ids]
+        scores = [
+            weights['specialization'] * (specialty == code)
+            + weights['load'] * availability_score(load) / 100
+            + weights['rating'] * rating
+            + weights['responsiveness'] * responsiveness
+            + weights['next_free'] / (1 + max(next_free - now_minutes, 0) / half_score)
+            + weights['past_visits'] * min(visit_count, PAST_VISITS_CAP) / PAST_VISITS_CAP
+            for specialty, load, rating, responsiveness, next_free, visit_count in zip(
+                self.specialty, self.load, self.rating, self.responsiveness, self.next_free, visit_counts
+            )
+        ]
+        return scores, visit_counts
+    
+    def _best(self, scores, n):
+        """Rows of the n best scores, best first, ties to the lower doctor id (lock held)"""
+        if np is None:
+            return nlargest(n, range(len(scores)), key=lambda row: (scores[row], -self.doctor_ids[row]))
+        
+        if n < len(scores):
+            rows = np.argpartition(-scores, n - 1)[:n]
+        else:
+            rows = np.arange(len(scores))
+        return rows[np.lexsort((self.doctor_ids[rows], -scores[rows]))]
+    
+    def recommend(self, n, specialization=None, visits=None):
+        """
+        Get the n best doctors for a request.
+        
+        Call ``appointment_queue.sync`` first to include other workers' bookings.
+        
+        Args:
+            n (int): Number of doctors wanted
+            specialization (str, optional): Specialization asked for
+            visits (dict, optional): doctor_id -> the patient's completed visits
+        
+        Returns:
+            list: Doctors with their score and features, best first
+        """
+        self._refresh()
+        
+        now = datetime.datetime.now()
+        code = self.specialties.get(specialization_key(specialization), -1) if specialization else -1
+        
+        with appointment_queue.lock, self.lock:
+            if not self.rows:
+                return []
+            
+            self._update_next_free(now)
+            scores, visit_counts = self._scores(code, visits or {}, now)
+            
+            recommendations = []
+            for row in self._best(scores, min(n, len(self.rows))):
+                doctor = self.doctors[row]
+                next_free = self.next_free[row]
+                recommendations.append({
+                    'doctor_id': int(self.doctor_ids[row]),
+                    'name': doctor['name'],
+                    'specialization': doctor['specialization'],
+                    'score': round(float(scores[row]), 4),
+                    'specialization_match': bool(self.specialty[row] == code),
+                    'scheduled_appointments': int(self.load[row]),
+                    'availability_score': availability_score(int(self.load[row])),
+                    'next_free_slot': (
+                        (_EPOCH + datetime.timedelta(minutes=float(next_free))).isoformat()
+                        if next_free != float('inf') else None
+                    ),
+                    'past_visits': int(visit_counts[row])
+                })
+            
+            return recommendations
+
+# Doctor recommender for this process
+doctor_recommender = DoctorRecommender()
+appointment_queue.subscribe(doctor_recommender)
@@ -0,0 +1,286 @@
+"""
+Opt-in caching of whole responses for hot, rarely changing public endpoints.
+
+Every write to a table a cached route reads from bumps that table's row in
+``table_versions`` in the same transaction, so the versions say which data
+a response was built from, whichever worker made the change. The ETag is
+derived from the path and those versions, so every worker gives the same
+tag for the same data and can check an ``If-None-Match`` against the
+current versions before running the view: a match is answered with a 304
+without building the response.
+
+The versions are kept per process and reread from the primary once this
+process writes one of the tables, or after DB_QUERY_CACHE_TTL seconds, so
+other workers' writes are picked up within the same bound as cached
+queries. Rendered 200 responses are also kept per process, keyed by path
+and query string, and served while their ETag is current. ``Cache-Control``
+lets browsers and an edge proxy reuse a response for RESPONSE_CACHE_MAX_AGE
+seconds.
+"""
+import os
+import time
+import hashlib
+import inspect
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import request, make_response, current_app
+from backend.auth.auth import current_principal
+from backend.db.mysql import query_all, use_primary
+from backend.db.cache import query_cache, track_versions, DB_QUERY_CACHE_TTL
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Most responses kept per process; 0 disables the cache (ETags are still sent)
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1000"))
+
+# max-age sent to clients and proxies, in seconds
+RESPONSE_CACHE_MAX_AGE = int(os.environ.get("RESPONSE_CACHE_MAX_AGE", "30"))
+
+def version_etag(key, versions):
+    """Build an ETag value from a path and the data versions of its tables"""
+    return hashlib.sha256(f"{key}|{versions}".encode()).hexdigest()[:32]
+
+def read_versions(tables):
+    """
+    Read the current data versions of some tables from the primary.
+    
+    Args:
+        tables (tuple): Table names
+    
+    Returns:
+        tuple: Version of each table, 0 for tables never written
+    """
+    query = f"SELECT table_name, version FROM table_versions WHERE table_name IN ({', '.join(['%s'] * len(tables))})"
+    versions = {row['table_name']: row['version'] for row in query_all(query, tables, primary=True)}
+    return tuple(versions.get(table, 0) for table in tables)
+
+class ResponseCache:
+    """
+    LRU cache of rendered responses, plus the data versions of the tables
+    they are built from.
+    """
+    
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=DB_QUERY_CACHE_TTL):
+        """
+        Create an empty cache.
+        
+        Args:
+            max_entries (int): Most responses kept; 0 disables caching
+            ttl (float): Seconds a response or a set of versions is reused
+                without rereading it
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, etag, body, mimetype)
+        self.known_versions = {}  # tables -> (expires_at, generation, versions)
+        self.hits = 0
+        self.misses = 0
+    
+    def versions(self, tables):
+        """
+        Get the data versions of some tables, rereading them once this process
+        has written one of the tables or they are older than the TTL.
+        
+        Args:
+            tables (tuple): Table names
+        
+        Returns:
+            tuple: Version of each table
+        """
+        generation = query_cache.generation(tables)
+        
+        with self.lock:
+            known = self.known_versions.get(tables)
+            if known is not None and known[0] > time.monotonic() and known[1] == generation:
+                return known[2]
+        
+        return self.refresh_versions(tables, generation)
+    
+    def refresh_versions(self, tables, generation=None):
+        """
+        Reread the data versions of some tables and remember them.
+        
+        Args:
+            tables (tuple): Table names
+            generation (tuple, optional): ``query_cache.generation`` taken before the read
+        
+        Returns:
+            tuple: Version of each table
+        """
+        generation = query_cache.generation(tables) if generation is None else generation
+        versions = read_versions(tables)
+        
+        with self.lock:
+            # A write by this process during the read may not be included
+            if query_cache.generation(tables) == generation:
+                self.known_versions[tables] = (time.monotonic() + self.ttl, generation, versions)
+        return versions
+    
+    def get(self, key, etag):
+        """
+        Look up a response built from the current data.
+        
+        Args:
+            key (str): Path and query string
+            etag (str): ETag of the current data versions
+        
+        Returns:
+            tuple: (body, mimetype), or None if missing or stale
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic() or entry[1] != etag:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2:]
+    
+    def put(self, key, etag, body, mimetype):
+        """
+        Store a response.
+        
+        Args:
+            key (str): Path and query string
+            etag (str): ETag of the data versions it was built from
+            body (bytes): Response body
+            mimetype (str): Content type
+        """
+        if self.max_entries <= 0:
+            return
+        
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic() + self.ttl, etag, body, mimetype)
+            
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop every entry and reset the statistics"""
+        with self.lock:
+            self.entries.clear()
+            self.known_versions.clear()
+            self.hits = self.misses = 0
+    
+    def stats(self):
+        """
+        Get hit/miss counters and the current size.
+        
+        Returns:
+            dict: Cache statistics
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+# Cached responses for this process
+response_cache = ResponseCache()
+
+def _finish(response, etag, max_age, anonymous_only):
+    """Add validators and caching headers, then answer If-None-Match (304) if it matches"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    if anonymous_only:
+        response.vary.add('Authorization')
+    return response.make_conditional(request)
+
+def cached_response(tables, max_age=None, anonymous_only=False):
+    """
+    Decorator that caches a route's 200 responses and answers conditional GETs.
+    
+    Args:
+        tables (tuple): Tables the response is built from; their writes are
+            versioned from now on
+        max_age (int, optional): Cache-Control max-age, default RESPONSE_CACHE_MAX_AGE
+        anonymous_only (bool): Only cache requests without a valid token, for
+            routes that show signed-in users more
+    
+    Returns:
+        function: Decorator for sync or async views
+    """
+    tables = tuple(tables)
+    max_age = RESPONSE_CACHE_MAX_AGE if max_age is None else max_age
+    track_versions(tables)
+    
+    def lookup():
+        """Get (key, cached or 304 response or None); key is None when not caching"""
+        if anonymous_only and current_principal() is not None:
+            return None, None
+        
+        key = request.full_path
+        etag = version_etag(key, response_cache.versions(tables))
+        
+        if etag in request.if_none_match:
+            # The client has the current version: no need to build it
+            return key, _finish(current_app.response_class(status=200), etag, max_age, anonymous_only)
+        
+        entry = response_cache.get(key, etag)
+        if entry is None:
+            return key, None
+        
+        body, mimetype = entry
+        response = current_app.response_class(body, status=200, mimetype=mimetype)
+        return key, _finish(response, etag, max_age, anonymous_only)
+    
+    def store(key, etag, result):
+        """Cache a freshly built response and add its headers"""
+        response = make_response(result)
+        if key is None:
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        if response.status_code != 200 or response.is_streamed:
+            return response
+        
+        body = response.get_data()
+        response_cache.put(key, etag, body, response.mimetype)
+        return _finish(response, etag, max_age, anonymous_only)
+    
+    # A response to be cached is built on the primary, past the query cache,
+    # after rereading the versions, so its body is at least as new as the
+    # versions its ETag is derived from
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def decorated_async(*args, **kwargs):
+                key, cached = lookup()
+                if cached is not None:
+                    return cached
+                if key is None:
+                    return store(key, None, await f(*args, **kwargs))
+                
+                with use_primary():
+                    etag = version_etag(key, response_cache.refresh_versions(tables))
+                    result = await f(*args, **kwargs)
+                return store(key, etag, result)
+            
+            return decorated_async
+        
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key, cached = lookup()
+            if cached is not None:
+                return cached
+            if key is None:
+                return store(key, None, f(*args, **kwargs))
+            
+            with use_primary():
+                etag = version_etag(key, response_cache.refresh_versions(tables))
+                result = f(*args, **kwargs)
+            return store(key, etag, result)
+        
+        return decorated
+    
+    return decorator
@@ -0,0 +1,70 @@
+import datetime
+from backend.utils.availability import (
+    parse_availability, day_masks, free_starts, slot_indexes, availability_score, SLOT_MINUTES, SLOTS_PER_DAY
+)
+
+def hours(start, end):
+    """Day mask of the slots from start to end o'clock"""
+    first, last = int(start * 60) // SLOT_MINUTES, int(end * 60) // SLOT_MINUTES
+    return ((1 << (last - first)) - 1) << first
+
+def test_day_range_with_hours():
+    week = parse_availability("Monday-Friday: 9AM-5PM, Saturday: 9AM-1PM")
+    
+    assert week == [hours(9, 17)] * 5 + [hours(9, 13), 0]
+
+def test_hours_only_clause_adds_to_the_previous_days():
+    week = parse_availability("Monday: 9AM-12PM, 2PM-5PM")
+    
+    assert week[0] == hours(9, 12) | hours(14, 17)
+    assert week[1:] == [0] * 6
+
+def test_days_waiting_for_their_hours():
+    week = parse_availability("Monday, Wednesday: 9:30 am to 1 pm")
+    
+    assert week[0] == week[2] == hours(9.5, 13)
+    assert week[1] == 0
+
+def test_day_groups_wrapping_ranges_and_24_hour_clock():
+    assert parse_availability("Weekends: 10:00-14:00") == [0] * 5 + [hours(10, 14)] * 2
+    assert parse_availability("Friday-Monday: 9-5") == [hours(9, 17)] + [0] * 3 + [hours(9, 17)] * 3
+    assert parse_availability("Daily: 10PM-12AM") == [hours(22, 24)] * 7
+
+def test_closed_days_and_unparseable_text():
+    assert parse_availability("Sunday: closed") == [0] * 7
+    assert parse_availability("by appointment") == [0] * 7
+    assert parse_availability("") == [0] * 7
+    assert parse_availability(None) == [0] * 7
+
+def test_partial_slots_are_not_working_time():
+    # 9:10-9:50 covers no whole 15 minute slot except 9:15-9:45
+    assert parse_availability("Monday: 9:10am-9:50am")[0] == hours(9.25, 9.75)
+
+def test_day_masks_include_every_touched_slot():
+    start = datetime.datetime(2031, 1, 6, 9, 10)
+    
+    # 9:10-9:20 reaches into both the 9:00 and the 9:15 slot
+    assert day_masks(start, start + datetime.timedelta(minutes=10)) == [(start.date(), hours(9, 9.5))]
+    assert day_masks(start, start + datetime.timedelta(minutes=5)) == [(start.date(), hours(9, 9.25))]
+
+def test_day_masks_split_at_midnight():
+    start = datetime.datetime(2031, 1, 6, 23, 30)
+    masks = day_masks(start, start + datetime.timedelta(hours=1))
+    
+    assert masks == [
+        (datetime.date(2031, 1, 6), hours(23.5, 24)),
+        (datetime.date(2031, 1, 7), hours(0, 0.5))
+    ]
+
+def test_free_starts_need_a_long_enough_run():
+    free = hours(9, 10) | hours(11, 11.5)
+    
+    assert list(slot_indexes(free_starts(free, 2))) == [36, 37, 38, 44]
+    assert free_starts(free, 1) == free
+    assert free_starts(free, 5) == 0
+    assert free_starts((1 << SLOTS_PER_DAY) - 1, 4).bit_length() == SLOTS_PER_DAY - 3
+
+def test_availability_score():
+    assert availability_score(0) == 100
+    assert availability_score(3) == 85
+    assert availability_score(40) == 5
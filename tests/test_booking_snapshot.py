@@ -0,0 +1,67 @@
+import datetime
+from flask import Flask, g
+from backend.db.mysql import query_one, transaction
+from backend.routes.appointments import lock_doctor, find_conflict
+
+app = Flask(__name__)
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+    
+    def execute(self, query, params=None):
+        self.rows = self.connection.read(query)
+        self.rowcount = len(self.rows)
+    
+    def fetchall(self):
+        return self.rows
+    
+    def close(self):
+        pass
+
+class Connection:
+    """
+    A connection with InnoDB's REPEATABLE READ visibility for appointments:
+    plain SELECTs see the snapshot taken by the transaction's first plain
+    SELECT, locking reads see the latest committed rows.
+    """
+    def __init__(self):
+        self.committed = []
+        self.snapshot = None
+    
+    def read(self, query):
+        if 'FROM doctors' in query:
+            return [{'doctor_id': 1}]
+        if 'FOR UPDATE' in query or 'LOCK IN SHARE MODE' in query:
+            return list(self.committed)
+        if self.snapshot is None:
+            self.snapshot = list(self.committed)
+        return self.snapshot if 'FROM appointments' in query else [{'uid': 1}]
+    
+    def cursor(self, dictionary=False):
+        return Cursor(self)
+    
+    def commit(self):
+        self.snapshot = None
+    
+    def rollback(self):
+        self.snapshot = None
+
+def test_conflict_check_sees_bookings_committed_after_an_earlier_read():
+    start = datetime.datetime(2031, 1, 6, 9)
+    connection = Connection()
+    
+    with app.app_context():
+        g.db_connection = connection
+        # Authentication reads the user on the request's connection first
+        query_one("SELECT uid FROM users WHERE uid = %s", (1,), primary=True)
+        
+        # Another request books the slot and commits
+        connection.committed.append({'id': 7})
+        
+        with transaction():
+            assert lock_doctor(1)
+            assert find_conflict(1, start, start + datetime.timedelta(minutes=30)) == 7
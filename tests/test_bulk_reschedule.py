@@ -0,0 +1,53 @@
+import datetime
+from backend.dsa.interval_tree import IntervalTree
+from backend.routes.appointments import shift_conflicts
+
+def at(hour, minute=0):
+    return datetime.datetime(2031, 1, 6, hour, minute)
+
+def appointment(appointment_id, hour, minute=0, minutes=30):
+    return {
+        'id': appointment_id,
+        'appointment_time': at(hour, minute),
+        'end_time': at(hour, minute) + datetime.timedelta(minutes=minutes)
+    }
+
+# 9:00 and 9:30 move forward by 30 minutes; the target schedule already
+# has 9:30-10:00, which the 9:00 appointment would land on
+SHIFT = datetime.timedelta(minutes=30)
+
+def target_schedule():
+    tree = IntervalTree()
+    tree.insert(at(9, 30), at(10), 99)
+    return tree
+
+def test_stuck_appointment_blocks_the_rest_of_its_own_doctors_batch():
+    appointments = [appointment(1, 9), appointment(2, 9, 30)]
+    
+    conflicts = shift_conflicts(appointments, target_schedule(), SHIFT, same_doctor=True)
+    
+    # 1 stays at 9:00-9:30, which does not overlap 2's new 10:00-10:30
+    assert conflicts == {1: 99}
+
+def test_stuck_appointment_cascades_within_the_same_doctor():
+    appointments = [appointment(1, 9), appointment(2, 8, 30)]
+    
+    conflicts = shift_conflicts(appointments, target_schedule(), SHIFT, same_doctor=True)
+    
+    # 2 would move onto 9:00-9:30, where 1 is stuck
+    assert conflicts == {1: 99, 2: 1}
+
+def test_stuck_appointment_does_not_block_another_doctors_calendar():
+    appointments = [appointment(1, 9), appointment(2, 8, 30)]
+    tree = target_schedule()
+    
+    conflicts = shift_conflicts(appointments, tree, SHIFT, same_doctor=False)
+    
+    # 1 stays with the old doctor, so 2 can take 9:00 in the new calendar
+    assert conflicts == {1: 99}
+    assert 1 not in tree.intervals
+
+def test_nothing_moves_into_a_clear_schedule():
+    appointments = [appointment(1, 13), appointment(2, 14)]
+    
+    assert shift_conflicts(appointments, target_schedule(), SHIFT, same_doctor=True) == {}
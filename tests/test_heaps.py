@@ -0,0 +1,145 @@
+import random
+from backend.dsa.minheap import MinHeap
+from backend.dsa.maxheap import MaxHeap
+from backend.dsa.heap_map import HeapMap
+
+def check_min_heap(heap):
+    for i, entry in enumerate(heap.heap):
+        assert heap.position_map[entry[1]] == i
+        if i:
+            assert heap.heap[heap.parent(i)][0] <= entry[0]
+    assert len(heap.position_map) == len(heap.heap)
+
+def check_max_heap(heap):
+    for i, entry in enumerate(heap.heap):
+        assert heap.position_map[entry[1]] == i
+        if i:
+            assert heap.heap[heap.parent(i)][0] >= entry[0]
+    assert len(heap.position_map) == len(heap.heap)
+
+def drain(heap, extract):
+    return [extract()[0] for _ in range(heap.size())]
+
+def test_min_heapify_then_extract_in_order():
+    rng = random.Random(1)
+    priorities = [rng.randrange(50) for _ in range(300)]
+    heap = MinHeap()
+    heap.heapify((priority, item_id, {'n': item_id}) for item_id, priority in enumerate(priorities))
+    
+    check_min_heap(heap)
+    assert drain(heap, heap.extract_min) == sorted(priorities)
+    assert heap.extract_min() is None
+
+def test_max_heapify_then_extract_in_order():
+    rng = random.Random(2)
+    priorities = [rng.randrange(50) for _ in range(300)]
+    heap = MaxHeap()
+    heap.heapify((priority, item_id, {}) for item_id, priority in enumerate(priorities))
+    
+    check_max_heap(heap)
+    assert drain(heap, heap.extract_max) == sorted(priorities, reverse=True)
+    assert heap.extract_max() is None
+
+def test_iter_smallest_walks_in_order_without_changing_the_heap():
+    heap = MinHeap()
+    heap.heapify((priority, item_id, None) for item_id, priority in enumerate([5, 3, 8, 1, 9, 2, 7]))
+    before = [list(entry) for entry in heap.heap]
+    
+    assert [entry[0] for entry in heap.iter_smallest()] == [1, 2, 3, 5, 7, 8, 9]
+    assert [entry[0] for entry in heap.smallest(3)] == [1, 2, 3]
+    assert heap.smallest(0) == []
+    assert heap.heap == before
+
+def test_iter_largest_walks_in_order_without_changing_the_heap():
+    heap = MaxHeap()
+    heap.heapify((priority, item_id, None) for item_id, priority in enumerate([5, 3, 8, 1, 9, 2, 7]))
+    before = [list(entry) for entry in heap.heap]
+    
+    assert [entry[0] for entry in heap.iter_largest()] == [9, 8, 7, 5, 3, 2, 1]
+    assert [entry[0] for entry in heap.get_top_n(2)] == [9, 8]
+    assert heap.heap == before
+
+def test_max_heap_remove_moves_the_last_entry_up_when_needed():
+    heap = MaxHeap()
+    # 10 sits under 50; the last entry, 85, must climb above 50 to replace it
+    heap.heapify([(100, 'a', None), (50, 'b', None), (90, 'c', None), (10, 'd', None),
+                  (20, 'e', None), (80, 'f', None), (85, 'g', None)])
+    
+    assert heap.remove('d')
+    assert not heap.remove('d')
+    check_max_heap(heap)
+    assert drain(heap, heap.extract_max) == [100, 90, 85, 80, 50, 20]
+
+def test_min_heap_remove_moves_the_last_entry_up_when_needed():
+    heap = MinHeap()
+    heap.heapify([(1, 'a', None), (50, 'b', None), (10, 'c', None), (90, 'd', None),
+                  (80, 'e', None), (20, 'f', None), (15, 'g', None)])
+    
+    assert heap.remove('d')
+    check_min_heap(heap)
+    assert drain(heap, heap.extract_min) == [1, 10, 15, 20, 50, 80]
+
+def test_random_updates_and_removes_keep_both_heaps_valid():
+    rng = random.Random(3)
+    min_heap, max_heap = MinHeap(), MaxHeap()
+    priorities = {}
+    
+    for _ in range(2000):
+        item_id = rng.randrange(100)
+        action = rng.random()
+        if item_id not in priorities:
+            priorities[item_id] = rng.randrange(1000)
+            min_heap.insert(priorities[item_id], item_id, None)
+            max_heap.insert(priorities[item_id], item_id, None)
+        elif action < 0.4:
+            del priorities[item_id]
+            assert min_heap.remove(item_id)
+            assert max_heap.remove(item_id)
+        else:
+            priorities[item_id] = rng.randrange(1000)
+            assert min_heap.update_priority(item_id, priorities[item_id])
+            assert max_heap.update_availability(item_id, priorities[item_id])
+    
+    check_min_heap(min_heap)
+    check_max_heap(max_heap)
+    assert drain(min_heap, min_heap.extract_min) == sorted(priorities.values())
+    assert drain(max_heap, max_heap.extract_max) == sorted(priorities.values(), reverse=True)
+
+def test_replace_data_keeps_the_entrys_position():
+    for heap in (MinHeap(), MaxHeap()):
+        heap.heapify([(3, 'a', {'v': 1}), (1, 'b', {'v': 2}), (2, 'c', {'v': 3})])
+        positions = dict(heap.position_map)
+        
+        assert heap.replace_data('c', {'v': 30})
+        assert not heap.replace_data('missing', {})
+        assert heap.position_map == positions
+        assert heap.heap[heap.position_map['c']] == [2, 'c', {'v': 30}]
+
+def test_heap_map_moves_and_reprioritizes_items():
+    heaps = HeapMap()
+    heaps.load({1: [(2, 'a', {}), (1, 'b', {})], 2: [(5, 'c', {})], 3: []})
+    
+    assert heaps.size() == 3
+    assert 3 not in heaps.heaps
+    assert heaps.peek(1)[1] == 'b'
+    
+    # Move 'c' to heap 1 ahead of everything, then replace 'a''s data in place
+    heaps.upsert(1, 0, 'c', {'moved': True})
+    heaps.upsert(1, 2, 'a', {'new': True})
+    
+    assert 2 not in heaps.heaps
+    assert heaps.item_keys['c'] == 1
+    assert [entry[1] for entry in heaps.smallest(1, 3)] == ['c', 'b', 'a']
+    assert heaps.peek(1)[2] == {'moved': True}
+    assert heaps.heaps[1].heap[heaps.heaps[1].position_map['a']][2] == {'new': True}
+    
+    assert heaps.update_priority('a', -1)
+    assert not heaps.update_priority('missing', 0)
+    assert heaps.pop(1)[1] == 'a'
+    assert 'a' not in heaps
+    
+    assert heaps.remove('b')
+    assert not heaps.remove('b')
+    assert heaps.remove('c')
+    assert heaps.heaps == {} and heaps.size() == 0
+    assert heaps.pop(1) is None
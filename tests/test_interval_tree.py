@@ -0,0 +1,110 @@
+import random
+from backend.dsa.interval_tree import IntervalTree
+
+def brute_overlaps(intervals, start, end):
+    return sorted(
+        (interval_start, item_id)
+        for item_id, (interval_start, interval_end) in intervals.items()
+        if interval_start < end and start < interval_end
+    )
+
+def check_invariants(tree, node):
+    """Check ordering, AVL balance and max_end of a subtree; return its height"""
+    if node is None:
+        return 0
+    
+    left = check_invariants(tree, node.left)
+    right = check_invariants(tree, node.right)
+    assert abs(left - right) <= 1
+    assert node.height == 1 + max(left, right)
+    
+    ends = [node.end] + [child.max_end for child in (node.left, node.right) if child]
+    assert node.max_end == max(ends)
+    
+    if node.left:
+        assert (node.left.start, node.left.item_id) < (node.start, node.item_id)
+    if node.right:
+        assert (node.right.start, node.right.item_id) > (node.start, node.item_id)
+    return node.height
+
+def test_back_to_back_intervals_do_not_overlap():
+    tree = IntervalTree()
+    tree.insert(9, 10, 1)
+    
+    assert tree.find_overlap(10, 11) is None
+    assert tree.find_overlap(8, 9) is None
+    assert tree.find_overlap(9, 9.5) == 1
+    assert tree.find_overlap(8, 12) == 1
+
+def test_find_overlap_can_ignore_the_item_being_moved():
+    tree = IntervalTree()
+    tree.insert(9, 10, 1)
+    tree.insert(9.5, 10.5, 2)
+    
+    assert tree.find_overlap(9, 10, exclude=1) == 2
+    assert tree.find_overlap(10, 11, exclude=2) is None
+
+def test_insert_replaces_an_items_interval():
+    tree = IntervalTree()
+    tree.insert(9, 10, 1)
+    tree.insert(14, 15, 1)
+    
+    assert tree.size() == 1
+    assert tree.find_overlap(9, 10) is None
+    assert tree.find_overlap(14, 15) == 1
+
+def test_remove():
+    tree = IntervalTree()
+    tree.insert(9, 10, 1)
+    
+    assert tree.remove(1)
+    assert not tree.remove(1)
+    assert tree.is_empty()
+    assert tree.find_overlap(0, 24) is None
+
+def test_overlapping_lists_every_overlap_in_start_order():
+    tree = IntervalTree()
+    tree.build([(13, 14, 3), (9, 17, 1), (11, 12, 2), (17, 18, 4), (8, 9, 5)])
+    
+    assert tree.overlapping(10, 13.5) == [1, 2, 3]
+    assert tree.overlapping(17, 20) == [4]
+    assert tree.overlapping(6, 8) == []
+
+def test_build_gives_a_balanced_tree():
+    tree = IntervalTree()
+    tree.build((hour, hour + 2, hour) for hour in range(100))
+    
+    assert tree.size() == 100
+    assert check_invariants(tree, tree.root) <= 8
+    assert tree.overlapping(10, 12) == [9, 10, 11]
+
+def test_matches_a_brute_force_search_through_random_changes():
+    rng = random.Random(7)
+    tree = IntervalTree()
+    intervals = {}
+    
+    for step in range(2000):
+        item_id = rng.randrange(200)
+        if item_id in intervals and rng.random() < 0.4:
+            assert tree.remove(item_id)
+            del intervals[item_id]
+        else:
+            start = rng.randrange(1000)
+            end = start + rng.randint(1, 40)
+            tree.insert(start, end, item_id)
+            intervals[item_id] = (start, end)
+        
+        if step % 50 == 0:
+            check_invariants(tree, tree.root)
+        
+        start = rng.randrange(1000)
+        end = start + rng.randint(1, 60)
+        expected = brute_overlaps(intervals, start, end)
+        
+        assert tree.overlapping(start, end) == [item_id for _, item_id in expected]
+        found = tree.find_overlap(start, end)
+        assert (found is None) == (not expected)
+        if found is not None:
+            assert found in intervals and brute_overlaps({found: intervals[found]}, start, end)
+    
+    assert tree.intervals == intervals
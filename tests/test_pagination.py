@@ -0,0 +1,51 @@
+import datetime
+from flask import Flask
+from backend.utils.helpers import encode_cursor, decode_cursor, get_page_args, paginate
+
+app = Flask(__name__)
+
+def page_args(query_string, key_size=2):
+    with app.test_request_context('/?' + query_string):
+        return get_page_args(key_size, default_limit=20, max_limit=100)
+
+def test_cursor_round_trip():
+    moment = datetime.datetime(2031, 1, 6, 9, 30)
+    cursor = encode_cursor([moment, 42])
+    
+    assert '=' not in cursor
+    assert decode_cursor(cursor, 2) == ['2031-01-06 09:30:00', 42]
+
+def test_cursor_encodes_dates_and_strings():
+    cursor = encode_cursor([datetime.date(2031, 1, 6), 'Smith', None])
+    
+    assert decode_cursor(cursor, 3) == ['2031-01-06', 'Smith', None]
+
+def test_malformed_cursors_are_rejected():
+    assert decode_cursor('not base64!', 2) is None
+    assert decode_cursor(encode_cursor([1]), 2) is None
+    assert decode_cursor('eyJhIjoxfQ', 1) is None  # {"a":1} is not a list
+
+def test_page_args_defaults_and_clamps_the_limit():
+    assert page_args('') == (20, None, None)
+    assert page_args('limit=500') == (100, None, None)
+    assert page_args('limit=0') == (1, None, None)
+
+def test_page_args_decodes_the_cursor():
+    cursor = encode_cursor([datetime.datetime(2031, 1, 6, 9), 7])
+    
+    assert page_args(f'limit=5&cursor={cursor}') == (5, ['2031-01-06 09:00:00', 7], None)
+    assert page_args('cursor=garbage') == (20, None, 'Invalid pagination cursor')
+
+def test_paginate_trims_the_extra_row_and_points_past_the_last_one():
+    rows = [{'appointment_time': datetime.datetime(2031, 1, 6, hour), 'id': hour} for hour in range(9, 13)]
+    
+    page, cursor = paginate(rows, 3, ['appointment_time', 'id'])
+    
+    assert page == rows[:3]
+    assert decode_cursor(cursor, 2) == ['2031-01-06 11:00:00', 11]
+
+def test_paginate_last_page_has_no_cursor():
+    rows = [{'id': 1}, {'id': 2}]
+    
+    assert paginate(rows, 2, ['id']) == (rows, None)
+    assert paginate([], 2, ['id']) == ([], None)
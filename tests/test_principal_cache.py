@@ -0,0 +1,88 @@
+import time
+from backend.auth.principals import PrincipalCache, TOKEN_LIFETIME
+
+def payload(uid, issued_ago=0, lifetime=TOKEN_LIFETIME):
+    now = int(time.time())
+    return {'uid': uid, 'role': 'patient', 'iat': now - issued_ago, 'exp': now - issued_ago + lifetime}
+
+def test_put_then_get_returns_a_copy():
+    cache = PrincipalCache()
+    cache.put('token-a', payload(1))
+    
+    first = cache.get('token-a')
+    first['role'] = 'admin'
+    
+    assert cache.get('token-a')['role'] == 'patient'
+    assert cache.get('token-b') is None
+
+def test_raw_tokens_are_not_kept():
+    cache = PrincipalCache()
+    cache.put('token-a', payload(1))
+    
+    assert 'token-a' not in cache.entries
+
+def test_entries_expire_with_the_token_or_the_ttl():
+    cache = PrincipalCache(ttl=60)
+    cache.put('expired', payload(1, issued_ago=120, lifetime=60))
+    assert cache.get('expired') is None
+    
+    cache = PrincipalCache(ttl=0)
+    cache.put('token-a', payload(1))
+    assert cache.get('token-a') is None
+
+def test_least_recently_used_token_is_evicted():
+    cache = PrincipalCache(max_entries=2)
+    cache.put('a', payload(1))
+    cache.put('b', payload(2))
+    cache.get('a')
+    cache.put('c', payload(3))
+    
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert set(cache.user_tokens) == {1, 3}
+
+def test_zero_size_disables_caching():
+    cache = PrincipalCache(max_entries=0)
+    cache.put('a', payload(1))
+    
+    assert cache.get('a') is None
+
+def test_revoke_rejects_older_tokens_but_not_newer_ones():
+    cache = PrincipalCache()
+    old = payload(1, issued_ago=10)
+    cache.put('old', old)
+    cache.put('other-user', payload(2, issued_ago=10))
+    
+    cache.revoke(1)
+    
+    assert cache.get('old') is None
+    assert cache.is_revoked(old)
+    assert cache.get('other-user') is not None
+    
+    newer = payload(1)
+    newer['iat'] += 1
+    cache.put('new', newer)
+    assert not cache.is_revoked(newer)
+    assert cache.get('new') is not None
+
+def test_deleted_users_are_rejected_for_good():
+    cache = PrincipalCache()
+    cache.revoke(1, deleted=True)
+    
+    future = payload(1)
+    future['iat'] += 3600
+    cache.put('after-delete', future)
+    
+    assert cache.is_revoked(future)
+    assert cache.get('after-delete') is None
+    assert 1 not in cache.user_tokens
+
+def test_old_revocations_are_forgotten():
+    cache = PrincipalCache()
+    cache.revoked[1] = time.time() - TOKEN_LIFETIME - 1
+    
+    cache.revoke(2)
+    
+    assert 1 not in cache.revoked
+    assert 2 in cache.revoked
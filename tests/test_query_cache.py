@@ -0,0 +1,91 @@
+import time
+from backend.db.cache import QueryCache, written_tables, ALL_TABLES
+
+QUERY = "SELECT * FROM doctors WHERE doctor_id = %s"
+
+def test_written_tables_of_single_table_writes():
+    assert written_tables("INSERT INTO appointments (a) VALUES (%s)") == {'appointments'}
+    assert written_tables("insert ignore into `Doctors` VALUES (1)") == {'doctors'}
+    assert written_tables("  UPDATE patients SET name = %s") == {'patients'}
+    assert written_tables("REPLACE INTO performance_metrics VALUES (1)") == {'performance_metrics'}
+    assert written_tables("DROP TABLE IF EXISTS old_table") == {'old_table'}
+
+def test_deletes_include_cascaded_tables():
+    assert written_tables("DELETE FROM doctors WHERE doctor_id = %s") == {
+        'doctors', 'appointments', 'performance_metrics'
+    }
+    assert written_tables("DELETE FROM users WHERE uid = %s") == {
+        'users', 'patients', 'doctors', 'appointments', 'performance_metrics'
+    }
+
+def test_unparsed_statements_invalidate_everything():
+    assert written_tables("WITH x AS (SELECT 1) UPDATE doctors SET name = 'a'") == {ALL_TABLES}
+
+def test_put_then_get_returns_copies():
+    cache = QueryCache()
+    cache.put(QUERY, (1,), [{'doctor_id': 1}], ('doctors',), cache.generation(('doctors',)))
+    
+    rows = cache.get(QUERY, (1,))
+    rows[0]['doctor_id'] = 99
+    
+    assert cache.get(QUERY, (1,)) == [{'doctor_id': 1}]
+    assert cache.get(QUERY, (2,)) is None
+    assert cache.stats()['hits'] == 2
+
+def test_a_write_drops_dependent_entries_only():
+    cache = QueryCache()
+    cache.put(QUERY, (1,), [{'doctor_id': 1}], ('doctors',), cache.generation(('doctors',)))
+    cache.put("SELECT * FROM patients", None, [], ('patients',), cache.generation(('patients',)))
+    
+    cache.invalidate({'doctors'})
+    
+    assert cache.get(QUERY, (1,)) is None
+    assert cache.get("SELECT * FROM patients", None) == []
+    assert 'doctors' not in cache.table_keys
+
+def test_a_read_that_raced_a_write_is_not_stored():
+    cache = QueryCache()
+    generation = cache.generation(('doctors',))
+    cache.invalidate({'doctors'})
+    
+    cache.put(QUERY, (1,), [{'doctor_id': 1}], ('doctors',), generation)
+    
+    assert cache.get(QUERY, (1,)) is None
+    assert cache.stats()['stale_skips'] == 1
+
+def test_invalidating_all_tables_clears_everything():
+    cache = QueryCache()
+    generation = cache.generation(('doctors',))
+    cache.put(QUERY, (1,), [], ('doctors',), generation)
+    
+    cache.invalidate({ALL_TABLES})
+    
+    assert cache.get(QUERY, (1,)) is None
+    assert cache.generation(('doctors',)) != generation
+
+def test_entries_expire_and_the_oldest_is_evicted():
+    cache = QueryCache(max_entries=2)
+    generation = cache.generation(('doctors',))
+    cache.put(QUERY, (0,), [], ('doctors',), generation, ttl=0)
+    assert cache.get(QUERY, (0,)) is None
+    
+    for doctor_id in (1, 2, 3):
+        cache.put(QUERY, (doctor_id,), [], ('doctors',), generation)
+    
+    assert cache.get(QUERY, (1,)) is None
+    assert cache.get(QUERY, (3,)) == []
+    assert cache.stats()['evictions'] == 1
+
+def test_zero_size_disables_the_cache():
+    assert not QueryCache(max_entries=0).enabled
+
+def test_written_within_tracks_this_processs_writes():
+    cache = QueryCache()
+    assert not cache.written_within(('doctors',), 60)
+    
+    cache.invalidate({'doctors'})
+    
+    assert cache.written_within(('doctors', 'patients'), 60)
+    assert not cache.written_within(('patients',), 60)
+    time.sleep(0.02)
+    assert not cache.written_within(('doctors',), 0.01)
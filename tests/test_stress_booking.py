@@ -0,0 +1,94 @@
+"""
+Concurrent booking against a real MySQL database.
+
+Skipped when MySQL cannot be reached with the DB_* settings. Starts the app
+on a threaded local server, books overlapping slots with one doctor from
+many clients at once, then checks the doctor's calendar in the database.
+"""
+import uuid
+import random
+import threading
+import pytest
+from backend.benchmarks.stress_booking import call, booking_starts, book_concurrently, find_overlaps
+
+mysql_connector = pytest.importorskip("mysql.connector")
+
+CLIENTS = 16
+REQUESTS = 200
+WINDOW_HOURS = 4
+
+@pytest.fixture(scope="module")
+def base_url():
+    from backend.db.mysql import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+    
+    try:
+        mysql_connector.connect(
+            host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, database=DB_NAME, connection_timeout=2
+        ).close()
+    except mysql_connector.Error as e:
+        pytest.skip(f"MySQL is not available: {e}")
+    
+    from werkzeug.serving import make_server
+    from backend.main import app
+    
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+@pytest.fixture(scope="module")
+def doctor_id(base_url):
+    from backend.db.mysql import execute, transaction
+    from backend.auth.auth import create_user, hash_password
+    from backend.utils.availability import doctor_availability
+    
+    doctor = {
+        'name': 'Dr Stress Test',
+        'specialization': 'General',
+        'contact': '0',
+        'availability': 'Monday-Friday: 9AM-5PM'
+    }
+    
+    with transaction():
+        uid = create_user(f"stress-doctor-{uuid.uuid4().hex}@example.com", hash_password(uuid.uuid4().hex), 'doctor')
+        doctor_id = execute(
+            "INSERT INTO doctors (uid, name, specialization, contact, availability) VALUES (%s, %s, %s, %s, %s)",
+            (uid, doctor['name'], doctor['specialization'], doctor['contact'], doctor['availability'])
+        )
+    doctor_availability.upsert(doctor_id, doctor)
+    return doctor_id
+
+@pytest.fixture(scope="module")
+def patient_token(base_url):
+    status, body = call(base_url, 'POST', '/api/patients/register', {
+        'name': 'Stress Test Patient',
+        'email': f"stress-patient-{uuid.uuid4().hex}@example.com",
+        'password': uuid.uuid4().hex,
+        'dob': '1990-01-01',
+        'gender': 'other',
+        'contact': '0',
+        'address': '-'
+    })
+    assert status == 201, body
+    return body['token']
+
+def test_concurrent_bookings_never_overlap(base_url, doctor_id, patient_token):
+    from backend.db.mysql import query_all
+    
+    rng = random.Random(18)
+    day, starts = booking_starts(rng, REQUESTS, WINDOW_HOURS)
+    
+    results, _, _ = book_concurrently(base_url, patient_token, doctor_id, starts, CLIENTS, rng)
+    
+    # Every attempt either booked or was turned away as a clash
+    assert set(results) <= {201, 409}, results
+    assert results.get(201, 0) > 0
+    assert results.get(409, 0) > 0
+    
+    appointments = query_all(
+        "SELECT id, appointment_time, end_time FROM appointments WHERE doctor_id = %s AND status = 'scheduled'",
+        (doctor_id,), primary=True
+    )
+    assert len(appointments) == results[201]
+    assert find_overlaps(appointments) == []
@@ -0,0 +1,61 @@
+from flask import Flask, g
+from backend.db import mysql
+from backend.db.mysql import execute, transaction
+
+app = Flask(__name__)
+
+class Cursor:
+    def __init__(self, log):
+        self.log = log
+        self.rowcount = 1
+        self.lastrowid = 1
+    
+    def execute(self, query, params=None):
+        self.log.append(query.split()[0] + (' table_versions' if 'table_versions' in query else ''))
+    
+    def close(self):
+        pass
+
+class Connection:
+    def __init__(self):
+        self.log = []
+    
+    def cursor(self, dictionary=False):
+        return Cursor(self.log)
+    
+    def commit(self):
+        self.log.append('COMMIT')
+    
+    def rollback(self):
+        self.log.append('ROLLBACK')
+
+def run(monkeypatch, work):
+    monkeypatch.setattr(mysql, 'VERSIONED_TABLES', {'doctors', 'appointments'})
+    connection = Connection()
+    with app.app_context():
+        g.db_connection = connection
+        work()
+    return connection.log
+
+def test_a_transaction_bumps_versions_once_at_commit(monkeypatch):
+    def work():
+        with transaction():
+            execute("UPDATE doctors SET name = %s WHERE doctor_id = %s", ('a', 1))
+            execute("INSERT INTO appointments (doctor_id) VALUES (%s)", (1,))
+            execute("UPDATE doctors SET name = %s WHERE doctor_id = %s", ('b', 1))
+            execute("INSERT INTO patients (name) VALUES (%s)", ('c',))
+    
+    assert run(monkeypatch, work) == ['ROLLBACK', 'UPDATE', 'INSERT', 'UPDATE', 'INSERT', 'INSERT table_versions', 'COMMIT']
+
+def test_a_transaction_without_versioned_writes_does_not_bump(monkeypatch):
+    def work():
+        with transaction():
+            execute("INSERT INTO patients (name) VALUES (%s)", ('c',))
+    
+    assert run(monkeypatch, work) == ['ROLLBACK', 'INSERT', 'COMMIT']
+
+def test_a_lone_statement_bumps_with_its_own_commit(monkeypatch):
+    def work():
+        execute("UPDATE doctors SET name = %s WHERE doctor_id = %s", ('a', 1))
+    
+    assert run(monkeypatch, work) == ['UPDATE', 'INSERT table_versions', 'COMMIT']